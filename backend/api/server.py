@@ -0,0 +1,316 @@
+"""
+Async HTTP query service for the RAG pipeline
+
+Retrieval and reflection run in worker threads and generation streams from
+the async Ollama client, so many questions are in flight at once on one
+event loop. Run with:
+
+    python -m backend.api.server --host 0.0.0.0 --port 8000
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+from contextlib import asynccontextmanager, suppress
+from typing import Any, AsyncIterator, Dict, List, Optional
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
+from langchain.schema import Document
+from ollama import AsyncClient
+from pydantic import BaseModel, Field
+from ..config import (
+    API_MAX_CONCURRENCY,
+    API_QUEUE_TIMEOUT,
+    API_REQUEST_TIMEOUT,
+    DB_FAISS_PATH,
+    LLM_MODEL_NAME,
+    LLM_TEMPERATURE
+)
+from ..rag.ollama_client import create_async_client
+from ..rag.resource_manager import resource_manager
+from ..rag.retrieval_qa import (
+    ERROR_MESSAGE,
+    NO_ANSWER_MESSAGE,
+    QAWithFallback,
+    get_qa_chain,
+    use_llm
+)
+from ..rag.self_reflection import SelfReflectionChain
+from ..rag.tracing import histogram, request_trace, span, traced_async_tokens
+from ..rag.vector_store import load_vector_store
+
+logger = logging.getLogger(__name__)
+
+# Events buffered between generation and a slow HTTP client
+_STREAM_BUFFER = 64
+
+class QueryRequest(BaseModel):
+    question: str = Field(..., min_length=1, max_length=4000)
+    reflect: bool = Field(
+        default=False,
+        description="Run self-reflection on the answer and return the analysis"
+    )
+
+def document_to_dict(doc: Document) -> Dict[str, Any]:
+    return {"page_content": doc.page_content, "metadata": doc.metadata}
+
+def event_to_json(event: Dict) -> Dict:
+    """Make an answer event JSON serializable"""
+    if "source_documents" in event:
+        event = {
+            **event,
+            "source_documents": [document_to_dict(doc) for doc in event["source_documents"]]
+        }
+    return event
+
+class RAGService:
+    """
+    Answers questions concurrently on one event loop
+
+    At most `max_concurrency` questions are answered at a time; further
+    requests wait up to `queue_timeout` seconds for a slot and are then
+    rejected, so a burst of traffic cannot pile up unbounded work behind a
+    slow model. Each answer must finish within `request_timeout` seconds.
+    """
+
+    def __init__(
+        self,
+        qa: QAWithFallback,
+        reflection_chain: SelfReflectionChain,
+        client: AsyncClient,
+        max_concurrency: int = API_MAX_CONCURRENCY,
+        queue_timeout: float = API_QUEUE_TIMEOUT,
+        request_timeout: float = API_REQUEST_TIMEOUT
+    ):
+        self.qa = qa
+        self.reflection_chain = reflection_chain
+        self.client = client
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.request_timeout = request_timeout
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+
+    async def acquire(self) -> None:
+        """
+        Wait for a free slot
+
+        With a queue_timeout of 0 a request never waits: it takes a free
+        slot or is rejected at once.
+
+        Raises:
+            HTTPException: 503 if no slot frees up within queue_timeout
+        """
+        if self.queue_timeout <= 0:
+            # wait_for(..., 0) times out even when a slot is free
+            if self._slots.locked():
+                raise HTTPException(status_code=503, detail="Server busy, try again later")
+            await self._slots.acquire()
+        else:
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                raise HTTPException(status_code=503, detail="Server busy, try again later")
+        self.in_flight += 1
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        self._slots.release()
+
+    async def _generate(self, prompt: str) -> AsyncIterator[str]:
+        stream = await self.client.generate(
+            model=LLM_MODEL_NAME,
+            prompt=prompt,
+            stream=True,
+            options={"temperature": LLM_TEMPERATURE}
+        )
+        async for part in stream:
+            if part.get("response"):
+                yield part["response"]
+
+    async def _events(self, question: str, reflect: bool) -> AsyncIterator[Dict]:
+        with request_trace("api_query"):
+            async for event in self._answer_events(question, reflect):
+                yield event
+
+    async def _answer_events(self, question: str, reflect: bool) -> AsyncIterator[Dict]:
+        docs: List[Document] = []
+        try:
+            with span("cache_lookup"):
+                cached = await asyncio.to_thread(self.qa.cache.lookup, question)
+            if cached:
+                logger.info("Using cached response")
+                docs = cached.get('source_documents', [])
+                yield {"type": "sources", "source_documents": docs}
+                yield {"type": "token", "text": cached['result']}
+                yield {"type": "done", "result": cached['result'], "source_documents": docs}
+                return
+
+            docs = await asyncio.to_thread(self.qa.retrieve, question)
+            yield {"type": "sources", "source_documents": docs}
+            if not docs:
+                yield {"type": "done", "result": NO_ANSWER_MESSAGE, "source_documents": docs}
+                return
+
+            parts = []
+            async for token in traced_async_tokens(self._generate(self.qa.build_prompt(question, docs))):
+                parts.append(token)
+                yield {"type": "token", "text": token}
+
+            result = "".join(parts)
+            if len(result.strip()) < 10:
+                result = NO_ANSWER_MESSAGE
+            else:
+                await asyncio.to_thread(
+                    self.qa.cache.add, question, {'result': result, 'source_documents': docs}
+                )
+            yield {"type": "done", "result": result, "source_documents": docs}
+
+        except Exception as e:
+            logger.error(f"QA stream error: {str(e)}")
+            yield {"type": "done", "result": ERROR_MESSAGE, "source_documents": docs}
+            return
+
+        source_texts = [doc.page_content for doc in docs if doc.page_content]
+        if reflect and source_texts and result != NO_ANSWER_MESSAGE:
+            try:
+                reflection = await asyncio.to_thread(
+                    self.reflection_chain.analyze_response, result, source_texts
+                )
+                yield {
+                    "type": "reflection",
+                    "analysis": reflection.get("analysis", {}),
+                    "improved_response": reflection.get("improved_response")
+                }
+            except Exception as e:
+                logger.error(f"Reflection error: {str(e)}")
+
+    async def stream(self, question: str, reflect: bool = False) -> AsyncIterator[Dict]:
+        """
+        Answer a question, yielding the same events as QAWithFallback.stream
+
+        A final {"type": "reflection", ...} event follows when `reflect` is
+        set, and {"type": "error", ...} replaces the rest of the stream if
+        the request runs past request_timeout.
+        """
+        # Produce events in their own task so the HTTP stream to Ollama
+        # stays within one task and is cancelled cleanly on timeout
+        queue: asyncio.Queue = asyncio.Queue(maxsize=_STREAM_BUFFER)
+
+        async def produce() -> None:
+            async for event in self._events(question.strip(), reflect):
+                await queue.put(event)
+            await queue.put(None)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.request_timeout
+        producer = asyncio.create_task(produce())
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), max(deadline - loop.time(), 0))
+                except asyncio.TimeoutError:
+                    logger.warning(f"Query timed out after {self.request_timeout}s")
+                    yield {"type": "error", "detail": "Request timed out"}
+                    return
+                if event is None:
+                    return
+                yield event
+        finally:
+            producer.cancel()
+            with suppress(asyncio.CancelledError):
+                await producer
+
+    async def answer(self, question: str, reflect: bool = False) -> Dict:
+        """
+        Answer a question and return the final result
+
+        Raises:
+            HTTPException: 504 if the request runs past request_timeout
+        """
+        response: Dict[str, Any] = {"result": "", "source_documents": [], "reflection": None}
+        async for event in self.stream(question, reflect):
+            if event["type"] == "done":
+                response["result"] = event["result"]
+                response["source_documents"] = event["source_documents"]
+            elif event["type"] == "reflection":
+                response["reflection"] = {
+                    "analysis": event["analysis"],
+                    "improved_response": event["improved_response"]
+                }
+            elif event["type"] == "error":
+                raise HTTPException(status_code=504, detail=event["detail"])
+        return response
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    vectorstore = await asyncio.to_thread(load_vector_store, DB_FAISS_PATH)
+    qa = await asyncio.to_thread(get_qa_chain, vectorstore)
+    reflection_chain = resource_manager.get_or_create(
+        "reflection_chain",
+        lambda: SelfReflectionChain(use_llm)
+    )
+    app.state.service = RAGService(qa, reflection_chain, create_async_client(API_REQUEST_TIMEOUT))
+    logger.info(f"Query service ready (max concurrency {API_MAX_CONCURRENCY})")
+    try:
+        yield
+    finally:
+        resource_manager.cleanup()
+
+app = FastAPI(title="MedAgent query service", lifespan=lifespan)
+
+@app.get("/health")
+async def health() -> Dict:
+    service: RAGService = app.state.service
+    resources = await asyncio.to_thread(resource_manager.check_health)
+    return {
+        "status": "ok" if all(resources.values()) else "degraded",
+        "resources": resources,
+        "in_flight": service.in_flight,
+        "max_concurrency": service.max_concurrency
+    }
+
+@app.get("/metrics")
+async def metrics() -> Dict:
+    """Latency percentiles per pipeline stage over the recent window"""
+    service: RAGService = app.state.service
+    return {"in_flight": service.in_flight, "stages": histogram.snapshot()}
+
+@app.post("/query")
+async def query(request: QueryRequest) -> Dict:
+    """Answer a question in one response"""
+    service: RAGService = app.state.service
+    await service.acquire()
+    try:
+        response = await service.answer(request.question, request.reflect)
+    finally:
+        service.release()
+    return event_to_json(response)
+
+@app.post("/query/stream")
+async def query_stream(request: QueryRequest) -> StreamingResponse:
+    """Answer a question as newline-delimited JSON events"""
+    service: RAGService = app.state.service
+    await service.acquire()
+
+    async def body() -> AsyncIterator[str]:
+        try:
+            async for event in service.stream(request.question, request.reflect):
+                yield json.dumps(event_to_json(event)) + "\n"
+        finally:
+            service.release()
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+def main(argv: Optional[List[str]] = None) -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Run the MedAgent query service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args(argv)
+    uvicorn.run(app, host=args.host, port=args.port)
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,16 @@
 # backend/config.py
 import os
 from pathlib import Path
-from typing import Any
+from typing import Any, Optional
 from pydantic import BaseModel, Field, validator
 from dotenv import load_dotenv
 
 # Load environment variables from .env file if present
 load_dotenv()
 
+# Number of CPU cores available to this process
+_CPU_COUNT = os.cpu_count() or 1
+
 class Config(BaseModel):
     """Configuration with validation"""
     
@@ -30,6 +33,47 @@ class Config(BaseModel):
         default="sentence-transformers/all-MiniLM-L6-v2",
         description="HuggingFace model name for embeddings"
     )
+    EMBEDDING_CACHE_PATH: Path = Field(
+        default=None,
+        description="SQLite file caching document embeddings across rebuilds"
+    )
+    EMBEDDING_BACKEND: str = Field(
+        default="torch",
+        pattern="^(torch|onnx|onnx-int8)$",
+        description="Run the embedding model with sentence-transformers or ONNX Runtime (fp32 or int8)"
+    )
+    EMBEDDING_DEVICE: str = Field(
+        default="cpu",
+        description="Torch device for the torch embedding backend"
+    )
+    EMBEDDING_BATCH_SIZE: int = Field(
+        default=32,
+        ge=1,
+        le=1024,
+        description="Texts per embedding model forward pass"
+    )
+    EMBEDDING_NORMALIZE: bool = Field(
+        default=True,
+        description="L2-normalize embeddings in the model"
+    )
+    EMBEDDING_THREADS: Optional[int] = Field(
+        default=None,
+        ge=1,
+        description="Intra-op CPU threads for the embedding model (unset keeps the runtime default)"
+    )
+    EMBEDDING_ONNX_FILE: Optional[str] = Field(
+        default=None,
+        description="ONNX file in the model repository, overriding the backend's default"
+    )
+    QUERY_EMBEDDING_CACHE_SIZE: int = Field(
+        default=1024,
+        ge=0,
+        description="Query vectors kept in an in-memory LRU cache (0 disables it)"
+    )
+    EMBEDDING_WARMUP: bool = Field(
+        default=True,
+        description="Run dummy encodes and a dummy search when the vector store is loaded"
+    )
     
     # Chunking parameters
     CHUNK_SIZE: int = Field(
@@ -44,6 +88,21 @@ class Config(BaseModel):
         le=500,
         description="Overlap between consecutive chunks"
     )
+    CHUNKER: str = Field(
+        default="structured",
+        pattern="^(structured|recursive)$",
+        description="Chunker: structure-aware single pass, or langchain's RecursiveCharacterTextSplitter"
+    )
+    CHUNK_MAX_TOKENS: int = Field(
+        default=256,
+        ge=0,
+        le=8192,
+        description="Maximum tokens per chunk for the structured chunker (0 limits characters only)"
+    )
+    CHUNK_TOKENIZER: Optional[str] = Field(
+        default=None,
+        description="Hugging Face tokenizer counting chunk tokens (unset uses the embedding model's)"
+    )
     
     # Retrieval parameters
     RETRIEVAL_K: int = Field(
@@ -52,6 +111,119 @@ class Config(BaseModel):
         le=10,
         description="Number of documents to retrieve"
     )
+    RETRIEVAL_MIN_SCORE: float = Field(
+        default=0.3,
+        ge=0.0,
+        le=1.0,
+        description="Minimum dense cosine similarity of a source sent to the LLM, whatever the retriever"
+    )
+    RETRIEVAL_FALLBACK_SCORE: float = Field(
+        default=0.1,
+        ge=0.0,
+        le=1.0,
+        description="Relaxed minimum similarity used when no source reaches RETRIEVAL_MIN_SCORE"
+    )
+    RETRIEVAL_RELATIVE_SCORE: float = Field(
+        default=0.5,
+        ge=0.0,
+        le=1.0,
+        description="Fraction of the best source's similarity other sources must reach"
+    )
+    HYBRID_SEARCH: bool = Field(
+        default=True,
+        description="Fuse BM25 and dense results with reciprocal rank fusion"
+    )
+    BM25_K1: float = Field(
+        default=1.2,
+        ge=0.0,
+        le=3.0,
+        description="BM25 term frequency saturation"
+    )
+    BM25_B: float = Field(
+        default=0.75,
+        ge=0.0,
+        le=1.0,
+        description="BM25 document length normalization"
+    )
+    RRF_K: int = Field(
+        default=60,
+        ge=1,
+        le=1000,
+        description="Rank offset of reciprocal rank fusion"
+    )
+    RERANK_MODEL: Optional[str] = Field(
+        default=None,
+        description="Cross-encoder used to rerank retrieved chunks (unset disables reranking)"
+    )
+    RERANK_CANDIDATES: int = Field(
+        default=50,
+        ge=1,
+        le=1000,
+        description="Number of chunks retrieved for reranking"
+    )
+    RERANK_BATCH_SIZE: int = Field(
+        default=32,
+        ge=1,
+        le=1024,
+        description="Number of (query, chunk) pairs scored per cross-encoder batch"
+    )
+    RERANK_CACHE_SIZE: int = Field(
+        default=10000,
+        ge=0,
+        description="Number of cached (query, chunk) rerank scores"
+    )
+    CONTEXT_TOKEN_BUDGET: int = Field(
+        default=1500,
+        ge=100,
+        le=32768,
+        description="Maximum number of source tokens put into a prompt"
+    )
+    CONTEXT_TOKENIZER: Optional[str] = Field(
+        default=None,
+        description="Hugging Face tokenizer used to count prompt tokens (unset estimates them)"
+    )
+    
+    # ANN index settings
+    INDEX_TYPE: str = Field(
+        default="flat",
+        pattern="^(flat|ivf_flat|ivf_pq|hnsw)$",
+        description="FAISS index type built by create_vector_store"
+    )
+    INDEX_NLIST: int = Field(
+        default=1024,
+        ge=1,
+        le=65536,
+        description="Number of IVF lists (reduced automatically for small corpora)"
+    )
+    INDEX_PQ_M: int = Field(
+        default=48,
+        ge=1,
+        le=384,
+        description="Number of PQ sub-quantizers, must divide the embedding dimension"
+    )
+    INDEX_HNSW_M: int = Field(
+        default=32,
+        ge=4,
+        le=128,
+        description="Number of HNSW neighbours per node"
+    )
+    INDEX_TRAIN_SIZE: int = Field(
+        default=50000,
+        ge=1000,
+        description="Number of vectors buffered to train IVF indexes"
+    )
+    INDEX_NPROBE: int = Field(
+        default=16,
+        ge=1,
+        le=65536,
+        description="IVF lists visited per query"
+    )
+    INDEX_EF_SEARCH: int = Field(
+        default=64,
+        ge=1,
+        le=4096,
+        description="HNSW candidate list size per query"
+    )
     
     # LLM settings
     LLM_MODEL_NAME: str = Field(
@@ -64,13 +236,118 @@ class Config(BaseModel):
         le=1.0,
         description="Temperature for LLM sampling"
     )
+    OLLAMA_BASE_URL: str = Field(
+        default="http://localhost:11434",
+        description="Base URL of the Ollama server"
+    )
+    REFLECTION_MODE: str = Field(
+        default="single_pass",
+        pattern="^(single_pass|two_pass)$",
+        description="Reflect and improve in one LLM call, or analyze and improve separately"
+    )
+    REFLECTION_BACKGROUND: bool = Field(
+        default=True,
+        description="Show the draft answer at once and update it when reflection finishes"
+    )
+    
+    # Response cache settings
+    SEMANTIC_CACHE_THRESHOLD: float = Field(
+        default=0.95,
+        ge=0.0,
+        le=1.0,
+        description="Cosine similarity above which a cached answer with the same numbers and qualifiers is reused (1 reuses exact matches only)"
+    )
+    SEMANTIC_CACHE_SIZE: int = Field(
+        default=1000,
+        ge=1,
+        le=100000,
+        description="Maximum number of cached answers"
+    )
+    SEMANTIC_CACHE_TTL: int = Field(
+        default=86400,
+        ge=1,
+        description="Seconds a cached answer stays valid"
+    )
+    SEMANTIC_CACHE_PATH: Optional[Path] = Field(
+        default=None,
+        description="File the answer cache is persisted to (unset keeps it in memory)"
+    )
+    
+    # API service settings
+    API_MAX_CONCURRENCY: int = Field(
+        default=4,
+        ge=1,
+        le=256,
+        description="Maximum number of questions answered at the same time"
+    )
+    API_QUEUE_TIMEOUT: float = Field(
+        default=10.0,
+        ge=0.0,
+        description="Seconds a request waits for a free slot before it is rejected (0 rejects at once when all slots are busy)"
+    )
+    API_REQUEST_TIMEOUT: float = Field(
+        default=120.0,
+        gt=0.0,
+        description="Seconds allowed for answering one question"
+    )
+    API_URL: Optional[str] = Field(
+        default=None,
+        description="URL of the query service; when set the Streamlit app is a thin client"
+    )
+    
+    # Batch QA settings
+    BATCH_CONCURRENCY: int = Field(
+        default=4,
+        ge=1,
+        le=256,
+        description="Generations sent to Ollama at the same time by batch QA runs"
+    )
+    BATCH_SIZE: int = Field(
+        default=64,
+        ge=1,
+        description="Questions embedded and searched together by batch QA runs"
+    )
+    
+    # Tracing settings
+    TRACING_ENABLED: bool = Field(
+        default=True,
+        description="Record per-stage latencies of the RAG pipeline"
+    )
+    TRACE_WINDOW: int = Field(
+        default=1000,
+        ge=10,
+        description="Most recent samples per stage used for the latency percentiles"
+    )
     
     # Processing settings
     MAX_WORKERS: int = Field(
+        default=_CPU_COUNT,
+        ge=1,
+        le=max(8, 4 * _CPU_COUNT),
+        description="Maximum number of worker threads or processes"
+    )
+    PARSE_MODE: str = Field(
+        default="process",
+        pattern="^(thread|process)$",
+        description="Parse PDFs per file in threads or per page range in processes"
+    )
+    PAGES_PER_TASK: int = Field(
+        default=16,
+        ge=1,
+        le=1000,
+        description="Number of PDF pages parsed by one process pool task"
+    )
+    EMBED_BATCH_SIZE: int = Field(
+        default=256,
+        ge=1,
+        le=8192,
+        description="Number of chunks embedded and indexed per ingest batch"
+    )
+    PIPELINE_QUEUE_SIZE: int = Field(
         default=4,
         ge=1,
-        le=8,
-        description="Maximum number of worker threads"
+        le=64,
+        description="Maximum number of batches buffered between ingest stages"
     )
     
     @validator("DATA_PATH", pre=True)
@@ -85,6 +362,12 @@ class Config(BaseModel):
             v = values["BASE_DIR"] / "vectorstore/database_faiss"
         return Path(v)
         
+    @validator("EMBEDDING_CACHE_PATH", pre=True)
+    def validate_embedding_cache_path(cls, v, values):
+        if v is None:
+            v = values["BASE_DIR"] / "vectorstore/embedding_cache.sqlite"
+        return Path(v)
+        
     class Config:
         validate_assignment = True
         
@@ -92,22 +375,124 @@ class Config(BaseModel):
 config = Config(
     DATA_PATH=os.getenv("DATA_PATH"),
     DB_FAISS_PATH=os.getenv("DB_FAISS_PATH"),
-    EMBEDDING_MODEL_NAME=os.getenv("EMBEDDING_MODEL_NAME"),
+    EMBEDDING_MODEL_NAME=os.getenv("EMBEDDING_MODEL_NAME", "sentence-transformers/all-MiniLM-L6-v2"),
+    EMBEDDING_CACHE_PATH=os.getenv("EMBEDDING_CACHE_PATH"),
+    EMBEDDING_BACKEND=os.getenv("EMBEDDING_BACKEND", "torch"),
+    EMBEDDING_DEVICE=os.getenv("EMBEDDING_DEVICE", "cpu"),
+    EMBEDDING_BATCH_SIZE=int(os.getenv("EMBEDDING_BATCH_SIZE", 32)),
+    EMBEDDING_NORMALIZE=os.getenv("EMBEDDING_NORMALIZE", "true").lower() in ("1", "true", "yes"),
+    EMBEDDING_THREADS=os.getenv("EMBEDDING_THREADS") or None,
+    EMBEDDING_ONNX_FILE=os.getenv("EMBEDDING_ONNX_FILE"),
+    QUERY_EMBEDDING_CACHE_SIZE=int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", 1024)),
+    EMBEDDING_WARMUP=os.getenv("EMBEDDING_WARMUP", "true").lower() in ("1", "true", "yes"),
     CHUNK_SIZE=int(os.getenv("CHUNK_SIZE", 1000)),
     CHUNK_OVERLAP=int(os.getenv("CHUNK_OVERLAP", 200)),
+    CHUNKER=os.getenv("CHUNKER", "structured"),
+    CHUNK_MAX_TOKENS=int(os.getenv("CHUNK_MAX_TOKENS", 256)),
+    CHUNK_TOKENIZER=os.getenv("CHUNK_TOKENIZER"),
     RETRIEVAL_K=int(os.getenv("RETRIEVAL_K", 3)),
+    RETRIEVAL_MIN_SCORE=float(os.getenv("RETRIEVAL_MIN_SCORE", 0.3)),
+    RETRIEVAL_FALLBACK_SCORE=float(os.getenv("RETRIEVAL_FALLBACK_SCORE", 0.1)),
+    RETRIEVAL_RELATIVE_SCORE=float(os.getenv("RETRIEVAL_RELATIVE_SCORE", 0.5)),
+    HYBRID_SEARCH=os.getenv("HYBRID_SEARCH", "true").lower() in ("1", "true", "yes"),
+    BM25_K1=float(os.getenv("BM25_K1", 1.2)),
+    BM25_B=float(os.getenv("BM25_B", 0.75)),
+    RRF_K=int(os.getenv("RRF_K", 60)),
+    RERANK_MODEL=os.getenv("RERANK_MODEL"),
+    RERANK_CANDIDATES=int(os.getenv("RERANK_CANDIDATES", 50)),
+    RERANK_BATCH_SIZE=int(os.getenv("RERANK_BATCH_SIZE", 32)),
+    RERANK_CACHE_SIZE=int(os.getenv("RERANK_CACHE_SIZE", 10000)),
+    CONTEXT_TOKEN_BUDGET=int(os.getenv("CONTEXT_TOKEN_BUDGET", 1500)),
+    CONTEXT_TOKENIZER=os.getenv("CONTEXT_TOKENIZER"),
+    INDEX_TYPE=os.getenv("INDEX_TYPE", "flat"),
+    INDEX_NLIST=int(os.getenv("INDEX_NLIST", 1024)),
+    INDEX_PQ_M=int(os.getenv("INDEX_PQ_M", 48)),
+    INDEX_HNSW_M=int(os.getenv("INDEX_HNSW_M", 32)),
+    INDEX_TRAIN_SIZE=int(os.getenv("INDEX_TRAIN_SIZE", 50000)),
+    INDEX_NPROBE=int(os.getenv("INDEX_NPROBE", 16)),
+    INDEX_EF_SEARCH=int(os.getenv("INDEX_EF_SEARCH", 64)),
     LLM_MODEL_NAME=os.getenv("LLM_MODEL_NAME", "medllama2"),
     LLM_TEMPERATURE=float(os.getenv("LLM_TEMPERATURE", 0.5)),
-    MAX_WORKERS=int(os.getenv("MAX_WORKERS", 4))
+    OLLAMA_BASE_URL=os.getenv("OLLAMA_BASE_URL", "http://localhost:11434"),
+    REFLECTION_MODE=os.getenv("REFLECTION_MODE", "single_pass"),
+    REFLECTION_BACKGROUND=os.getenv("REFLECTION_BACKGROUND", "true").lower() in ("1", "true", "yes"),
+    SEMANTIC_CACHE_THRESHOLD=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", 0.95)),
+    SEMANTIC_CACHE_SIZE=int(os.getenv("SEMANTIC_CACHE_SIZE", 1000)),
+    SEMANTIC_CACHE_TTL=int(os.getenv("SEMANTIC_CACHE_TTL", 86400)),
+    SEMANTIC_CACHE_PATH=os.getenv("SEMANTIC_CACHE_PATH"),
+    API_MAX_CONCURRENCY=int(os.getenv("API_MAX_CONCURRENCY", 4)),
+    API_QUEUE_TIMEOUT=float(os.getenv("API_QUEUE_TIMEOUT", 10.0)),
+    API_REQUEST_TIMEOUT=float(os.getenv("API_REQUEST_TIMEOUT", 120.0)),
+    API_URL=os.getenv("API_URL"),
+    BATCH_CONCURRENCY=int(os.getenv("BATCH_CONCURRENCY", 4)),
+    BATCH_SIZE=int(os.getenv("BATCH_SIZE", 64)),
+    TRACING_ENABLED=os.getenv("TRACING_ENABLED", "true").lower() in ("1", "true", "yes"),
+    TRACE_WINDOW=int(os.getenv("TRACE_WINDOW", 1000)),
+    MAX_WORKERS=int(os.getenv("MAX_WORKERS", _CPU_COUNT)),
+    PARSE_MODE=os.getenv("PARSE_MODE", "process"),
+    PAGES_PER_TASK=int(os.getenv("PAGES_PER_TASK", 16)),
+    EMBED_BATCH_SIZE=int(os.getenv("EMBED_BATCH_SIZE", 256)),
+    PIPELINE_QUEUE_SIZE=int(os.getenv("PIPELINE_QUEUE_SIZE", 4))
 )
 
 # Export all config variables
 DATA_PATH = config.DATA_PATH
 DB_FAISS_PATH = config.DB_FAISS_PATH
 EMBEDDING_MODEL_NAME = config.EMBEDDING_MODEL_NAME
+EMBEDDING_CACHE_PATH = config.EMBEDDING_CACHE_PATH
+EMBEDDING_BACKEND = config.EMBEDDING_BACKEND
+EMBEDDING_DEVICE = config.EMBEDDING_DEVICE
+EMBEDDING_BATCH_SIZE = config.EMBEDDING_BATCH_SIZE
+EMBEDDING_NORMALIZE = config.EMBEDDING_NORMALIZE
+EMBEDDING_THREADS = config.EMBEDDING_THREADS
+EMBEDDING_ONNX_FILE = config.EMBEDDING_ONNX_FILE
+QUERY_EMBEDDING_CACHE_SIZE = config.QUERY_EMBEDDING_CACHE_SIZE
+EMBEDDING_WARMUP = config.EMBEDDING_WARMUP
 CHUNK_SIZE = config.CHUNK_SIZE
 CHUNK_OVERLAP = config.CHUNK_OVERLAP
+CHUNKER = config.CHUNKER
+CHUNK_MAX_TOKENS = config.CHUNK_MAX_TOKENS
+CHUNK_TOKENIZER = config.CHUNK_TOKENIZER
 RETRIEVAL_K = config.RETRIEVAL_K
+RETRIEVAL_MIN_SCORE = config.RETRIEVAL_MIN_SCORE
+RETRIEVAL_FALLBACK_SCORE = config.RETRIEVAL_FALLBACK_SCORE
+RETRIEVAL_RELATIVE_SCORE = config.RETRIEVAL_RELATIVE_SCORE
+HYBRID_SEARCH = config.HYBRID_SEARCH
+BM25_K1 = config.BM25_K1
+BM25_B = config.BM25_B
+RRF_K = config.RRF_K
+RERANK_MODEL = config.RERANK_MODEL
+RERANK_CANDIDATES = config.RERANK_CANDIDATES
+RERANK_BATCH_SIZE = config.RERANK_BATCH_SIZE
+RERANK_CACHE_SIZE = config.RERANK_CACHE_SIZE
+CONTEXT_TOKEN_BUDGET = config.CONTEXT_TOKEN_BUDGET
+CONTEXT_TOKENIZER = config.CONTEXT_TOKENIZER
+INDEX_TYPE = config.INDEX_TYPE
+INDEX_NLIST = config.INDEX_NLIST
+INDEX_PQ_M = config.INDEX_PQ_M
+INDEX_HNSW_M = config.INDEX_HNSW_M
+INDEX_TRAIN_SIZE = config.INDEX_TRAIN_SIZE
+INDEX_NPROBE = config.INDEX_NPROBE
+INDEX_EF_SEARCH = config.INDEX_EF_SEARCH
 LLM_MODEL_NAME = config.LLM_MODEL_NAME
 LLM_TEMPERATURE = config.LLM_TEMPERATURE
-MAX_WORKERS = config.MAX_WORKERS
\ No newline at end of file
+OLLAMA_BASE_URL = config.OLLAMA_BASE_URL
+REFLECTION_MODE = config.REFLECTION_MODE
+REFLECTION_BACKGROUND = config.REFLECTION_BACKGROUND
+SEMANTIC_CACHE_THRESHOLD = config.SEMANTIC_CACHE_THRESHOLD
+SEMANTIC_CACHE_SIZE = config.SEMANTIC_CACHE_SIZE
+SEMANTIC_CACHE_TTL = config.SEMANTIC_CACHE_TTL
+SEMANTIC_CACHE_PATH = config.SEMANTIC_CACHE_PATH
+API_MAX_CONCURRENCY = config.API_MAX_CONCURRENCY
+API_QUEUE_TIMEOUT = config.API_QUEUE_TIMEOUT
+API_REQUEST_TIMEOUT = config.API_REQUEST_TIMEOUT
+API_URL = config.API_URL
+BATCH_CONCURRENCY = config.BATCH_CONCURRENCY
+BATCH_SIZE = config.BATCH_SIZE
+TRACING_ENABLED = config.TRACING_ENABLED
+TRACE_WINDOW = config.TRACE_WINDOW
+MAX_WORKERS = config.MAX_WORKERS
+PARSE_MODE = config.PARSE_MODE
+PAGES_PER_TASK = config.PAGES_PER_TASK
+EMBED_BATCH_SIZE = config.EMBED_BATCH_SIZE
+PIPELINE_QUEUE_SIZE = config.PIPELINE_QUEUE_SIZE
\ No newline at end of file
@@ -0,0 +1,131 @@
+"""Scored retrieval and per-request selection of the chunks sent to the LLM"""
+
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+import faiss
+import numpy as np
+from langchain.schema import Document
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.vectorstores import VectorStoreRetriever
+from ..config import (
+    RETRIEVAL_K,
+    RETRIEVAL_MIN_SCORE,
+    RETRIEVAL_FALLBACK_SCORE,
+    RETRIEVAL_RELATIVE_SCORE
+)
+from .tracing import span
+
+logger = logging.getLogger(__name__)
+
+def dense_search(vectorstore, queries: Sequence[str], k: int) -> List[List[Tuple[str, float]]]:
+    """
+    Nearest chunks of several queries with one embedding call and one FAISS search
+
+    Vectors are L2-normalized, so the squared L2 distance d returned by
+    FAISS maps to cosine similarity 1 - d / 2.
+
+    Returns:
+        List[List[Tuple[str, float]]]: Per query, (chunk_id, cosine similarity), best first
+    """
+    with span("embed_query", queries=len(queries)):
+        if len(queries) == 1:
+            vectors = np.array([vectorstore._embed_query(queries[0])], dtype=np.float32)
+        else:
+            vectors = np.array(vectorstore.embedding_function.embed_documents(list(queries)), dtype=np.float32)
+    if vectorstore._normalize_L2:
+        faiss.normalize_L2(vectors)
+    with span("faiss_search", queries=len(queries)):
+        distances, positions = vectorstore.index.search(vectors, k)
+    return [
+        [
+            (vectorstore.index_to_docstore_id[int(i)], max(0.0, 1.0 - float(d) / 2))
+            for d, i in zip(row_distances, row_positions) if i != -1
+        ]
+        for row_distances, row_positions in zip(distances, positions)
+    ]
+
+def scored_documents(
+    vectorstore,
+    hits: Sequence[Tuple[str, float]],
+    similarities: Optional[Dict[str, float]] = None
+) -> List[Document]:
+    """
+    Read (chunk_id, score) hits from the docstore
+
+    The score goes in metadata['score'] and the chunk's dense cosine
+    similarity to the query in metadata['similarity']; without
+    `similarities` the score is that cosine similarity.
+    """
+    docs = []
+    for chunk_id, score in hits:
+        doc = vectorstore.docstore.search(chunk_id)
+        if not isinstance(doc, Document):
+            logger.warning(f"Chunk {chunk_id} is missing from the docstore")
+            continue
+        similarity = score if similarities is None else similarities[chunk_id]
+        docs.append(Document(
+            page_content=doc.page_content,
+            metadata={**doc.metadata, 'score': score, 'similarity': similarity}
+        ))
+    return docs
+
+class DenseRetriever(VectorStoreRetriever):
+    """FAISS retriever returning candidates with their cosine similarity in metadata['score']"""
+
+    def retrieve_batch(self, queries: Sequence[str]) -> List[List[Document]]:
+        """Candidates of several queries, sharing one embedding call and FAISS search"""
+        k = self.search_kwargs.get("k", RETRIEVAL_K)
+        return [scored_documents(self.vectorstore, hits) for hits in dense_search(self.vectorstore, queries, k)]
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return self.retrieve_batch([query])[0]
+
+def _similarity(doc: Document) -> float:
+    return doc.metadata.get('similarity', doc.metadata.get('score', 1.0))
+
+def select_documents(
+    candidates: Sequence[Document],
+    k: int = RETRIEVAL_K,
+    min_score: float = RETRIEVAL_MIN_SCORE,
+    fallback_score: float = RETRIEVAL_FALLBACK_SCORE,
+    relative_score: float = RETRIEVAL_RELATIVE_SCORE
+) -> List[Document]:
+    """
+    Pick the chunks worth sending to the LLM from one scored candidate set
+
+    Candidates are ranked by their retriever's score (cosine, fused rank
+    or cross-encoder), but thresholds apply to the dense cosine similarity
+    every retriever keeps in metadata['similarity'], so they mean the same
+    whichever retriever is configured. A chunk is kept if it is among the
+    k best and its similarity is at least `min_score` and `relative_score`
+    times the best similarity, so a clear winner is sent alone while close
+    candidates are all kept. If nothing passes, the same candidates are
+    checked once more against `fallback_score`; no second search and no
+    shared state are involved.
+
+    Args:
+        candidates: Retrieved documents with metadata['score'] and
+            metadata['similarity'] (higher is better)
+        k: Maximum number of documents to keep
+        min_score: Absolute similarity threshold
+        fallback_score: Lower threshold used when nothing passes min_score
+        relative_score: Fraction of the best similarity a document must reach
+
+    Returns:
+        List[Document]: Selected documents, best first; empty if none is relevant
+    """
+    ranked = sorted(candidates, key=lambda doc: doc.metadata.get('score', 1.0), reverse=True)
+    if not ranked:
+        return []
+    best = max(_similarity(doc) for doc in ranked)
+    for threshold in (min_score, fallback_score):
+        cutoff = max(threshold, best * relative_score)
+        selected = [doc for doc in ranked[:k] if _similarity(doc) >= cutoff]
+        if selected:
+            if threshold != min_score:
+                logger.info(f"No chunk scored {min_score}, kept {len(selected)} above {threshold}")
+            return selected
+    logger.info(f"No chunk scored {fallback_score} or more (best {best:.3f})")
+    return []
@@ -0,0 +1,182 @@
+"""FAISS index factory, search-time tuning and recall measurement"""
+
+import logging
+import random
+from typing import Any, Dict, List, Optional, Sequence
+import faiss
+import numpy as np
+from ..config import (
+    INDEX_TYPE,
+    INDEX_NLIST,
+    INDEX_PQ_M,
+    INDEX_HNSW_M,
+    INDEX_NPROBE,
+    INDEX_EF_SEARCH
+)
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+
+# FAISS wants roughly this many training points per IVF list
+_MIN_POINTS_PER_LIST = 39
+
+# 8-bit PQ sub-quantizers need at least this many training points
+_PQ_CENTROIDS = 256
+
+def index_spec(
+    index_type: str = INDEX_TYPE,
+    dim: int = 384,
+    n_train: Optional[int] = None,
+    nlist: int = INDEX_NLIST,
+    pq_m: int = INDEX_PQ_M,
+    hnsw_m: int = INDEX_HNSW_M
+) -> str:
+    """
+    Build the faiss.index_factory string for an index type
+
+    Args:
+        index_type: One of INDEX_TYPES
+        dim: Embedding dimension
+        n_train: Number of training vectors available; IVF list counts are
+            reduced so each list gets enough training points
+        nlist: Number of IVF lists
+        pq_m: Number of PQ sub-quantizers (must divide dim)
+        hnsw_m: Number of HNSW neighbours per node
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {index_type}, expected one of {INDEX_TYPES}")
+    if index_type == "flat":
+        return "Flat"
+    if index_type == "hnsw":
+        return f"HNSW{hnsw_m}"
+
+    if n_train is not None:
+        nlist = min(nlist, max(1, n_train // _MIN_POINTS_PER_LIST))
+    if index_type == "ivf_flat":
+        return f"IVF{nlist},Flat"
+    if n_train is not None and n_train < _PQ_CENTROIDS:
+        logger.warning(f"Only {n_train} training vectors, using IVF-Flat instead of IVF-PQ")
+        return f"IVF{nlist},Flat"
+    if dim % pq_m != 0:
+        raise ValueError(f"INDEX_PQ_M={pq_m} must divide the embedding dimension {dim}")
+    return f"IVF{nlist},PQ{pq_m}"
+
+def build_index(
+    dim: int,
+    index_type: str = INDEX_TYPE,
+    n_train: Optional[int] = None
+) -> Any:
+    """Create an empty (possibly untrained) L2 index of the configured type"""
+    spec = index_spec(index_type, dim, n_train)
+    logger.info(f"Building FAISS index '{spec}'")
+    return faiss.index_factory(dim, spec, faiss.METRIC_L2)
+
+def train_index(index: Any, vectors: np.ndarray, normalize: bool = True) -> None:
+    """
+    Train an IVF/PQ index on a sample of the corpus vectors
+
+    A C-contiguous float32 array is used (and normalized) in place rather
+    than copied.
+    """
+    if index.is_trained:
+        return
+    sample = np.ascontiguousarray(vectors, dtype=np.float32)
+    if normalize:
+        faiss.normalize_L2(sample)
+    logger.info(f"Training FAISS index on {len(sample)} vectors")
+    index.train(sample)
+
+def _extract_ivf(index: Any) -> Optional[Any]:
+    """The IVF layer of an index, or None for flat/HNSW indexes"""
+    try:
+        return faiss.extract_index_ivf(index)
+    except RuntimeError:
+        return None
+
+def apply_search_params(
+    index: Any,
+    nprobe: int = INDEX_NPROBE,
+    ef_search: int = INDEX_EF_SEARCH
+) -> None:
+    """Set search-time knobs on IVF (nprobe) and HNSW (efSearch) indexes"""
+    ivf = _extract_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(nprobe, ivf.nlist)
+        logger.info(f"Set IVF nprobe={ivf.nprobe} (nlist={ivf.nlist})")
+        return
+    downcast = faiss.downcast_index(index)
+    if isinstance(downcast, faiss.IndexHNSW):
+        downcast.hnsw.efSearch = ef_search
+        logger.info(f"Set HNSW efSearch={ef_search}")
+
+def describe_index(index: Any) -> Dict:
+    """Summary of an index's type and search parameters for logging and manifests"""
+    info = {"class": type(faiss.downcast_index(index)).__name__, "ntotal": int(index.ntotal)}
+    ivf = _extract_ivf(index)
+    if ivf is not None:
+        info.update({"nlist": int(ivf.nlist), "nprobe": int(ivf.nprobe)})
+    downcast = faiss.downcast_index(index)
+    if isinstance(downcast, faiss.IndexHNSW):
+        info["efSearch"] = int(downcast.hnsw.efSearch)
+    return info
+
+def measure_recall(
+    index: Any,
+    vectors: np.ndarray,
+    k_values: Sequence[int] = (1, 3, 10),
+    n_queries: int = 200,
+    seed: int = 0
+) -> Dict[int, float]:
+    """
+    Recall@k of an ANN index against exact (flat) search over the same vectors
+
+    Args:
+        index: Index under test, holding `vectors` in insertion order
+        vectors: All indexed vectors (already normalized if the index is)
+        k_values: Cut-offs to report
+        n_queries: Number of indexed vectors used as queries
+        seed: Seed for the query sample
+
+    Returns:
+        Dict[int, float]: k -> mean fraction of the exact top-k found
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    flat = faiss.IndexFlatL2(vectors.shape[1])
+    flat.add(vectors)
+
+    rng = random.Random(seed)
+    sample = rng.sample(range(len(vectors)), min(n_queries, len(vectors)))
+    queries = vectors[sample]
+    max_k = min(max(k_values), len(vectors))
+    _, expected = flat.search(queries, max_k)
+    _, found = index.search(queries, max_k)
+
+    recall = {}
+    for k in k_values:
+        k = min(k, max_k)
+        hits = [
+            len(set(expected[i, :k]) & set(found[i, :k])) / k
+            for i in range(len(queries))
+        ]
+        recall[k] = float(np.mean(hits))
+    return recall
+
+def store_vectors(db: Any, batch_size: int = 1024) -> np.ndarray:
+    """
+    Re-derive the normalized vectors of every chunk in a langchain FAISS store
+
+    Chunk texts are re-embedded through the store's embedding function, which
+    is served from the on-disk embedding cache after a build.
+    """
+    positions = sorted(db.index_to_docstore_id)
+    parts: List[np.ndarray] = []
+    for start in range(0, len(positions), batch_size):
+        texts = [
+            db.docstore.search(db.index_to_docstore_id[i]).page_content
+            for i in positions[start:start + batch_size]
+        ]
+        parts.append(np.array(db.embedding_function.embed_documents(texts), dtype=np.float32))
+    vectors = np.concatenate(parts)
+    faiss.normalize_L2(vectors)
+    return vectors
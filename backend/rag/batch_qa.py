@@ -0,0 +1,173 @@
+"""Batched question answering for bulk QA and evaluation runs"""
+
+import json
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import IO, Dict, Iterable, Iterator, List, Optional, Set
+from langchain.schema import Document
+from ..config import BATCH_CONCURRENCY, BATCH_SIZE
+from .adaptive_retrieval import select_documents
+from .retrieval_qa import ERROR_MESSAGE, NO_ANSWER_MESSAGE, QAWithFallback
+
+logger = logging.getLogger(__name__)
+
+def read_questions(path: str) -> Iterator[Dict]:
+    """
+    Questions of a JSONL file ({"question": ..., "id": ...}) or a plain text file
+
+    Plain text files hold one question per line; records without an id are
+    numbered by line.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line) if line.startswith("{") else {"question": line}
+            record.setdefault("id", number)
+            yield record
+
+def _chunks(records: Iterable[Dict], size: int) -> Iterator[List[Dict]]:
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def source_to_dict(doc: Document) -> Dict:
+    """Source reference of a result line, without the chunk text"""
+    return {
+        "source": doc.metadata.get("source"),
+        "page": doc.metadata.get("page"),
+        "end_page": doc.metadata.get("end_page"),
+        "section_title": doc.metadata.get("section_title"),
+        "score": doc.metadata.get("score"),
+        "similarity": doc.metadata.get("similarity")
+    }
+
+class BatchQA:
+    """
+    Answers many questions with batched retrieval and concurrent generation
+
+    Each batch of questions is embedded in one call and searched with one
+    FAISS query on the question matrix (see the retrievers' retrieve_batch);
+    prompts then go to the LLM from a bounded thread pool, so Ollama always
+    has `concurrency` generations queued and Python never waits per question.
+    The semantic answer cache is bypassed so every question is answered
+    from the current index.
+    """
+
+    def __init__(
+        self,
+        qa: QAWithFallback,
+        concurrency: int = BATCH_CONCURRENCY,
+        batch_size: int = BATCH_SIZE
+    ):
+        self.qa = qa
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+
+    def _generate(self, record: Dict, docs: List[Document], retrieved_at: float) -> Dict:
+        question = record["question"]
+        started = time.perf_counter()
+        try:
+            if not docs:
+                result = NO_ANSWER_MESSAGE
+            else:
+                with self.qa.use_llm() as llm:
+                    result = llm.invoke(self.qa.build_prompt(question, docs))
+                if len(result.strip()) < 10:
+                    result = NO_ANSWER_MESSAGE
+            error = None
+        except Exception as e:
+            logger.error(f"Generation failed for question {record['id']}: {str(e)}")
+            result, error = ERROR_MESSAGE, str(e)
+        return {
+            **record,
+            "result": result,
+            "sources": [source_to_dict(doc) for doc in docs],
+            "queue_seconds": round(started - retrieved_at, 4),
+            "generation_seconds": round(time.perf_counter() - started, 4),
+            **({"error": error} if error else {})
+        }
+
+    def run(self, records: Iterable[Dict]) -> Iterator[Dict]:
+        """
+        Answer questions, yielding result records as they complete
+
+        Retrieval runs ahead of generation by at most two batches' worth of
+        questions, which bounds memory for arbitrarily long inputs.
+
+        Args:
+            records: Dicts with a "question" key; other keys are passed through
+
+        Yields:
+            Dict: The input record with "result", "sources" and timings added
+        """
+        pending: Set[Future] = set()
+        max_pending = max(2 * self.batch_size, self.concurrency)
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="batch-qa") as executor:
+            for batch in _chunks(records, self.batch_size):
+                started = time.perf_counter()
+                candidates = self.qa.retriever.retrieve_batch([r["question"] for r in batch])
+                retrieved_at = time.perf_counter()
+                logger.info(f"Retrieved {len(batch)} questions in {retrieved_at - started:.3f}s")
+                for record, docs in zip(batch, candidates):
+                    pending.add(executor.submit(self._generate, record, select_documents(docs), retrieved_at))
+
+                while len(pending) >= max_pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+    def run_to_jsonl(self, records: Iterable[Dict], output: IO[str]) -> int:
+        """Answer questions, writing one JSON line per result as it completes; returns the count"""
+        count = 0
+        started = time.perf_counter()
+        for result in self.run(records):
+            output.write(json.dumps(result, ensure_ascii=False) + "\n")
+            output.flush()
+            count += 1
+        elapsed = time.perf_counter() - started
+        logger.info(f"Answered {count} questions in {elapsed:.1f}s ({count / max(elapsed, 1e-9):.2f}/s)")
+        return count
+
+def main(argv: Optional[List[str]] = None) -> None:
+    import argparse
+    from ..config import DB_FAISS_PATH
+    from .retrieval_qa import get_qa_chain
+    from .resource_manager import resource_manager
+    from .vector_store import load_vector_store
+
+    parser = argparse.ArgumentParser(description="Answer a file of questions in bulk")
+    parser.add_argument("questions", help="JSONL file with a \"question\" per line, or plain text")
+    parser.add_argument("-o", "--output", default="-", help="JSONL file for the answers (default: stdout)")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY,
+                        help="Generations sent to Ollama at the same time")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                        help="Questions embedded and searched together")
+    args = parser.parse_args(argv)
+
+    vectorstore = load_vector_store(str(DB_FAISS_PATH))
+    batch_qa = BatchQA(get_qa_chain(vectorstore), args.concurrency, args.batch_size)
+    try:
+        if args.output == "-":
+            import sys
+            batch_qa.run_to_jsonl(read_questions(args.questions), sys.stdout)
+        else:
+            with open(args.output, "w", encoding="utf-8") as output:
+                batch_qa.run_to_jsonl(read_questions(args.questions), output)
+    finally:
+        resource_manager.cleanup()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""SQLite-backed chunk store replacing the pickled FAISS docstore"""
+
+import json
+import logging
+import sqlite3
+from collections.abc import MutableMapping
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+from langchain.schema import Document
+from langchain_community.docstore.base import AddableMixin, Docstore
+
+logger = logging.getLogger(__name__)
+
+# Let SQLite memory-map up to this many bytes of the chunk file
+_MMAP_SIZE = 1 << 30
+
+class SQLiteDocstore(Docstore, AddableMixin):
+    """
+    Docstore keeping chunk text and metadata in a single SQLite file
+
+    Nothing is loaded at startup: the file is memory-mapped by SQLite and
+    only the chunks returned by a search are read and deserialized. Several
+    processes can share one file read-only, and the OS page cache then holds
+    a single copy instead of one unpickled docstore per process.
+    """
+
+    def __init__(self, path: Union[str, Path], read_only: bool = False):
+        self.path = Path(path)
+        self.read_only = read_only
+        self._lock = Lock()
+        if read_only:
+            self._conn = sqlite3.connect(
+                f"file:{self.path}?mode=ro", uri=True, check_same_thread=False
+            )
+        else:
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS chunks (
+                    id TEXT PRIMARY KEY,
+                    position INTEGER,
+                    text TEXT NOT NULL,
+                    metadata TEXT NOT NULL
+                )"""
+            )
+            self._conn.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS chunks_position ON chunks (position)"
+            )
+            self._conn.commit()
+        self._conn.execute(f"PRAGMA mmap_size={_MMAP_SIZE}")
+
+    def search(self, search: str) -> Union[str, Document]:
+        """Return the chunk with the given id, or a message if it is missing"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT text, metadata FROM chunks WHERE id = ?", (search,)
+            ).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        return Document(page_content=row[0], metadata=json.loads(row[1]))
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        """Add chunks keyed by id"""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO chunks (id, text, metadata) VALUES (?, ?, ?)",
+                [
+                    (chunk_id, doc.page_content, json.dumps(doc.metadata))
+                    for chunk_id, doc in texts.items()
+                ]
+            )
+            self._conn.commit()
+
+    def delete(self, ids: List) -> None:
+        """Delete chunks by id"""
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM chunks WHERE id = ?", [(chunk_id,) for chunk_id in ids]
+            )
+            self._conn.commit()
+
+    def index_map(self) -> "SQLiteIndexMap":
+        """FAISS position -> chunk id mapping stored in the same file"""
+        return SQLiteIndexMap(self)
+
+    def set_positions(self, mapping: Dict[int, str]) -> None:
+        """Replace the whole position -> id mapping"""
+        with self._lock:
+            self._conn.execute("UPDATE chunks SET position = NULL")
+            self._conn.executemany(
+                "UPDATE chunks SET position = ? WHERE id = ?",
+                [(int(position), chunk_id) for position, chunk_id in mapping.items()]
+            )
+            self._conn.commit()
+
+    def iter_chunks(self, batch_size: int = 10000) -> Iterator[Tuple[str, str]]:
+        """Yield (id, text) of indexed chunks in FAISS position order"""
+        last = -1
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT position, id, text FROM chunks "
+                    "WHERE position > ? ORDER BY position LIMIT ?",
+                    (last, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            for _, chunk_id, text in rows:
+                yield chunk_id, text
+            last = rows[-1][0]
+
+    def close(self) -> None:
+        """Close the SQLite connection"""
+        with self._lock:
+            self._conn.close()
+
+class SQLiteIndexMap(MutableMapping):
+    """
+    Lazy replacement for FAISS.index_to_docstore_id
+
+    Lookups hit the position index of the chunk table, so the mapping is
+    never materialized as a dict in memory.
+    """
+
+    def __init__(self, store: SQLiteDocstore):
+        self._store = store
+
+    def _query(self, sql: str, params: tuple = ()) -> List[tuple]:
+        with self._store._lock:
+            return self._store._conn.execute(sql, params).fetchall()
+
+    def __getitem__(self, position: int) -> str:
+        rows = self._query("SELECT id FROM chunks WHERE position = ?", (int(position),))
+        if not rows:
+            raise KeyError(position)
+        return rows[0][0]
+
+    def get(self, position: int, default: Optional[str] = None) -> Optional[str]:
+        try:
+            return self[position]
+        except KeyError:
+            return default
+
+    def __setitem__(self, position: int, chunk_id: str) -> None:
+        self.update({position: chunk_id})
+
+    def __delitem__(self, position: int) -> None:
+        with self._store._lock:
+            self._store._conn.execute(
+                "UPDATE chunks SET position = NULL WHERE position = ?", (int(position),)
+            )
+            self._store._conn.commit()
+
+    def update(self, mapping: Dict[int, str] = None, **kwargs) -> None:
+        with self._store._lock:
+            self._store._conn.executemany(
+                "UPDATE chunks SET position = ? WHERE id = ?",
+                [(int(position), chunk_id) for position, chunk_id in (mapping or {}).items()]
+            )
+            self._store._conn.commit()
+
+    def __iter__(self) -> Iterator[int]:
+        rows = self._query(
+            "SELECT position FROM chunks WHERE position IS NOT NULL ORDER BY position"
+        )
+        return iter([row[0] for row in rows])
+
+    def __len__(self) -> int:
+        return self._query("SELECT COUNT(*) FROM chunks WHERE position IS NOT NULL")[0][0]
+
+    def items(self) -> List[tuple]:
+        return self._query(
+            "SELECT position, id FROM chunks WHERE position IS NOT NULL ORDER BY position"
+        )
+
+    def values(self) -> List[str]:
+        return [chunk_id for _, chunk_id in self.items()]
@@ -0,0 +1,387 @@
+"""Structure-aware, token-length-aware chunking of document pages"""
+
+import logging
+import re
+from collections import deque
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from langchain.schema import Document
+from ..config import (
+    CHUNK_SIZE,
+    CHUNK_OVERLAP,
+    CHUNK_MAX_TOKENS,
+    CHUNK_TOKENIZER,
+    EMBEDDING_MODEL_NAME
+)
+from .context_packing import get_token_counter
+
+logger = logging.getLogger(__name__)
+
+# Longest line still treated as a heading
+_MAX_HEADING_CHARS = 100
+_MAX_HEADING_WORDS = 14
+_HEADING_WORDS = ("Chapter", "Section", "Annex", "Appendix", "Part")
+
+# First characters of bulleted list items
+_LIST_MARKERS = "(•·▪●◦‣∙*-–"
+
+# "3 Treatment", "2.1 Adults", "2.1.3. Dosing", "Annex 2 Drug tables"
+_NUMBERED_HEADING = re.compile(
+    r"^(?:\d+(?:\.\d+)+\.?|\d+|[A-Z]\.|(?:" + "|".join(_HEADING_WORDS) + r")\s+[\dA-Z]+[.:]?)\s+[A-Z(]"
+)
+# "1. Give ORS", "b) 500 mg", "• Monitor"
+_LIST_ITEM = re.compile(r"^(?:\d{1,3}[.)]|[a-z][.)]|\([a-z\d]{1,3}\)|[•·▪●◦‣∙*\-–])\s+")
+# Two or more columns separated by a tab, a pipe or runs of spaces
+_TABLE_ROW = re.compile(r"\t|\s\|\s|\S {2,}\S.* {2,}\S")
+_SENTENCE_END = re.compile(r"(?<=[.!?;])\s+(?=[A-Z0-9(\"'\[])")
+_TERMINAL_PUNCTUATION = ".,;:!?"
+# A paragraph ending otherwise at the bottom of a page continues on the next
+_SENTENCE_PUNCTUATION = ".!?:;)\"'"
+_DIGITS = re.compile(r"\d+")
+
+# Lines at the top and bottom of a page checked for running headers and footers
+_MARGIN_LINES = 2
+# Pages whose margins are remembered (running headers may alternate between odd and even pages)
+_MARGIN_PAGES = 4
+
+# Fraction of chunk_size a chunk needs before a heading closes it
+_MIN_FILL = 0.25
+
+# Bumped whenever chunk boundaries or metadata change, so stores built by
+# an older chunker are rebuilt rather than extended (see _ingest_settings)
+CHUNKER_VERSION = 2
+
+# Block kinds
+HEADING, PARAGRAPH, LIST, TABLE = "heading", "paragraph", "list", "table"
+
+# A unit is the smallest piece placed in a chunk: (text, characters, tokens)
+Unit = Tuple[str, int, int]
+
+def classify_line(line: str) -> str:
+    """Block kind of one stripped, non-empty line of page text"""
+    if ("  " in line or "\t" in line or "|" in line) and _TABLE_ROW.search(line):
+        return TABLE
+    if _LIST_ITEM.match(line):
+        return LIST
+    if (
+        len(line) <= _MAX_HEADING_CHARS
+        and line[-1] not in _TERMINAL_PUNCTUATION
+        and (_NUMBERED_HEADING.match(line) or (line.isupper() and len(line) >= 4))
+        and len(line.split()) <= _MAX_HEADING_WORDS
+    ):
+        return HEADING
+    return PARAGRAPH
+
+def _maybe_structure(line: str) -> bool:
+    """Cheap test ruling out most plain text lines before classify_line"""
+    first = line[0]
+    return (
+        first.isdigit()
+        or first in _LIST_MARKERS
+        or (first.isupper() and (line.isupper() or line[1:2] == "." or line.startswith(_HEADING_WORDS)))
+        or "  " in line or "\t" in line or "|" in line
+        or (first.islower() and line[1:2] in (".", ")"))
+    )
+
+def parse_blocks(text: str) -> List[Tuple[str, List[str]]]:
+    """
+    Group the lines of a page into blocks in one pass
+
+    Wrapped paragraph lines are joined, consecutive list items and table
+    rows form one block each, and a list item keeps the lines that
+    continue it. Blank lines end a block.
+
+    Returns:
+        List[Tuple[str, List[str]]]: (kind, parts) where parts are the
+        block's items, rows or paragraph lines
+    """
+    blocks: List[Tuple[str, List[str]]] = []
+    kind, parts = None, []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            if parts:
+                blocks.append((kind, parts))
+            kind, parts = None, []
+            continue
+        line_kind = classify_line(line) if _maybe_structure(line) else PARAGRAPH
+        if line_kind == PARAGRAPH and kind == LIST and (
+            line[0].islower() or parts[-1][-1] not in ".;:!?"
+        ):
+            # Continuation of the current list item
+            parts[-1] += " " + line
+            continue
+        if line_kind != kind or line_kind == HEADING:
+            if parts:
+                blocks.append((kind, parts))
+            kind, parts = line_kind, []
+        parts.append(line)
+    if parts:
+        blocks.append((kind, parts))
+    return blocks
+
+class StructuredChunker:
+    """
+    Single-pass chunker that follows the layout of clinical documents
+
+    Pages are parsed into headings, paragraphs, numbered or bulleted
+    lists and table rows. Chunks are packed from whole sentences, list
+    items and table rows up to `chunk_size` characters and `max_tokens`
+    tokens, the input limit of the embedding model. A heading starts a new
+    chunk (unless the current one is still short) and is recorded as the
+    `section_title` of the chunks that follow; a list or table that fits
+    in a chunk is moved whole into the next one instead of being cut, and
+    a table split across chunks repeats its header row. Only text split
+    mid-flow gets the trailing sentences of the previous chunk (up to
+    `chunk_overlap` characters) as overlap. Running page headers and
+    footers are dropped.
+
+    Pages of one file are chunked as one stream (see iter_chunks) and
+    must be passed in order, as iter_documents yields them. Every unit is
+    tokenized once and the overlap is bounded, so the cost is linear in
+    the document length.
+    """
+
+    def __init__(
+        self,
+        chunk_size: int = CHUNK_SIZE,
+        chunk_overlap: int = CHUNK_OVERLAP,
+        max_tokens: int = CHUNK_MAX_TOKENS,
+        count_tokens: Optional[Callable[[str], int]] = None
+    ):
+        if chunk_overlap >= chunk_size:
+            raise ValueError(f"chunk_overlap ({chunk_overlap}) must be smaller than chunk_size ({chunk_size})")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.max_tokens = max_tokens or float("inf")
+        if count_tokens is None and max_tokens:
+            count_tokens = get_token_counter(CHUNK_TOKENIZER or EMBEDDING_MODEL_NAME)
+        self.count_tokens = count_tokens or (lambda text: 0)
+        self._file: Optional[str] = None
+        self._section: Optional[str] = None
+        self._margins: Deque[Set[str]] = deque(maxlen=_MARGIN_PAGES)
+        # Units of the chunk being built, each with the separator put
+        # before it and the metadata of the page it comes from
+        self._current: List[Tuple[Unit, str, Dict]] = []
+        self._chars = 0
+        self._tokens = 0
+        self._chunk_section: Optional[str] = None
+        self._headings_only = False
+        # Unfinished last sentence of the previous page, with its page
+        # metadata and whether it continues a paragraph already added
+        self._fragment: Optional[Tuple[str, Dict, bool]] = None
+
+    def _unit(self, text: str) -> Unit:
+        return (text, len(text), self.count_tokens(text))
+
+    def _fits(self, chars: int, tokens: int) -> bool:
+        return chars <= self.chunk_size and tokens <= self.max_tokens
+
+    def _split_oversized(self, unit: Unit) -> List[Unit]:
+        """Cut a unit larger than a whole chunk at word boundaries"""
+        text, chars, tokens = unit
+        ratio = min(self.chunk_size / chars, self.max_tokens / max(tokens, 1))
+        # Aim a little below the limit, as tokens per character vary
+        step = max(1, int(chars * ratio * 0.9))
+        pieces = []
+        start = 0
+        while start < chars:
+            end = min(chars, start + step)
+            if end < chars:
+                space = text.rfind(" ", start + step // 2, end)
+                if space != -1:
+                    end = space
+            piece = text[start:end].strip()
+            if piece:
+                pieces.append(self._unit(piece))
+            start = end
+        return pieces
+
+    def _units(self, kind: str, parts: List[str]) -> List[Unit]:
+        if kind == PARAGRAPH:
+            sentences = _SENTENCE_END.split(" ".join(" ".join(parts).split()))
+            units = [self._unit(s) for s in sentences if s]
+        else:
+            units = [self._unit(part) for part in parts]
+        result = []
+        for unit in units:
+            if self._fits(unit[1], unit[2]):
+                result.append(unit)
+            else:
+                result.extend(self._split_oversized(unit))
+        return result
+
+    def _strip_margins(self, text: str) -> str:
+        """
+        Lines of a page without its running header and footer
+
+        The first and last lines of a page are dropped when one like them
+        (ignoring digits, e.g. page numbers) opened or closed one of the
+        previous pages, so they neither pollute chunks nor replace the
+        section title on every page.
+        """
+        lines = text.splitlines()
+        filled = [i for i, line in enumerate(lines) if line.strip()]
+        keys = set()
+        for i in set(filled[:_MARGIN_LINES] + filled[-_MARGIN_LINES:]):
+            key = _DIGITS.sub("#", lines[i].strip().lower())
+            if any(key in margins for margins in self._margins):
+                lines[i] = ""
+            keys.add(key)
+        self._margins.append(keys)
+        return "\n".join(lines)
+
+    def _emit(self, chunks: List[Document]) -> None:
+        """Close the chunk being built, recording its page range"""
+        current = self._current
+        if current:
+            metadata = dict(current[0][2])
+            if "page" in metadata:
+                metadata["start_page"] = metadata["page"]
+                metadata["end_page"] = current[-1][2].get("page", metadata["page"])
+            if self._chunk_section:
+                metadata["section_title"] = self._chunk_section
+            text = current[0][0][0] + "".join(sep + unit[0] for unit, sep, _ in current[1:])
+            chunks.append(Document(page_content=text, metadata=metadata))
+        self._current, self._chars, self._tokens = [], 0, 0
+
+    def _add(self, unit: Unit, sep: str, metadata: Dict) -> None:
+        if not self._current:
+            self._chunk_section = self._section
+        self._current.append((unit, sep, metadata))
+        self._chars += unit[1] + (1 if len(self._current) > 1 else 0)
+        self._tokens += unit[2]
+
+    def _overlap(self, unit: Unit) -> List[Tuple[Unit, Dict]]:
+        """Trailing units of the current chunk within chunk_overlap that fit before unit"""
+        tail, size, size_tokens = [], unit[1], unit[2]
+        for previous, _, metadata in reversed(self._current[1:]):
+            size += previous[1] + 1
+            size_tokens += previous[2]
+            if size - unit[1] > self.chunk_overlap or not self._fits(size, size_tokens):
+                break
+            tail.append((previous, metadata))
+        return tail[::-1]
+
+    def _add_block(
+        self,
+        kind: str,
+        units: List[Unit],
+        metadata: Dict,
+        chunks: List[Document],
+        first_metadata: Optional[Dict] = None,
+        continues: bool = False
+    ) -> None:
+        """Pack the units of one block, closing chunks as they fill up"""
+        if kind == HEADING:
+            # Consecutive headings ("2 TREATMENT", "2.1 Adults") share a
+            # chunk, and the short tail of a section joins the next one
+            if not self._headings_only and self._chars >= self.chunk_size * _MIN_FILL:
+                self._emit(chunks)
+            self._section = units[0][0]
+            self._add(units[0], "\n", metadata)
+            # What follows belongs to the new section, not to the tail before it
+            self._chunk_section = self._section
+            self._headings_only = True
+            return
+        self._headings_only = False
+        block_chars = sum(unit[1] + 1 for unit in units)
+        block_tokens = sum(unit[2] for unit in units)
+        if (
+            kind != PARAGRAPH
+            and not self._fits(self._chars + block_chars, self._tokens + block_tokens)
+            and self._fits(block_chars, block_tokens)
+            and len(self._current) > 1
+        ):
+            # Keep a list or table whole by starting it in a new chunk
+            self._emit(chunks)
+        header = units[0] if kind == TABLE and len(units) > 1 else None
+        for i, unit in enumerate(units):
+            if self._current and not self._fits(self._chars + unit[1] + 1, self._tokens + unit[2]):
+                carried = self._overlap(unit) if kind == PARAGRAPH else []
+                self._emit(chunks)
+                if header is not None and i > 0 and self._fits(header[1] + unit[1] + 1, header[2] + unit[2]):
+                    self._add(header, "\n", metadata)
+                for previous, previous_metadata in carried:
+                    self._add(previous, " ", previous_metadata)
+            # Sentences of one paragraph run on, other units start a line
+            sep = " " if kind == PARAGRAPH and (i > 0 or continues) else "\n"
+            self._add(unit, sep, first_metadata if i == 0 and first_metadata else metadata)
+
+    def _flush_fragment(self, chunks: List[Document]) -> None:
+        """Add the held unfinished sentence as it is"""
+        if self._fragment:
+            text, metadata, continues = self._fragment
+            self._fragment = None
+            self._add_block(PARAGRAPH, self._units(PARAGRAPH, [text]), metadata, chunks, continues=continues)
+
+    def _finish(self) -> List[Document]:
+        """Close the current file: flush its unfinished sentence and last chunk"""
+        chunks: List[Document] = []
+        self._flush_fragment(chunks)
+        self._emit(chunks)
+        self._headings_only = False
+        return chunks
+
+    def _feed(self, page: Document) -> List[Document]:
+        """Add one page, returning the chunks it completes"""
+        chunks: List[Document] = []
+        file = page.metadata.get("file_path", page.metadata.get("source"))
+        if file != self._file:
+            chunks.extend(self._finish())
+            self._file, self._section = file, None
+            self._margins.clear()
+
+        blocks = parse_blocks(self._strip_margins(page.page_content))
+        metadata = page.metadata
+        first_metadata = None
+        continues = False
+        if self._fragment:
+            if blocks and blocks[0][0] == PARAGRAPH:
+                # The sentence cut by the page break continues here
+                text, first_metadata, continues = self._fragment
+                self._fragment = None
+                blocks[0] = (PARAGRAPH, [text] + blocks[0][1])
+            else:
+                self._flush_fragment(chunks)
+
+        for i, (kind, parts) in enumerate(blocks):
+            units = self._units(kind, parts)
+            block_first_metadata = first_metadata if i == 0 else None
+            block_continues = continues if i == 0 else False
+            if (
+                i == len(blocks) - 1
+                and kind == PARAGRAPH
+                and units
+                and units[-1][0][-1] not in _SENTENCE_PUNCTUATION
+            ):
+                # Hold the unfinished last sentence for the next page
+                text = units.pop()[0]
+                self._fragment = (
+                    text,
+                    block_first_metadata if not units and block_first_metadata else metadata,
+                    bool(units) or block_continues
+                )
+            if units:
+                self._add_block(kind, units, metadata, chunks, block_first_metadata, block_continues)
+        return chunks
+
+    def iter_chunks(self, pages: Iterable[Document]) -> Iterator[Document]:
+        """
+        Stream the chunks of pages given in file and page order
+
+        Chunks run on across page breaks, so a recommendation split over
+        two pages stays in one chunk; its metadata is that of the first
+        page, with the page range in start_page and end_page. Only the
+        chunk being built is held, so memory does not grow with the
+        document length.
+        """
+        for page in pages:
+            yield from self._feed(page)
+        yield from self._finish()
+
+    def split_documents(self, documents: Iterable[Document]) -> List[Document]:
+        """Chunk pages in order; same interface as langchain's text splitters"""
+        return list(self.iter_chunks(documents))
+
+    def split_text(self, text: str) -> List[str]:
+        return [chunk.page_content for chunk in self.iter_chunks([Document(page_content=text)])]
@@ -0,0 +1,163 @@
+"""Fit retrieved sources into a prompt token budget"""
+
+import logging
+import re
+from functools import lru_cache
+from typing import Callable, List, Optional, Sequence, Set
+from langchain.schema import Document
+from ..config import CHUNK_OVERLAP, CONTEXT_TOKEN_BUDGET, CONTEXT_TOKENIZER
+
+logger = logging.getLogger(__name__)
+
+# Shortest shared text treated as chunk overlap rather than coincidence
+_MIN_OVERLAP = 32
+
+# Rough characters per token for Llama-style tokenizers on English text
+_CHARS_PER_TOKEN = 4
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_WORD = re.compile(r"[a-z0-9]{3,}")
+_STOPWORDS = {
+    "the", "and", "for", "are", "was", "were", "with", "that", "this", "from",
+    "what", "which", "how", "can", "not", "but", "have", "has", "been", "its",
+    "into", "may", "also", "such", "than", "then", "there", "their", "they",
+    "about", "does", "should", "would", "could", "will", "you", "your", "when",
+    "who", "why"
+}
+
+@lru_cache(maxsize=4)
+def get_token_counter(tokenizer_name: Optional[str] = CONTEXT_TOKENIZER) -> Callable[[str], int]:
+    """
+    Token counting function for prompt budgets
+
+    Args:
+        tokenizer_name: Hugging Face tokenizer matching the LLM (e.g. a Llama 2
+            tokenizer for medllama2). Without one, tokens are estimated from
+            the character count.
+    """
+    if tokenizer_name:
+        try:
+            from transformers import AutoTokenizer
+            tokenizer = AutoTokenizer.from_pretrained(tokenizer_name)
+            return lambda text: len(tokenizer.encode(text, add_special_tokens=False))
+        except Exception as e:
+            logger.warning(f"Could not load tokenizer {tokenizer_name}, estimating tokens: {e}")
+    return lambda text: max(1, len(text) // _CHARS_PER_TOKEN)
+
+def _terms(text: str) -> Set[str]:
+    return {w for w in _WORD.findall(text.lower()) if w not in _STOPWORDS}
+
+def _overlap(a: str, b: str, max_overlap: int) -> int:
+    """Length of the longest suffix of a that is a prefix of b"""
+    probe = b[:_MIN_OVERLAP]
+    if len(probe) < _MIN_OVERLAP:
+        return 0
+    tail = a[-(max_overlap + _MIN_OVERLAP):]
+    best = 0
+    start = tail.find(probe)
+    while start != -1:
+        length = len(tail) - start
+        if b.startswith(tail[start:]):
+            best = max(best, length)
+        start = tail.find(probe, start + 1)
+    return best
+
+def _rank(docs: Sequence[Document]) -> List[Document]:
+    """Order by retrieval score if present (higher is better), else keep retrieval order"""
+    if all('score' in doc.metadata for doc in docs):
+        return sorted(docs, key=lambda doc: doc.metadata['score'], reverse=True)
+    return list(docs)
+
+def _dedupe(docs: List[Document], max_overlap: int) -> List[Document]:
+    """Drop repeated chunks and cut text shared with an already kept chunk"""
+    kept: List[Document] = []
+    for doc in docs:
+        text = doc.page_content.strip()
+        source = doc.metadata.get('source')
+        for other in kept:
+            if other.metadata.get('source') != source:
+                continue
+            if text in other.page_content:
+                text = ""
+                break
+            # Neighbouring chunks share CHUNK_OVERLAP characters at the seam
+            head = _overlap(other.page_content, text, max_overlap)
+            if head:
+                text = text[head:].strip()
+            tail = _overlap(text, other.page_content, max_overlap)
+            if tail:
+                text = text[:-tail].strip()
+        if text:
+            kept.append(Document(page_content=text, metadata=dict(doc.metadata)))
+    return kept
+
+def _trim(text: str, query_terms: Set[str], budget: int, count_tokens: Callable[[str], int]) -> str:
+    """Keep the sentences sharing most terms with the query that fit the budget"""
+    sentences = [s for s in _SENTENCE_END.split(text) if s.strip()]
+    ranked = sorted(
+        range(len(sentences)),
+        key=lambda i: len(_terms(sentences[i]) & query_terms),
+        reverse=True
+    )
+    chosen, used = set(), 0
+    for i in ranked:
+        if not _terms(sentences[i]) & query_terms:
+            break
+        cost = count_tokens(sentences[i])
+        if used + cost <= budget:
+            chosen.add(i)
+            used += cost
+    return " ".join(sentences[i] for i in sorted(chosen))
+
+def pack_context(
+    docs: Sequence[Document],
+    query: str,
+    budget: int = CONTEXT_TOKEN_BUDGET,
+    count_tokens: Optional[Callable[[str], int]] = None,
+    max_overlap: int = CHUNK_OVERLAP
+) -> List[Document]:
+    """
+    Select and trim sources so their text fits a token budget
+
+    Sources are ranked by retrieval score, repeated and overlapping chunk
+    text is removed, and whole sources are kept while they fit. A source
+    that does not fit is cut down to its sentences most relevant to the
+    query, and packing stops once the budget is spent.
+
+    Args:
+        docs: Retrieved documents, best first unless they carry a 'score'
+        query: Question or claims the sources should support
+        budget: Maximum number of context tokens
+        count_tokens: Token counter, defaults to get_token_counter()
+        max_overlap: Largest chunk overlap to look for
+
+    Returns:
+        List[Document]: Copies of the selected documents with packed text
+    """
+    count_tokens = count_tokens or get_token_counter()
+    query_terms = _terms(query)
+    packed: List[Document] = []
+    remaining = budget
+    for doc in _dedupe(_rank(docs), max_overlap):
+        cost = count_tokens(doc.page_content)
+        if cost > remaining:
+            text = _trim(doc.page_content, query_terms, remaining, count_tokens)
+            if not text:
+                continue
+            doc = Document(page_content=text, metadata=doc.metadata)
+            cost = count_tokens(text)
+        packed.append(doc)
+        remaining -= cost
+        if remaining <= 0:
+            break
+    logger.debug(f"Packed {len(packed)} of {len(docs)} sources into {budget - remaining} tokens")
+    return packed
+
+def pack_texts(
+    texts: Sequence[str],
+    query: str,
+    budget: int = CONTEXT_TOKEN_BUDGET
+) -> List[str]:
+    """pack_context for plain source texts"""
+    docs = [Document(page_content=text) for text in texts]
+    return [doc.page_content for doc in pack_context(docs, query, budget)]
@@ -1,15 +1,17 @@
 import logging
 import concurrent.futures
-from langchain.document_loaders.base import DocumentLoadError
+from collections import deque
 from pathlib import Path
-from typing import List, Tuple, Optional, Dict
+from typing import Callable, Iterable, Iterator, List, Tuple, Optional, Dict, Set
+from pypdf import PdfReader
 from langchain_community.document_loaders import (
     PyPDFLoader,
     DirectoryLoader,
     UnstructuredWordDocumentLoader
 )
 from langchain.schema import Document
-from ..config import DATA_PATH, MAX_WORKERS
+from ..config import DATA_PATH, MAX_WORKERS, PARSE_MODE, PAGES_PER_TASK
+from .exceptions import DocumentError as DocumentLoadError
 from datetime import datetime
 import hashlib
 
@@ -23,6 +25,43 @@ def get_file_hash(file_path: str) -> str:
     with open(file_path, 'rb') as f:
         return hashlib.md5(f.read()).hexdigest()
 
+def annotate_documents(
+    docs: List[Document],
+    file_path: str,
+    file_hash: str
+) -> None:
+    """Add source, hash and content metadata to the pages of one file"""
+    file_name = Path(file_path).name
+    date_loaded = datetime.now().isoformat()
+    for i, doc in enumerate(docs):
+        if not hasattr(doc, 'metadata'):
+            doc.metadata = {}
+            
+        # Basic metadata
+        doc.metadata.update({
+            'source': file_name,
+            'file_path': file_path,
+            'date_loaded': date_loaded,
+            'hash': file_hash
+        })
+        
+        # For PDF documents, page numbers should already be included
+        # For other documents, we'll add section numbers
+        if 'page' not in doc.metadata:
+            doc.metadata['section'] = i + 1
+        
+        # Add content length and hash for reference
+        doc.metadata['content_length'] = len(doc.page_content)
+        doc.metadata['content_hash'] = hashlib.md5(
+            doc.page_content.encode()
+        ).hexdigest()
+
+def load_file(file_path: str, loader_cls) -> List[Document]:
+    """Load and annotate the pages of one file, bypassing the document cache"""
+    docs = loader_cls(file_path).load()
+    annotate_documents(docs, file_path, get_file_hash(file_path))
+    return docs
+
 def load_single_document(file_path: str, loader_cls) -> Optional[List[Document]]:
     """Load a single document with caching and optimized processing"""
     try:
@@ -37,29 +76,7 @@ def load_single_document(file_path: str, loader_cls) -> Optional[List[Document]]
         
         if docs:
             # Add detailed metadata
-            file_name = Path(file_path).name
-            for i, doc in enumerate(docs):
-                if not hasattr(doc, 'metadata'):
-                    doc.metadata = {}
-                    
-                # Basic metadata
-                doc.metadata.update({
-                    'source': file_name,
-                    'file_path': file_path,
-                    'date_loaded': datetime.now().isoformat(),
-                    'hash': file_hash
-                })
-                
-                # For PDF documents, page numbers should already be included
-                # For other documents, we'll add section numbers
-                if 'page' not in doc.metadata:
-                    doc.metadata['section'] = i + 1
-                
-                # Add content length and hash for reference
-                doc.metadata['content_length'] = len(doc.page_content)
-                doc.metadata['content_hash'] = hashlib.md5(
-                    doc.page_content.encode()
-                ).hexdigest()
+            annotate_documents(docs, file_path, file_hash)
             
             # Cache the processed documents
             _document_cache[file_hash] = docs
@@ -80,57 +97,238 @@ def load_single_document(file_path: str, loader_cls) -> Optional[List[Document]]
         logger.error(f"Failed to load document {file_path}: {str(e)}")
         return None
 
-def load_documents(data_path: str = DATA_PATH) -> List[Document]:
-    """Load documents with parallel processing and caching"""
+# Supported file patterns and their loaders
+SUPPORTED_FORMATS: List[Tuple[str, type]] = [
+    ("*.pdf", PyPDFLoader),
+    ("*.docx", UnstructuredWordDocumentLoader),
+]
+
+def discover_documents(data_path: str = DATA_PATH) -> List[Tuple[str, type]]:
+    """Find all supported files under data_path with their loader classes"""
     data_path = Path(data_path)
     if not data_path.exists():
         raise DocumentLoadError(f"Data path does not exist: {data_path}")
 
-    logger.info(f"Starting document loading from: {data_path}")
-    
-    supported_formats: List[Tuple[str, type]] = [
-        ("*.pdf", PyPDFLoader),
-        ("*.docx", UnstructuredWordDocumentLoader),
-    ]
-    
+    files_to_process = []
+    for pattern, loader_cls in SUPPORTED_FORMATS:
+        matched_files = sorted(data_path.glob(pattern))
+        logger.info(f"Found {len(matched_files)} {pattern} files")
+        files_to_process.extend([
+            (str(f), loader_cls)
+            for f in matched_files
+        ])
+    return files_to_process
+
+# Per-process cache of open PDF readers, so consecutive page ranges of
+# the same file do not re-parse its cross-reference table
+_worker_readers: Dict[str, PdfReader] = {}
+_MAX_WORKER_READERS = 4
+
+# (file_path, loader_cls, file_hash, start_page, end_page)
+ParseTask = Tuple[str, type, str, int, int]
+
+def _get_worker_reader(file_path: str) -> PdfReader:
+    reader = _worker_readers.get(file_path)
+    if reader is None:
+        if len(_worker_readers) >= _MAX_WORKER_READERS:
+            _worker_readers.pop(next(iter(_worker_readers)))
+        reader = PdfReader(file_path)
+        _worker_readers[file_path] = reader
+    return reader
+
+def _parse_task(task: ParseTask) -> List[Document]:
+    """Parse one page range of a PDF, or a whole non-PDF file (runs in a worker process)"""
+    file_path, loader_cls, file_hash, start, end = task
+    if loader_cls is PyPDFLoader:
+        reader = _get_worker_reader(file_path)
+        docs = [
+            Document(
+                page_content=reader.pages[page].extract_text(),
+                metadata={'source': file_path, 'page': page}
+            )
+            for page in range(start, end)
+        ]
+    else:
+        docs = loader_cls(file_path).load()
+    annotate_documents(docs, file_path, file_hash)
+    return docs
+
+def _parse_tasks(
+    files: List[Tuple[str, type]],
+    pages_per_task: int,
+    failed: Set[str]
+) -> Iterator[ParseTask]:
+    """Split PDFs into page-range tasks; other formats stay one task per file"""
+    for file_path, loader_cls in files:
+        try:
+            file_hash = get_file_hash(file_path)
+            if loader_cls is not PyPDFLoader:
+                yield (file_path, loader_cls, file_hash, 0, 0)
+                continue
+            num_pages = len(PdfReader(file_path).pages)
+            for start in range(0, num_pages, pages_per_task):
+                yield (
+                    file_path, loader_cls, file_hash,
+                    start, min(start + pages_per_task, num_pages)
+                )
+        except Exception as e:
+            failed.add(file_path)
+            logger.error(f"Failed to open document {file_path}: {str(e)}")
+
+def _ordered_map(
+    executor: concurrent.futures.Executor,
+    fn: Callable,
+    tasks: Iterable,
+    window: int
+) -> Iterator[Tuple[object, concurrent.futures.Future]]:
+    """
+    Like executor.map, but keeps at most `window` tasks in flight and yields
+    (task, future) pairs in submission order, so results stream back in order
+    without piling up in the parent.
+    """
+    pending = deque()
+    for task in tasks:
+        pending.append((task, executor.submit(fn, task)))
+        if len(pending) >= window:
+            yield pending.popleft()
+    while pending:
+        yield pending.popleft()
+
+def iter_documents_parallel(
+    files: List[Tuple[str, type]],
+    max_workers: int = MAX_WORKERS,
+    pages_per_task: int = PAGES_PER_TASK,
+    failed: Optional[Set[str]] = None
+) -> Iterator[Document]:
+    """
+    Parse files in a process pool at page-range granularity
+
+    pypdf text extraction is pure Python and GIL-bound, so threads give
+    little speedup. Page ranges of every PDF are spread across worker
+    processes, so one long guideline does not serialize the run, and pages
+    are yielded in file and page order as soon as they are ready.
+
+    Args:
+        files: (file_path, loader_cls) pairs, e.g. from discover_documents
+        max_workers: Number of worker processes
+        pages_per_task: Number of PDF pages parsed per task
+        failed: Receives the paths of files that could not be opened or
+            had a page range fail to parse, so callers can retry them
+
+    Yields:
+        Document: Pages with the same metadata load_single_document produces
+    """
+    failed = set() if failed is None else failed
+    with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for task, future in _ordered_map(
+            executor, _parse_task, _parse_tasks(files, pages_per_task, failed), 2 * max_workers
+        ):
+            file_path, _, _, start, end = task
+            try:
+                yield from future.result()
+            except Exception as e:
+                failed.add(file_path)
+                logger.error(f"Failed to parse {file_path} pages {start}-{end}: {str(e)}")
+
+def iter_documents(
+    files: List[Tuple[str, type]],
+    parse_mode: str = PARSE_MODE,
+    max_workers: int = MAX_WORKERS,
+    failed: Optional[Set[str]] = None
+) -> Iterator[Document]:
+    """
+    Stream the pages of the given files in file and page order
+
+    Pages are not kept in the document cache, so memory stays bounded by
+    the files in flight rather than growing with the corpus.
+
+    Args:
+        files: (file_path, loader_cls) pairs, e.g. from discover_documents
+        parse_mode: "process" or "thread", see load_documents
+        max_workers: Number of worker processes or threads
+        failed: Receives the paths of files that failed to load, entirely
+            or in part
+
+    Yields:
+        Document: One document per page or section
+    """
+    failed = set() if failed is None else failed
+    if parse_mode == "process":
+        yield from iter_documents_parallel(files, max_workers=max_workers, failed=failed)
+        return
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for (file_path, _), future in _ordered_map(
+            executor, lambda task: load_file(*task), files, 2 * max_workers
+        ):
+            try:
+                docs = future.result()
+            except Exception as e:
+                failed.add(file_path)
+                logger.error(f"Failed to load document {file_path}: {str(e)}")
+                continue
+            if docs:
+                yield from docs
+            else:
+                logger.warning(f"No documents extracted from: {file_path}")
+
+def _load_documents_threaded(files_to_process: List[Tuple[str, type]]) -> List[Document]:
+    """Load whole files in a thread pool, using the document cache"""
     all_documents = []
     
+    # Process files in parallel with optimized thread pool
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=min(MAX_WORKERS, len(files_to_process))
+    ) as executor:
+        future_to_file = {
+            executor.submit(load_single_document, file_path, loader_cls): file_path
+            for file_path, loader_cls in files_to_process
+        }
+        
+        for future in concurrent.futures.as_completed(future_to_file):
+            file_path = future_to_file[future]
+            try:
+                docs = future.result()
+                if docs:
+                    all_documents.extend(docs)
+                    logger.info(f"Successfully processed: {file_path}")
+                else:
+                    logger.warning(f"No documents extracted from: {file_path}")
+            except Exception as e:
+                logger.error(f"Exception processing {file_path}: {str(e)}")
+    return all_documents
+
+def load_documents(
+    data_path: str = DATA_PATH,
+    parse_mode: str = PARSE_MODE
+) -> List[Document]:
+    """
+    Load documents with parallel processing and caching
+
+    Args:
+        data_path (str): Directory with raw documents
+        parse_mode (str): "process" parses PDF page ranges in a process pool,
+            "thread" loads whole files in a thread pool with caching
+    """
+    data_path = Path(data_path)
+    if not data_path.exists():
+        raise DocumentLoadError(f"Data path does not exist: {data_path}")
+
+    logger.info(f"Starting document loading from: {data_path}")
+    
     try:
         # Find all matching files
-        files_to_process = []
-        for pattern, loader_cls in supported_formats:
-            matched_files = list(data_path.glob(pattern))
-            logger.info(f"Found {len(matched_files)} {pattern} files")
-            files_to_process.extend([
-                (str(f), loader_cls) 
-                for f in matched_files
-            ])
+        files_to_process = discover_documents(data_path)
             
         if not files_to_process:
             raise DocumentLoadError(f"No supported documents found in {data_path}")
             
         logger.info(f"Found {len(files_to_process)} total documents to process")
         
-        # Process files in parallel with optimized thread pool
-        with concurrent.futures.ThreadPoolExecutor(
-            max_workers=min(MAX_WORKERS, len(files_to_process))
-        ) as executor:
-            future_to_file = {
-                executor.submit(load_single_document, file_path, loader_cls): file_path
-                for file_path, loader_cls in files_to_process
-            }
-            
-            for future in concurrent.futures.as_completed(future_to_file):
-                file_path = future_to_file[future]
-                try:
-                    docs = future.result()
-                    if docs:
-                        all_documents.extend(docs)
-                        logger.info(f"Successfully processed: {file_path}")
-                    else:
-                        logger.warning(f"No documents extracted from: {file_path}")
-                except Exception as e:
-                    logger.error(f"Exception processing {file_path}: {str(e)}")
+        if parse_mode == "process":
+            all_documents = list(iter_documents_parallel(files_to_process))
+        else:
+            all_documents = _load_documents_threaded(files_to_process)
                     
         if not all_documents:
             raise DocumentLoadError("Failed to load any documents successfully")
@@ -0,0 +1,105 @@
+"""Persistent on-disk cache for document embeddings"""
+
+import array
+import hashlib
+import logging
+import sqlite3
+from pathlib import Path
+from threading import Lock
+from typing import Dict, List
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+# SQLite limits the number of bound parameters per statement
+_LOOKUP_BATCH = 500
+
+def text_hash(text: str) -> str:
+    """Hash of a chunk's text, used as the cache key together with the model name"""
+    return hashlib.md5(text.encode()).hexdigest()
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that stores document vectors in SQLite
+
+    Vectors are keyed by (model name, chunk text hash), so re-chunking that
+    reproduces the same text or a rebuild after a crash reuses them instead
+    of running the model again.
+    """
+
+    def __init__(self, embedder: Embeddings, model_name: str, cache_path: Path):
+        self.embedder = embedder
+        self.model_name = model_name
+        self.cache_path = Path(cache_path)
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = Lock()
+        self._conn = sqlite3.connect(str(self.cache_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            )"""
+        )
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def _lookup(self, hashes: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        with self._lock:
+            for start in range(0, len(hashes), _LOOKUP_BATCH):
+                batch = hashes[start:start + _LOOKUP_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings "
+                    f"WHERE model = ? AND text_hash IN ({placeholders})",
+                    [self.model_name, *batch]
+                )
+                for key, blob in rows:
+                    found[key] = array.array("f", blob).tolist()
+        return found
+
+    def _store(self, items: Dict[str, List[float]]) -> None:
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector) VALUES (?, ?, ?)",
+                [
+                    (self.model_name, key, array.array("f", vector).tobytes())
+                    for key, vector in items.items()
+                ]
+            )
+            self._conn.commit()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed documents, computing only the vectors missing from the cache"""
+        hashes = [text_hash(text) for text in texts]
+        cached = self._lookup(list(set(hashes)))
+
+        missing: Dict[str, str] = {}
+        for key, text in zip(hashes, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            vectors = self.embedder.embed_documents(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self._store(computed)
+            cached.update(computed)
+
+        logger.debug(f"Embedding cache: {len(texts) - len(missing)} hits, {len(missing)} misses")
+        return [cached[key] for key in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        """Queries are not cached on disk"""
+        return self.embedder.embed_query(text)
+
+    def close(self) -> None:
+        """Close the underlying SQLite connection"""
+        with self._lock:
+            self._conn.close()
@@ -1,22 +1,300 @@
+import json
 import logging
-from ..config import EMBEDDING_MODEL_NAME
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, List, Optional, Union
+import numpy as np
+from ..config import (
+    EMBEDDING_MODEL_NAME,
+    EMBEDDING_CACHE_PATH,
+    EMBEDDING_BACKEND,
+    EMBEDDING_DEVICE,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_NORMALIZE,
+    EMBEDDING_THREADS,
+    EMBEDDING_ONNX_FILE,
+    QUERY_EMBEDDING_CACHE_SIZE
+)
+from langchain_core.embeddings import Embeddings
 from langchain_huggingface import HuggingFaceEmbeddings
+from .embedding_cache import CachedEmbeddings
+from .semantic_cache import normalize_question
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
-def get_embedding_model(model_name: str = EMBEDDING_MODEL_NAME) -> HuggingFaceEmbeddings:
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+
+# ONNX exports shipped in sentence-transformers model repos; the quint8
+# AVX2 variant runs on any x86-64 CPU from the last decade
+_ONNX_FILES = {
+    "onnx": "onnx/model.onnx",
+    "onnx-int8": "onnx/model_quint8_avx2.onnx"
+}
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Sentence-transformers model run with ONNX Runtime on CPU
+
+    Reproduces the model's pooling (mean or CLS) and maximum sequence
+    length from its sentence-transformers config. Texts are encoded in
+    length-sorted batches so padding stays short.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        onnx_file: str,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        normalize: bool = EMBEDDING_NORMALIZE,
+        threads: Optional[int] = EMBEDDING_THREADS
+    ):
+        import onnxruntime as ort
+        from huggingface_hub import hf_hub_download
+        from transformers import AutoTokenizer
+
+        self.batch_size = batch_size
+        self.normalize = normalize
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        st_config = self._read_json(model_name, "sentence_bert_config.json")
+        self.max_length = st_config.get("max_seq_length", self.tokenizer.model_max_length)
+        pooling = self._read_json(model_name, "1_Pooling/config.json")
+        self.cls_pooling = bool(pooling.get("pooling_mode_cls_token"))
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(
+            hf_hub_download(model_name, onnx_file),
+            sess_options=options,
+            providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    @staticmethod
+    def _read_json(model_name: str, filename: str) -> Dict:
+        from huggingface_hub import hf_hub_download
+
+        try:
+            with open(hf_hub_download(model_name, filename), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        encoded = self.tokenizer(
+            texts,
+            padding=True,
+            truncation=True,
+            max_length=self.max_length,
+            return_tensors="np"
+        )
+        inputs = {
+            name: value.astype(np.int64)
+            for name, value in encoded.items() if name in self.input_names
+        }
+        hidden = self.session.run(None, inputs)[0]
+        if self.cls_pooling:
+            vectors = hidden[:, 0]
+        else:
+            mask = encoded["attention_mask"][..., None].astype(np.float32)
+            vectors = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        if self.normalize:
+            vectors = vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        order = np.argsort([len(text) for text in texts], kind="stable")
+        vectors = np.concatenate([
+            self._encode_batch([texts[i] for i in order[start:start + self.batch_size]])
+            for start in range(0, len(order), self.batch_size)
+        ])
+        result = np.empty_like(vectors)
+        result[order] = vectors
+        return result.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+class QueryCachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper with an in-memory LRU cache of query vectors
+
+    Queries are embedded in their normalized form (see normalize_question)
+    and cached under it, so repeated questions skip the model in the
+    retriever and the semantic answer cache alike. Documents pass through.
+    """
+
+    def __init__(self, embedder: Embeddings, max_entries: int = QUERY_EMBEDDING_CACHE_SIZE):
+        self.embedder = embedder
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embedder.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        key = normalize_question(text)
+        with self._lock:
+            vector = self._cache.get(key)
+            if vector is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return vector
+        vector = self.embedder.embed_query(key)
+        with self._lock:
+            self.misses += 1
+            self._cache[key] = vector
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return vector
+
+def create_embedder(
+    model_name: str = EMBEDDING_MODEL_NAME,
+    backend: str = EMBEDDING_BACKEND,
+    device: str = EMBEDDING_DEVICE,
+    batch_size: int = EMBEDDING_BATCH_SIZE,
+    normalize: bool = EMBEDDING_NORMALIZE,
+    threads: Optional[int] = EMBEDDING_THREADS
+) -> Embeddings:
     """
-    Return a HuggingFaceEmbeddings instance using the configured model
+    Create the embedding model for a backend
 
     Args:
         model_name (str): Name of HF embedding model
+        backend (str): "torch" (sentence-transformers), "onnx" or "onnx-int8" (ONNX Runtime, CPU only)
+        device (str): Torch device, e.g. "cpu" or "cuda"
+        batch_size (int): Texts per forward pass
+        normalize (bool): L2-normalize the vectors
+        threads (Optional[int]): Intra-op CPU threads; None keeps the runtime default
+
+    Returns:
+        Embeddings: The embedding model
+
+    Raises:
+        ValueError: If the backend is unknown
+    """
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend {backend!r}, expected one of {EMBEDDING_BACKENDS}")
+    if backend != "torch":
+        return OnnxEmbeddings(
+            model_name,
+            EMBEDDING_ONNX_FILE or _ONNX_FILES[backend],
+            batch_size=batch_size,
+            normalize=normalize,
+            threads=threads
+        )
+    if threads:
+        import torch
+        # Process-wide: torch has a single intra-op thread pool
+        torch.set_num_threads(threads)
+    return HuggingFaceEmbeddings(
+        model_name=model_name,
+        model_kwargs={"device": device},
+        encode_kwargs={"batch_size": batch_size, "normalize_embeddings": normalize}
+    )
+
+def get_embedding_model(
+    model_name: str = EMBEDDING_MODEL_NAME,
+    use_cache: bool = False,
+    backend: str = EMBEDDING_BACKEND,
+    query_cache_size: int = QUERY_EMBEDDING_CACHE_SIZE
+) -> Union[Embeddings, CachedEmbeddings, QueryCachedEmbeddings]:
+    """
+    Return the embedding model for the configured model and backend
+
+    Args:
+        model_name (str): Name of HF embedding model
+        use_cache (bool): Wrap the model in the on-disk embedding cache at
+            EMBEDDING_CACHE_PATH so unchanged chunks are never re-embedded
+        backend (str): Embedding backend, see create_embedder
+        query_cache_size (int): Query vectors kept in memory; 0 disables the cache
     Returns:
-        HuggingFaceEmbeddings
+        Embeddings, or CachedEmbeddings when use_cache is set, wrapped in
+        QueryCachedEmbeddings when query_cache_size is positive
     """
     try:
-        logger.info(f"Loading embedding model: {model_name}")
-        return HuggingFaceEmbeddings(model_name=model_name)
+        logger.info(f"Loading embedding model: {model_name} ({backend})")
+        embedder = create_embedder(model_name, backend)
+        if use_cache:
+            logger.info(f"Using embedding cache: {EMBEDDING_CACHE_PATH}")
+            # Quantized vectors differ slightly, so each backend has its own cache entries
+            cache_key = model_name if backend == "torch" else f"{model_name}:{backend}"
+            if backend != "torch" and EMBEDDING_ONNX_FILE:
+                cache_key += f":{EMBEDDING_ONNX_FILE}"
+            embedder = CachedEmbeddings(embedder, cache_key, EMBEDDING_CACHE_PATH)
+        if query_cache_size > 0:
+            embedder = QueryCachedEmbeddings(embedder, query_cache_size)
+        return embedder
     except Exception as e:
         logger.error(f"Failed to load embedding model {model_name}: {e}")
-        raise
\ No newline at end of file
+        raise
+
+def benchmark_embedder(embedder: Embeddings, texts: List[str], repeats: int = 3) -> Dict[str, float]:
+    """
+    Measure embedding throughput and single-query latency
+
+    Returns:
+        Dict[str, float]: Best-of-`repeats` chunks/sec and query latency in ms
+    """
+    import time
+
+    embedder.embed_documents(texts[:8])  # Warm up
+    best = float("inf")
+    for _ in range(repeats):
+        started = time.perf_counter()
+        embedder.embed_documents(texts)
+        best = min(best, time.perf_counter() - started)
+    query_times = []
+    for text in texts[:50]:
+        started = time.perf_counter()
+        embedder.embed_query(text[:200])
+        query_times.append(time.perf_counter() - started)
+    return {
+        "chunks_per_sec": len(texts) / best,
+        "query_ms_p50": 1000 * float(np.median(query_times))
+    }
+
+def _benchmark_texts(count: int) -> List[str]:
+    """Chunks from the vector store, or synthetic chunk-sized text without one"""
+    import os
+    from itertools import islice
+    from ..config import DB_FAISS_PATH
+    from .chunk_store import SQLiteDocstore
+    from .vector_store import CHUNK_STORE_FILE
+
+    chunk_path = os.path.join(str(DB_FAISS_PATH), CHUNK_STORE_FILE)
+    if os.path.exists(chunk_path):
+        texts = [text for _, text in islice(SQLiteDocstore(chunk_path, read_only=True).iter_chunks(), count)]
+        if texts:
+            return texts
+    sentence = "The patient presented with fever, cough and shortness of breath for three days. "
+    return [sentence * (4 + i % 9) for i in range(count)]
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark embedding throughput")
+    parser.add_argument("--backend", nargs="+", default=[EMBEDDING_BACKEND], choices=EMBEDDING_BACKENDS)
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[EMBEDDING_BATCH_SIZE])
+    parser.add_argument("--threads", type=int, default=EMBEDDING_THREADS)
+    parser.add_argument("--chunks", type=int, default=1000, help="Number of chunks embedded per run")
+    args = parser.parse_args()
+
+    texts = _benchmark_texts(args.chunks)
+    for backend in args.backend:
+        for batch_size in args.batch_size:
+            embedder = create_embedder(backend=backend, batch_size=batch_size, threads=args.threads)
+            result = benchmark_embedder(embedder, texts)
+            print(
+                f"{backend:10s} batch={batch_size:<4d} "
+                f"{result['chunks_per_sec']:8.1f} chunks/s  "
+                f"query p50 {result['query_ms_p50']:.1f} ms"
+            )
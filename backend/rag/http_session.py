@@ -0,0 +1,21 @@
+"""Shared keep-alive HTTP session, importable without the RAG stack"""
+
+from threading import Lock
+from typing import Optional
+import requests
+from requests.adapters import HTTPAdapter
+from ..config import MAX_WORKERS
+
+_session: Optional[requests.Session] = None
+_session_lock = Lock()
+
+def get_http_session() -> requests.Session:
+    """Process-wide keep-alive session for talking to the Ollama server"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=max(4, MAX_WORKERS))
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+        return _session
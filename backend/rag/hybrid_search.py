@@ -0,0 +1,72 @@
+"""Hybrid dense + BM25 retrieval with reciprocal rank fusion"""
+
+import logging
+from typing import Any, Dict, List, Sequence, Tuple
+from langchain.schema import Document
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.vectorstores import VectorStoreRetriever
+from ..config import RETRIEVAL_K, RRF_K
+from .adaptive_retrieval import dense_search, scored_documents
+from .tracing import span
+
+logger = logging.getLogger(__name__)
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[str]],
+    k: int = RRF_K
+) -> List[Tuple[str, float]]:
+    """
+    Fuse ranked id lists by summing 1 / (k + rank)
+
+    Returns:
+        List[Tuple[str, float]]: (id, fused score), best first
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+class HybridRetriever(VectorStoreRetriever):
+    """
+    FAISS retriever that also queries a BM25 index and fuses both rankings
+
+    Dense search misses exact drug names, dosages and codes that BM25 finds,
+    and BM25 misses paraphrases. Both return `fetch_k` chunk ids, which are
+    fused with reciprocal rank fusion; the top `k` chunks are read from the
+    docstore with the fused score (scaled to 0-1) in metadata['score'] and
+    their dense cosine similarity in metadata['similarity']. A chunk found
+    by BM25 alone was not among the dense `fetch_k`, so it gets the lowest
+    dense similarity fetched, the most it can score.
+    """
+
+    lexical_index: Any
+    rrf_k: int = RRF_K
+
+    def retrieve_batch(self, queries: Sequence[str]) -> List[List[Document]]:
+        """Fused candidates of several queries, sharing one embedding call and FAISS search"""
+        k = self.search_kwargs.get("k", RETRIEVAL_K)
+        fetch_k = max(self.search_kwargs.get("fetch_k", 2 * k), k)
+        best_possible = 2 / (self.rrf_k + 1)
+        results = []
+        for query, hits in zip(queries, dense_search(self.vectorstore, queries, fetch_k)):
+            with span("bm25_search"):
+                lexical_hits = self.lexical_index.search(query, fetch_k)
+            rankings = [
+                [chunk_id for chunk_id, _ in hits],
+                [chunk_id for chunk_id, _ in lexical_hits]
+            ]
+            fused = reciprocal_rank_fusion(rankings, self.rrf_k)[:k]
+            similarities = dict(hits)
+            floor = hits[-1][1] if hits else 0.0
+            results.append(scored_documents(
+                self.vectorstore,
+                [(chunk_id, score / best_possible) for chunk_id, score in fused],
+                {chunk_id: similarities.get(chunk_id, floor) for chunk_id, _ in fused}
+            ))
+        return results
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return self.retrieve_batch([query])[0]
@@ -0,0 +1,279 @@
+"""Streaming ingest pipeline: pages -> chunks -> embeddings -> FAISS index"""
+
+import hashlib
+import logging
+import queue
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import numpy as np
+from langchain.schema import Document
+from langchain_core.embeddings import Embeddings
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from ..config import EMBED_BATCH_SIZE, PIPELINE_QUEUE_SIZE, INDEX_TYPE, INDEX_TRAIN_SIZE
+from .ann_index import build_index, train_index
+from .chunk_store import SQLiteDocstore
+from .exceptions import VectorStoreError
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of a stage's output
+_DONE = object()
+
+def chunk_id(file_hash: str, source: str, index: int) -> str:
+    """Stable id for the index-th chunk of a file"""
+    return hashlib.md5(f"{source}:{file_hash}:{index}".encode()).hexdigest()
+
+class _StageError:
+    """Carries an exception from a worker stage to the consumer"""
+
+    def __init__(self, error: BaseException):
+        self.error = error
+
+def _put(q: queue.Queue, item: Any, stop: threading.Event) -> bool:
+    """Blocking put that gives up once the pipeline is stopped"""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _get(q: queue.Queue, stop: threading.Event) -> Any:
+    """Blocking get that returns _DONE once the pipeline is stopped"""
+    while not stop.is_set():
+        try:
+            item = q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        if isinstance(item, _StageError):
+            raise item.error
+        return item
+    return _DONE
+
+def iter_chunks(pages: Iterable[Document], splitter: Any) -> Iterator[Document]:
+    """
+    Chunks of pages in file and page order
+
+    Splitters with an iter_chunks method (StructuredChunker) chunk whole
+    documents across page breaks; others split each page on its own.
+    """
+    if hasattr(splitter, "iter_chunks"):
+        yield from splitter.iter_chunks(pages)
+        return
+    for page in pages:
+        yield from splitter.split_documents([page])
+
+def _split_stage(
+    pages: Iterable[Document],
+    splitter: Any,
+    files: Dict[str, Dict],
+    batch_size: int,
+    out: queue.Queue,
+    stop: threading.Event
+) -> None:
+    """Split pages into chunks, assign chunk ids and emit fixed-size batches"""
+
+    def tracked(pages: Iterable[Document]) -> Iterator[Document]:
+        """Pages passed through, recording each file as its first page goes by"""
+        for page in pages:
+            if stop.is_set():
+                return
+            file_path = page.metadata.get("file_path", page.metadata.get("source", ""))
+            files.setdefault(file_path, {
+                "hash": page.metadata.get("hash", ""),
+                "source": page.metadata.get("source", ""),
+                "chunk_ids": []
+            })
+            yield page
+
+    try:
+        batch: List[Document] = []
+        for chunk in iter_chunks(tracked(pages), splitter):
+            if stop.is_set():
+                return
+            file_path = chunk.metadata.get("file_path", chunk.metadata.get("source", ""))
+            entry = files[file_path]
+            cid = chunk_id(entry["hash"], file_path, len(entry["chunk_ids"]))
+            chunk.metadata["chunk_id"] = cid
+            entry["chunk_ids"].append(cid)
+            batch.append(chunk)
+            if len(batch) >= batch_size:
+                if not _put(out, batch, stop):
+                    return
+                batch = []
+        if batch:
+            _put(out, batch, stop)
+        _put(out, _DONE, stop)
+    except BaseException as e:
+        _put(out, _StageError(e), stop)
+
+def _embed_stage(
+    embedder: Embeddings,
+    inp: queue.Queue,
+    out: queue.Queue,
+    stop: threading.Event
+) -> None:
+    """Embed each chunk batch"""
+    try:
+        while True:
+            batch = _get(inp, stop)
+            if batch is _DONE:
+                break
+            vectors = embedder.embed_documents([chunk.page_content for chunk in batch])
+            if not _put(out, (batch, vectors), stop):
+                return
+        _put(out, _DONE, stop)
+    except BaseException as e:
+        _put(out, _StageError(e), stop)
+
+def iter_embedded_batches(
+    pages: Iterable[Document],
+    splitter: Any,
+    embedder: Embeddings,
+    files: Dict[str, Dict],
+    batch_size: int = EMBED_BATCH_SIZE,
+    queue_size: int = PIPELINE_QUEUE_SIZE
+) -> Iterator[Tuple[List[Document], List[List[float]]]]:
+    """
+    Run splitting and embedding in background threads connected by bounded
+    queues, yielding (chunks, vectors) batches as they are ready
+
+    Only `queue_size` batches can wait between two stages, so memory stays
+    bounded by the batch size rather than the corpus size. Chunk ids are
+    recorded per source file in `files` as the chunks are produced.
+    """
+    stop = threading.Event()
+    chunk_batches: queue.Queue = queue.Queue(maxsize=queue_size)
+    embedded: queue.Queue = queue.Queue(maxsize=queue_size)
+    workers = [
+        threading.Thread(
+            target=_split_stage,
+            args=(pages, splitter, files, batch_size, chunk_batches, stop),
+            name="ingest-split",
+            daemon=True
+        ),
+        threading.Thread(
+            target=_embed_stage,
+            args=(embedder, chunk_batches, embedded, stop),
+            name="ingest-embed",
+            daemon=True
+        )
+    ]
+    for worker in workers:
+        worker.start()
+    try:
+        while True:
+            item = _get(embedded, stop)
+            if item is _DONE:
+                break
+            yield item
+    finally:
+        stop.set()
+        for worker in workers:
+            worker.join()
+
+def _new_store(
+    embedder: Embeddings,
+    vectors: np.ndarray,
+    index_type: str,
+    chunk_store_path: Optional[str]
+) -> FAISS:
+    """Create an empty store, training its index on vectors if needed"""
+    index = build_index(vectors.shape[1], index_type, n_train=len(vectors))
+    train_index(index, vectors)
+    if chunk_store_path is None:
+        return FAISS(embedder, index, InMemoryDocstore(), {}, normalize_L2=True)
+    docstore = SQLiteDocstore(chunk_store_path)
+    return FAISS(embedder, index, docstore, docstore.index_map(), normalize_L2=True)
+
+def _add_batch(db: FAISS, chunks: List[Document], vectors: Sequence[Sequence[float]]) -> None:
+    db.add_embeddings(
+        [(chunk.page_content, vector) for chunk, vector in zip(chunks, vectors)],
+        metadatas=[chunk.metadata for chunk in chunks],
+        ids=[chunk.metadata["chunk_id"] for chunk in chunks]
+    )
+
+def _add_buffered(db: FAISS, buffered: List[List[Document]], sample: np.ndarray) -> int:
+    """Add buffered chunk batches whose vectors are consecutive rows of sample"""
+    offset = 0
+    for chunks in buffered:
+        _add_batch(db, chunks, sample[offset:offset + len(chunks)])
+        offset += len(chunks)
+    return offset
+
+def run_ingest_pipeline(
+    pages: Iterable[Document],
+    splitter: Any,
+    embedder: Embeddings,
+    db: Optional[FAISS] = None,
+    batch_size: int = EMBED_BATCH_SIZE,
+    queue_size: int = PIPELINE_QUEUE_SIZE,
+    index_type: str = INDEX_TYPE,
+    train_size: int = INDEX_TRAIN_SIZE,
+    chunk_store_path: Optional[str] = None
+) -> Tuple[Optional[FAISS], Dict[str, Dict]]:
+    """
+    Stream pages through split -> embed -> index without materializing the corpus
+
+    Args:
+        pages: Page documents, e.g. from document_loader.iter_documents
+        splitter: StructuredChunker, or a text splitter with a split_documents method
+        embedder: Embeddings used for the chunks
+        db: Existing store to extend; a new one is created otherwise
+        batch_size: Number of chunks embedded and indexed at once
+        queue_size: Maximum number of batches buffered between stages
+        index_type: Index built for a new store, see ann_index.INDEX_TYPES
+        train_size: Number of vectors buffered to train IVF indexes before
+            anything is added to a new store
+        chunk_store_path: SQLite file receiving the chunks of a new store,
+            so chunk text is written out as it is indexed; kept in memory
+            when None
+
+    Returns:
+        Tuple of the FAISS store (None if no chunks were produced) and the
+        manifest entries {file_path: {"hash", "source", "chunk_ids"}} of
+        every file seen
+
+    Raises:
+        VectorStoreError: If any stage fails
+    """
+    files: Dict[str, Dict] = {}
+    needs_training = index_type.startswith("ivf")
+    # Chunk batches held back until the index is trained; their vectors are
+    # consecutive float32 rows of one preallocated training sample
+    buffered: List[List[Document]] = []
+    sample: Optional[np.ndarray] = None
+    n_buffered = 0
+    total = 0
+    try:
+        for chunks, vectors in iter_embedded_batches(
+            pages, splitter, embedder, files, batch_size, queue_size
+        ):
+            if db is None and needs_training:
+                if sample is None:
+                    sample = np.empty((train_size + batch_size, len(vectors[0])), dtype=np.float32)
+                sample[n_buffered:n_buffered + len(chunks)] = vectors
+                buffered.append(chunks)
+                n_buffered += len(chunks)
+                if n_buffered < train_size:
+                    continue
+                db = _new_store(embedder, sample[:n_buffered], index_type, chunk_store_path)
+                total += _add_buffered(db, buffered, sample)
+                buffered, sample = [], None
+            else:
+                if db is None:
+                    db = _new_store(embedder, np.asarray(vectors, dtype=np.float32), index_type, chunk_store_path)
+                _add_batch(db, chunks, vectors)
+                total += len(chunks)
+            logger.info(f"Indexed {total} chunks from {len(files)} files")
+
+        # Corpus smaller than the training sample
+        if db is None and buffered:
+            db = _new_store(embedder, sample[:n_buffered], index_type, chunk_store_path)
+            total += _add_buffered(db, buffered, sample)
+            logger.info(f"Indexed {total} chunks from {len(files)} files")
+    except Exception as e:
+        raise VectorStoreError(f"Ingest pipeline failed: {str(e)}") from e
+    return db, files
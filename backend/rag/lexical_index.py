@@ -0,0 +1,241 @@
+"""BM25 inverted index persisted next to the FAISS index"""
+
+import json
+import logging
+import math
+import os
+import re
+import shutil
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from ..config import BM25_K1, BM25_B
+
+logger = logging.getLogger(__name__)
+
+# Directory holding the index inside a vector store directory
+LEXICAL_INDEX_DIR = "bm25"
+
+# Terms keep inner dots, dashes and slashes so "e11.9", "5mg/kg" and
+# "co-amoxiclav" stay single tokens
+_TOKEN = re.compile(r"[a-z0-9]+(?:[./\-][a-z0-9]+)*")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it of on or that the "
+    "this to was were what which with how can does do".split()
+)
+
+# Terms in more than this share of chunks carry almost no BM25 weight but
+# have the longest posting lists, so queries skip them
+_MAX_DF_RATIO = 0.5
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased terms of a text, without stopwords"""
+    return [t for t in _TOKEN.findall(text.lower()) if t not in _STOPWORDS]
+
+def _count_terms(
+    chunks: Iterable[Tuple[str, str]],
+    vocab: Dict[str, int],
+    first_doc: int = 0
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, List[str]]:
+    """
+    Flat (term, doc, tf) postings of (chunk_id, text) pairs
+
+    New terms are added to vocab; documents are numbered from first_doc.
+
+    Returns:
+        Tuple: term ids, doc ids, term frequencies, document lengths and chunk ids
+    """
+    term_ids, doc_ids, tfs = array('i'), array('i'), array('H')
+    doc_len, chunk_ids = array('i'), []
+    for doc, (chunk_id, text) in enumerate(chunks, first_doc):
+        counts = Counter(tokenize(text))
+        chunk_ids.append(chunk_id)
+        doc_len.append(sum(counts.values()))
+        for term, tf in counts.items():
+            term_ids.append(vocab.setdefault(term, len(vocab)))
+            doc_ids.append(doc)
+            tfs.append(min(tf, 65535))
+    return (
+        np.frombuffer(term_ids, dtype=np.int32),
+        np.frombuffer(doc_ids, dtype=np.int32),
+        np.frombuffer(tfs, dtype=np.uint16),
+        np.frombuffer(doc_len, dtype=np.int32).astype(np.float32),
+        chunk_ids
+    )
+
+class LexicalIndex:
+    """
+    BM25 index in compressed sparse row form
+
+    Posting lists of all terms are concatenated into `doc_ids` / `tfs`, and
+    `indptr[t]:indptr[t + 1]` is the slice for term t. Arrays are memory
+    mapped when loaded, so opening the index is cheap and processes share
+    the OS page cache. A query touches only the postings of its own terms.
+    """
+
+    def __init__(
+        self,
+        vocab: Dict[str, int],
+        indptr: np.ndarray,
+        doc_ids: np.ndarray,
+        tfs: np.ndarray,
+        doc_len: np.ndarray,
+        chunk_ids: List[str],
+        k1: float = BM25_K1,
+        b: float = BM25_B
+    ):
+        self.vocab = vocab
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_len = doc_len
+        self.chunk_ids = chunk_ids
+        self.k1 = k1
+        self.b = b
+        self.n_docs = len(chunk_ids)
+        self.avg_len = float(doc_len.mean()) if self.n_docs else 0.0
+
+    @classmethod
+    def build(cls, chunks: Iterable[Tuple[str, str]]) -> "LexicalIndex":
+        """
+        Build an index from (chunk_id, text) pairs
+
+        Postings are collected in flat typed arrays and grouped by term with
+        one stable sort, keeping memory at a few bytes per posting.
+        """
+        vocab: Dict[str, int] = {}
+        term_ids, doc_ids, tfs, doc_len, chunk_ids = _count_terms(chunks, vocab)
+        return cls._from_postings(vocab, term_ids, doc_ids, tfs, doc_len, chunk_ids)
+
+    @classmethod
+    def _from_postings(
+        cls,
+        vocab: Dict[str, int],
+        term_ids: np.ndarray,
+        doc_ids: np.ndarray,
+        tfs: np.ndarray,
+        doc_len: np.ndarray,
+        chunk_ids: List[str]
+    ) -> "LexicalIndex":
+        """Group flat (term, doc, tf) postings into CSR form, keeping doc order per term"""
+        order = np.argsort(term_ids, kind="stable")
+        indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_ids, minlength=len(vocab)), out=indptr[1:])
+        return cls(vocab, indptr, doc_ids[order], tfs[order], doc_len, chunk_ids)
+
+    def update(
+        self,
+        removed: Iterable[str],
+        added: Iterable[Tuple[str, str]]
+    ) -> "LexicalIndex":
+        """
+        A new index without the removed chunks and with the added ones
+
+        Only the added chunks are tokenized; postings of the other chunks
+        are filtered and renumbered as arrays, so an incremental ingest
+        does not re-read the whole chunk store.
+
+        Args:
+            removed: Ids of chunks to drop; unknown ids are ignored
+            added: (chunk_id, text) pairs of new chunks
+        """
+        removed = set(removed)
+        keep = np.fromiter(
+            (chunk_id not in removed for chunk_id in self.chunk_ids),
+            dtype=bool,
+            count=self.n_docs
+        )
+        new_position = np.cumsum(keep, dtype=np.int64) - 1
+        chunk_ids = [chunk_id for chunk_id, kept in zip(self.chunk_ids, keep) if kept]
+
+        old_terms = np.repeat(
+            np.arange(len(self.vocab), dtype=np.int32), np.diff(self.indptr)
+        )
+        mask = keep[self.doc_ids]
+        vocab = dict(self.vocab)
+        term_ids, doc_ids, tfs, doc_len, new_ids = _count_terms(added, vocab, len(chunk_ids))
+        return self._from_postings(
+            vocab,
+            np.concatenate([old_terms[mask], term_ids]),
+            np.concatenate([new_position[self.doc_ids[mask]].astype(np.int32), doc_ids]),
+            np.concatenate([self.tfs[mask], tfs]),
+            np.concatenate([self.doc_len[keep], doc_len]),
+            chunk_ids + new_ids
+        )
+
+    def search(self, query: str, k: int) -> List[Tuple[str, float]]:
+        """
+        Top-k chunks by BM25 score
+
+        Returns:
+            List[Tuple[str, float]]: (chunk_id, score), best first
+        """
+        if not self.n_docs:
+            return []
+        postings, weights = [], []
+        for term in set(tokenize(query)):
+            t = self.vocab.get(term)
+            if t is None:
+                continue
+            start, end = self.indptr[t], self.indptr[t + 1]
+            df = end - start
+            if df > _MAX_DF_RATIO * self.n_docs:
+                continue
+            idf = math.log(1 + (self.n_docs - df + 0.5) / (df + 0.5))
+            docs = self.doc_ids[start:end]
+            tf = self.tfs[start:end].astype(np.float32)
+            norm = self.k1 * (1 - self.b + self.b * self.doc_len[docs] / self.avg_len)
+            postings.append(docs)
+            weights.append(idf * tf * (self.k1 + 1) / (tf + norm))
+        if not postings:
+            return []
+
+        # Accumulate into a dense score array; each term's postings are
+        # unique, so plain fancy-index addition is safe
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        for docs, weight in zip(postings, weights):
+            scores[docs] += weight
+
+        # Partial sort over the matching chunks only; a chunk appears once
+        # per matching term, so over-select before removing duplicates
+        candidates = np.concatenate(postings)
+        top = min(len(candidates), k * len(postings))
+        best = candidates[np.argpartition(-scores[candidates], top - 1)[:top]]
+        best = np.unique(best)
+        best = best[np.argsort(-scores[best], kind="stable")][:k]
+        return [(self.chunk_ids[i], float(scores[i])) for i in best]
+
+    def save(self, path: str) -> None:
+        """Write the index to a directory, replacing any previous one"""
+        tmp_path = path + ".tmp"
+        if os.path.exists(tmp_path):
+            shutil.rmtree(tmp_path)
+        os.makedirs(tmp_path)
+        for name in ("indptr", "doc_ids", "tfs", "doc_len"):
+            np.save(os.path.join(tmp_path, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(tmp_path, "terms.json"), "w", encoding="utf-8") as f:
+            json.dump({"vocab": self.vocab, "chunk_ids": self.chunk_ids}, f)
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "LexicalIndex":
+        """Open a saved index with memory-mapped posting arrays"""
+        arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+            for name in ("indptr", "doc_ids", "tfs", "doc_len")
+        }
+        with open(os.path.join(path, "terms.json"), "r", encoding="utf-8") as f:
+            terms = json.load(f)
+        return cls(terms["vocab"], chunk_ids=terms["chunk_ids"], **arrays)
+
+def load_lexical_index(db_faiss_path: str) -> Optional[LexicalIndex]:
+    """The BM25 index of a vector store, or None if it has none"""
+    path = os.path.join(db_faiss_path, LEXICAL_INDEX_DIR)
+    if not os.path.exists(path):
+        return None
+    index = LexicalIndex.load(path)
+    logger.info(f"Loaded BM25 index with {index.n_docs} chunks and {len(index.vocab)} terms")
+    return index
@@ -0,0 +1,130 @@
+"""Ollama LLM client that reuses HTTP connections across calls"""
+
+import logging
+from functools import lru_cache
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import httpx
+from ollama import AsyncClient, Client
+from langchain_community.llms import Ollama
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.outputs import Generation, GenerationChunk, LLMResult
+from ..config import API_MAX_CONCURRENCY, MAX_WORKERS, OLLAMA_BASE_URL
+from .http_session import get_http_session
+
+logger = logging.getLogger(__name__)
+
+# Ollama LLM fields sent as generation options
+_OPTION_FIELDS = (
+    "mirostat", "mirostat_eta", "mirostat_tau", "num_ctx", "num_gpu", "num_thread",
+    "num_predict", "repeat_last_n", "repeat_penalty", "temperature", "tfs_z", "top_k", "top_p"
+)
+
+def ollama_is_reachable(base_url: str = OLLAMA_BASE_URL) -> bool:
+    """Whether the Ollama server answers; used as the LLM's health check"""
+    try:
+        return get_http_session().get(f"{base_url}/api/tags", timeout=5).status_code == 200
+    except Exception:
+        return False
+
+@lru_cache(maxsize=8)
+def get_client(
+    base_url: str = OLLAMA_BASE_URL,
+    timeout: Optional[float] = None,
+    headers: Tuple[Tuple[str, str], ...] = ()
+) -> Client:
+    """Process-wide Ollama client with a keep-alive connection pool, per server and settings"""
+    return Client(
+        host=base_url,
+        timeout=timeout,
+        headers=dict(headers),
+        limits=httpx.Limits(max_keepalive_connections=max(4, MAX_WORKERS))
+    )
+
+def create_async_client(timeout: Optional[float] = None) -> AsyncClient:
+    """
+    Async Ollama client with a connection pool sized for the query service
+
+    httpx clients are bound to the event loop they are used on, so create
+    one per loop (e.g. in the service lifespan) rather than per process.
+    """
+    return AsyncClient(
+        host=OLLAMA_BASE_URL,
+        timeout=timeout,
+        limits=httpx.Limits(
+            max_connections=API_MAX_CONCURRENCY,
+            max_keepalive_connections=API_MAX_CONCURRENCY
+        )
+    )
+
+class PooledOllama(Ollama):
+    """
+    Ollama LLM that generates through the official client's connection pool
+
+    The langchain client issues a bare requests.post per generation, which
+    opens a new TCP connection every time. This class keeps langchain's
+    Ollama fields and LLM interface but implements generation on a shared
+    ollama.Client. Streamed responses are closed as soon as the consumer
+    stops reading (e.g. on a Streamlit rerun or a client disconnect), so
+    their connection goes back to the pool.
+    """
+
+    def _options(self, stop: Optional[List[str]]) -> Dict[str, Any]:
+        if self.stop is not None and stop is not None:
+            raise ValueError("`stop` found in both the input and default params.")
+        options = {name: getattr(self, name) for name in _OPTION_FIELDS if getattr(self, name) is not None}
+        stop = self.stop if stop is None else stop
+        if stop:
+            options["stop"] = stop
+        return options
+
+    def _stream(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> Iterator[GenerationChunk]:
+        client = get_client(
+            self.base_url,
+            self.timeout,
+            tuple(sorted((self.headers or {}).items()))
+        )
+        parts = client.generate(
+            model=self.model,
+            prompt=prompt,
+            system=self.system or "",
+            template=self.template or "",
+            format=self.format or "",
+            images=kwargs.get("images"),
+            options={**self._options(stop), **kwargs.get("options", {})},
+            keep_alive=self.keep_alive,
+            stream=True
+        )
+        try:
+            for part in parts:
+                chunk = GenerationChunk(
+                    text=part.get("response", ""),
+                    generation_info=dict(part) if part.get("done") else None
+                )
+                if run_manager:
+                    run_manager.on_llm_new_token(chunk.text, chunk=chunk, verbose=self.verbose)
+                yield chunk
+        finally:
+            # Closing the generator closes the HTTP response
+            parts.close()
+
+    def _generate(  # type: ignore[override]
+        self,
+        prompts: List[str],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> LLMResult:
+        generations = []
+        for prompt in prompts:
+            text, info = "", None
+            for chunk in self._stream(prompt, stop=stop, run_manager=run_manager, **kwargs):
+                text += chunk.text
+                info = chunk.generation_info or info
+            generations.append([Generation(text=text, generation_info=info)])
+        return LLMResult(generations=generations)
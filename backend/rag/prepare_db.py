@@ -1,12 +1,30 @@
 # prepare_db.py
 if __name__ == "__main__":
     import os
+    import argparse
     from ..config import DATA_PATH, DB_FAISS_PATH
-    from backend.rag.vector_store import create_vector_store
+    from backend.rag.vector_store import create_vector_store, report_index_recall
+
+    parser = argparse.ArgumentParser(description="Build the FAISS vector store")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Only embed new or changed documents and drop deleted ones"
+    )
+    parser.add_argument(
+        "--report-recall",
+        action="store_true",
+        help="Report recall@k of the ANN index against exact flat search"
+    )
+    args = parser.parse_args()
 
     # Đảm bảo thư mục lưu FAISS index tồn tại
     os.makedirs(os.path.dirname(DB_FAISS_PATH), exist_ok=True)
 
     # Tạo vector store
-    create_vector_store(DATA_PATH, DB_FAISS_PATH)
+    create_vector_store(DATA_PATH, DB_FAISS_PATH, incremental=args.incremental)
     print(f"Vector store created at {DB_FAISS_PATH}")
+
+    if args.report_recall:
+        for k, recall in report_index_recall(DB_FAISS_PATH).items():
+            print(f"recall@{k}: {recall:.3f}")
@@ -0,0 +1,120 @@
+"""Cross-encoder reranking of retrieved chunks"""
+
+import logging
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, List, Sequence, Tuple
+from langchain.schema import Document
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.vectorstores import VectorStoreRetriever
+from ..config import RERANK_BATCH_SIZE, RERANK_CACHE_SIZE, RETRIEVAL_K
+from .embedding_cache import text_hash
+from .tracing import span
+
+logger = logging.getLogger(__name__)
+
+class CrossEncoderReranker:
+    """
+    Scores (query, chunk) pairs with a small cross-encoder on CPU
+
+    All uncached pairs of a query are scored in one batched forward pass.
+    Scores are kept in an LRU cache keyed by (query hash, chunk text hash),
+    so repeated and popular questions skip the model entirely.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        batch_size: int = RERANK_BATCH_SIZE,
+        cache_size: int = RERANK_CACHE_SIZE,
+        device: str = "cpu"
+    ):
+        from sentence_transformers import CrossEncoder
+
+        logger.info(f"Loading cross-encoder: {model_name}")
+        self.model = CrossEncoder(model_name, device=device)
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def score(self, query: str, docs: List[Document]) -> List[float]:
+        """Relevance of each document to the query (higher is better)"""
+        query_key = text_hash(query)
+        keys = [(query_key, text_hash(doc.page_content)) for doc in docs]
+        scores = {}
+        with self._lock:
+            for key in keys:
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    scores[key] = self._cache[key]
+        missing = {key: doc for key, doc in zip(keys, docs) if key not in scores}
+        self.hits += len(docs) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            predicted = self.model.predict(
+                [(query, doc.page_content) for doc in missing.values()],
+                batch_size=self.batch_size,
+                show_progress_bar=False
+            )
+            with self._lock:
+                for key, value in zip(missing, predicted):
+                    scores[key] = self._cache[key] = float(value)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return [scores[key] for key in keys]
+
+    def rerank(self, query: str, docs: List[Document], k: int) -> List[Document]:
+        """
+        Top-k documents by cross-encoder score, with the score in metadata['score']
+
+        Other metadata, including the dense metadata['similarity'] that
+        select_documents thresholds on, is kept.
+        """
+        if not docs:
+            return []
+        with span("rerank", chunks=len(docs)):
+            scores = self.score(query, docs)
+        scored = sorted(
+            zip(scores, docs),
+            key=lambda item: item[0],
+            reverse=True
+        )[:k]
+        return [
+            Document(page_content=doc.page_content, metadata={**doc.metadata, 'score': score})
+            for score, doc in scored
+        ]
+
+class RerankingRetriever(VectorStoreRetriever):
+    """
+    Retriever that reranks a wide candidate set down to k chunks
+
+    `base_retriever` is configured to return the candidates (e.g. 50); this
+    retriever's own search_kwargs hold the final k, and its vectorstore is
+    the base retriever's, so direct vector store fallbacks keep working.
+    """
+
+    base_retriever: VectorStoreRetriever
+    reranker: Any
+
+    def retrieve_batch(self, queries: Sequence[str]) -> List[List[Document]]:
+        """Reranked candidates of several queries, retrieved in one batch"""
+        k = self.search_kwargs.get("k", RETRIEVAL_K)
+        return [
+            self.reranker.rerank(query, candidates, k)
+            for query, candidates in zip(queries, self.base_retriever.retrieve_batch(queries))
+        ]
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        candidates = self.base_retriever.invoke(
+            query, config={"callbacks": run_manager.get_child()}
+        )
+        k = self.search_kwargs.get("k", RETRIEVAL_K)
+        docs = self.reranker.rerank(query, candidates, k)
+        logger.info(f"Reranked {len(candidates)} candidates to {len(docs)}")
+        return docs
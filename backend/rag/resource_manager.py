@@ -1,71 +1,227 @@
 """Resource management utilities for MedAgent"""
 
+import atexit
 import logging
-from typing import Any, Optional
+from typing import Any, Callable, Dict, Optional
 from contextlib import contextmanager
 from threading import Lock
 from .exceptions import ResourceError
 
 logger = logging.getLogger(__name__)
 
+class _Entry:
+    """A registered resource with its reference count and health check"""
+
+    __slots__ = ("resource", "refcount", "health_check", "lock", "retired")
+
+    def __init__(self, resource: Any, health_check: Optional[Callable[[Any], bool]] = None):
+        self.resource = resource
+        self.refcount = 0
+        self.health_check = health_check
+        self.lock = Lock()
+        self.retired = False
+
+def _close(name: str, resource: Any) -> None:
+    try:
+        if hasattr(resource, 'close'):
+            resource.close()
+        elif hasattr(resource, 'cleanup'):
+            resource.cleanup()
+        elif hasattr(resource, 'shutdown'):
+            resource.shutdown(wait=False)
+    except Exception as e:
+        logger.error(f"Error cleaning up resource {name}: {e}")
+
 class ResourceManager:
-    """Manages shared resources and ensures proper cleanup"""
-    
+    """
+    Process-lifetime registry of shared resources
+
+    Each resource is built once per process by get_or_create. Factories run
+    under a lock of their own key only, so building a slow resource (e.g.
+    the vector store) does not block lookups of others. Resources are
+    closed when they are unregistered, fail their health check, or at
+    process exit; a resource in use (see use) is closed only once its last
+    user releases it.
+    """
+
     def __init__(self):
-        self._resources = {}
-        self._locks = {}
+        self._resources: Dict[str, _Entry] = {}
+        self._creation_locks: Dict[str, Lock] = {}
         self._global_lock = Lock()
-        
-    def register(self, name: str, resource: Any) -> None:
-        """Register a resource with the manager"""
+
+    def register(
+        self,
+        name: str,
+        resource: Any,
+        health_check: Optional[Callable[[Any], bool]] = None,
+        replace: bool = False
+    ) -> Any:
+        """
+        Register a resource with the manager
+
+        Args:
+            name: Resource key
+            resource: The resource
+            health_check: Optional callable returning False when the resource is unusable
+            replace: Replace (and close) a resource already registered under name
+
+        Returns:
+            Any: The registered resource; without replace, an existing one is kept
+        """
         with self._global_lock:
-            if name in self._resources:
-                raise ResourceError(f"Resource {name} already registered")
-            self._resources[name] = resource
-            self._locks[name] = Lock()
+            entry = self._resources.get(name)
+            if entry is not None and not replace:
+                if entry.resource is not resource:
+                    logger.warning(f"Resource {name} already registered, keeping the existing one")
+                return entry.resource
+            self._resources[name] = _Entry(resource, health_check)
             logger.info(f"Registered resource: {name}")
-            
+        if entry is not None:
+            self._retire(name, entry)
+        return resource
+
     def unregister(self, name: str) -> None:
-        """Unregister a resource"""
+        """Unregister a resource and close it once no longer in use"""
         with self._global_lock:
-            if name not in self._resources:
-                raise ResourceError(f"Resource {name} not found")
-            del self._resources[name]
-            del self._locks[name]
-            logger.info(f"Unregistered resource: {name}")
-            
+            entry = self._resources.pop(name, None)
+        if entry is None:
+            raise ResourceError(f"Resource {name} not found")
+        self._retire(name, entry)
+        logger.info(f"Unregistered resource: {name}")
+
     def get(self, name: str) -> Optional[Any]:
         """Get a registered resource"""
         with self._global_lock:
-            return self._resources.get(name)
-            
+            entry = self._resources.get(name)
+            return entry.resource if entry else None
+
+    def get_or_create(
+        self,
+        name: str,
+        factory: Callable[[], Any],
+        health_check: Optional[Callable[[Any], bool]] = None
+    ) -> Any:
+        """
+        Return the resource registered under name, creating it once if missing
+
+        Concurrent callers for the same missing key wait for a single
+        factory call. Factories may create the resources they depend on.
+
+        Raises:
+            Exception: Whatever the factory raises; nothing is registered then
+        """
+        with self._global_lock:
+            entry = self._resources.get(name)
+            if entry is not None:
+                return entry.resource
+            creation_lock = self._creation_locks.setdefault(name, Lock())
+
+        with creation_lock:
+            with self._global_lock:
+                entry = self._resources.get(name)
+                if entry is not None:
+                    return entry.resource
+            resource = factory()
+            with self._global_lock:
+                self._resources[name] = _Entry(resource, health_check)
+                self._creation_locks.pop(name, None)
+            logger.info(f"Created resource: {name}")
+            return resource
+
     @contextmanager
-    def acquire(self, name: str):
-        """Acquire a resource lock"""
-        if name not in self._locks:
-            raise ResourceError(f"Resource {name} not found")
-            
-        lock = self._locks[name]
+    def use(
+        self,
+        name: str,
+        factory: Optional[Callable[[], Any]] = None,
+        health_check: Optional[Callable[[Any], bool]] = None
+    ):
+        """
+        Hold a reference to a resource, so it is not closed while in use
+
+        With a factory, a missing resource (e.g. one removed by a failed
+        health check) is created as by get_or_create.
+
+        Raises:
+            ResourceError: If name is not registered and no factory is given
+        """
+        while True:
+            if factory is not None:
+                self.get_or_create(name, factory, health_check)
+            with self._global_lock:
+                entry = self._resources.get(name)
+                if entry is not None:
+                    entry.refcount += 1
+                    break
+            if factory is None:
+                raise ResourceError(f"Resource {name} not found")
         try:
-            lock.acquire()
-            yield self._resources[name]
+            yield entry.resource
         finally:
-            lock.release()
-            
+            with self._global_lock:
+                entry.refcount -= 1
+                close = entry.retired and entry.refcount == 0
+            if close:
+                _close(name, entry.resource)
+
+    @contextmanager
+    def acquire(self, name: str):
+        """Acquire a resource lock for exclusive use"""
+        with self._global_lock:
+            entry = self._resources.get(name)
+        if entry is None:
+            raise ResourceError(f"Resource {name} not found")
+
+        with entry.lock:
+            with self.use(name) as resource:
+                yield resource
+
+    def _retire(self, name: str, entry: _Entry) -> None:
+        """Close a removed entry now, or when its last user releases it"""
+        with self._global_lock:
+            entry.retired = True
+            close = entry.refcount == 0
+        if close:
+            _close(name, entry.resource)
+
+    def check_health(self) -> Dict[str, bool]:
+        """
+        Run the health checks of all resources that have one
+
+        Unhealthy resources are unregistered, so the next get_or_create
+        builds a fresh one.
+
+        Returns:
+            Dict[str, bool]: Resource name -> healthy
+        """
+        with self._global_lock:
+            checks = [(name, entry) for name, entry in self._resources.items() if entry.health_check]
+        status = {}
+        for name, entry in checks:
+            try:
+                status[name] = bool(entry.health_check(entry.resource))
+            except Exception as e:
+                logger.warning(f"Health check of {name} failed: {e}")
+                status[name] = False
+            if not status[name]:
+                with self._global_lock:
+                    removed = self._resources.get(name) is entry
+                    if removed:
+                        del self._resources[name]
+                if removed:
+                    logger.warning(f"Resource {name} is unhealthy, it will be recreated on next use")
+                    self._retire(name, entry)
+        return status
+
     def cleanup(self) -> None:
-        """Clean up all resources"""
+        """Clean up all resources, most recently created first"""
         with self._global_lock:
-            for name, resource in self._resources.items():
-                try:
-                    if hasattr(resource, 'close'):
-                        resource.close()
-                    elif hasattr(resource, 'cleanup'):
-                        resource.cleanup()
-                except Exception as e:
-                    logger.error(f"Error cleaning up resource {name}: {e}")
+            entries = list(self._resources.items())
             self._resources.clear()
-            self._locks.clear()
+        for name, entry in reversed(entries):
+            self._retire(name, entry)
+        if entries:
             logger.info("All resources cleaned up")
 
-# Global resource manager instance
-resource_manager = ResourceManager() 
\ No newline at end of file
+# Global resource manager instance, shut down when the process exits
+resource_manager = ResourceManager()
+atexit.register(resource_manager.cleanup)
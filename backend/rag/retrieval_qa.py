@@ -1,28 +1,64 @@
 import logging
-from typing import Dict, Any, Optional
+from typing import Callable, ContextManager, Dict, Any, Iterator, List, Optional
 from functools import lru_cache
 from langchain_core.prompts import PromptTemplate
-from langchain.chains import RetrievalQA
 from langchain_community.llms import Ollama
-from ..config import LLM_MODEL_NAME, LLM_TEMPERATURE, RETRIEVAL_K
+from langchain.schema import Document
+from ..config import (
+    DB_FAISS_PATH,
+    HYBRID_SEARCH,
+    LLM_MODEL_NAME,
+    LLM_TEMPERATURE,
+    OLLAMA_BASE_URL,
+    RERANK_CANDIDATES,
+    RERANK_MODEL,
+    RETRIEVAL_K,
+    SEMANTIC_CACHE_THRESHOLD,
+    SEMANTIC_CACHE_SIZE,
+    SEMANTIC_CACHE_TTL,
+    SEMANTIC_CACHE_PATH
+)
+from .adaptive_retrieval import DenseRetriever, select_documents
+from .context_packing import pack_context
+from .hybrid_search import HybridRetriever
+from .lexical_index import LexicalIndex, load_lexical_index
+from .ollama_client import PooledOllama, ollama_is_reachable
+from .reranker import CrossEncoderReranker, RerankingRetriever
+from .resource_manager import resource_manager
+from .semantic_cache import SemanticCache
+from .tracing import request_trace, span, traced_tokens
+from .vector_store import store_version
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
-# Cache for similar questions
-_response_cache = {}
+# Candidates retrieved per requested source, for adaptive selection
+_CANDIDATE_FACTOR = 2
 
-@lru_cache(maxsize=100)
-def get_cached_response(query: str) -> Optional[Dict]:
-    """Get cached response for similar queries"""
-    return _response_cache.get(query)
+NO_ANSWER_MESSAGE = (
+    "I apologize, but I couldn't find enough relevant information to answer your question accurately. Could you please:\n" +
+    "1. Rephrase your question\n" +
+    "2. Be more specific\n" +
+    "3. Or ask about a different medical topic"
+)
+ERROR_MESSAGE = "I encountered an error while processing your question. Please try asking in a different way."
 
-def cache_response(query: str, response: Dict):
-    """Cache response for future use"""
-    _response_cache[query] = response
-    if len(_response_cache) > 1000:  # Limit cache size
-        _response_cache.pop(next(iter(_response_cache)))
+def get_response_cache(vectorstore) -> SemanticCache:
+    """Process-wide semantic answer cache for a vector store, created on first use"""
+    db_faiss_path = str(DB_FAISS_PATH)
+    return resource_manager.get_or_create(
+        f"response_cache:{id(vectorstore)}",
+        lambda: SemanticCache(
+            vectorstore.embedding_function,
+            threshold=SEMANTIC_CACHE_THRESHOLD,
+            max_entries=SEMANTIC_CACHE_SIZE,
+            ttl_seconds=SEMANTIC_CACHE_TTL,
+            path=SEMANTIC_CACHE_PATH,
+            version_fn=lambda: store_version(db_faiss_path)
+        )
+    )
 
+@lru_cache(maxsize=1)
 def set_custom_prompt() -> PromptTemplate:
     """Create a custom prompt template with few-shot examples"""
     
@@ -62,99 +98,199 @@ Answer: Please provide your response with clear references to the source documen
 def load_llm() -> Ollama:
     """Load and configure the LLM"""
     try:
-        return Ollama(
+        return PooledOllama(
             model=LLM_MODEL_NAME,
-            temperature=LLM_TEMPERATURE
+            temperature=LLM_TEMPERATURE,
+            base_url=OLLAMA_BASE_URL
         )
     except Exception as e:
         logger.error(f"Failed to load LLM: {str(e)}")
         raise
 
-def create_qa_chain(vectorstore) -> RetrievalQA:
+def get_lexical_index() -> Optional[LexicalIndex]:
+    """BM25 index of the current vector store build, or None if it has none"""
+    db_faiss_path = str(DB_FAISS_PATH)
+    return resource_manager.get_or_create(
+        f"lexical_index:{store_version(db_faiss_path)}",
+        lambda: load_lexical_index(db_faiss_path)
+    )
+
+def get_reranker() -> CrossEncoderReranker:
+    """Process-wide cross-encoder reranker, created on first use"""
+    return resource_manager.get_or_create(
+        "reranker",
+        lambda: CrossEncoderReranker(RERANK_MODEL)
+    )
+
+def _llm_is_healthy(llm: Ollama) -> bool:
+    return ollama_is_reachable(llm.base_url)
+
+def get_llm() -> Ollama:
+    """Process-wide LLM client, created on first use"""
+    return resource_manager.get_or_create("llm", load_llm, health_check=_llm_is_healthy)
+
+def use_llm() -> ContextManager[Ollama]:
+    """
+    Hold the process-wide LLM client for one request
+
+    Chains resolve the client per request through this instead of keeping
+    one, so a client dropped by a failed health check is rebuilt on the
+    next request and is not closed while a generation still uses it.
+    """
+    return resource_manager.use("llm", load_llm, health_check=_llm_is_healthy)
+
+def get_qa_chain(vectorstore):
+    """Process-wide QA chain for a vector store, created on first use"""
+    return resource_manager.get_or_create(
+        f"qa_chain:{id(vectorstore)}",
+        lambda: create_qa_chain(vectorstore)
+    )
+
+def format_context(docs: List[Document]) -> str:
+    """Join source documents the way the "stuff" chain does"""
+    return "\n\n".join(doc.page_content for doc in docs)
+
+class QAWithFallback:
+    """
+    QA chain with cached answers, adaptive source selection and token streaming
+
+    Every request retrieves one scored candidate set and selects its sources
+    from it (see select_documents), relaxing the threshold for that request
+    only. The LLM runs at most once per question, and not at all when no
+    source is relevant.
+    """
+
+    def __init__(
+        self,
+        retriever,
+        prompt: PromptTemplate,
+        use_llm: Callable[[], ContextManager[Ollama]],
+        cache: SemanticCache
+    ):
+        self.retriever = retriever
+        self.prompt = prompt
+        self.use_llm = use_llm
+        self.cache = cache
+        
+    def __call__(self, query: Dict) -> Dict:
+        """Answer a query; returns {'result': str, 'source_documents': [...]}"""
+        logger.info(f"Processing query: {query.get('query', '')}")
+        result, docs = ERROR_MESSAGE, []
+        for event in self.stream(query):
+            if event["type"] == "done":
+                result, docs = event["result"], event["source_documents"]
+        return {'result': result, 'source_documents': docs}
+
+    def retrieve(self, question: str) -> List[Document]:
+        """Retrieve scored candidates once and keep the relevant ones"""
+        with span("retrieve") as stage:
+            candidates = self.retriever.invoke(question)
+            docs = select_documents(candidates)
+            stage.set(chunks=len(docs))
+        logger.info(f"Selected {len(docs)} of {len(candidates)} retrieved documents")
+        return docs
+
+    def build_prompt(self, question: str, docs: List[Document]) -> str:
+        """Fill the QA prompt with the question and the packed retrieved documents"""
+        with span("prompt_build") as stage:
+            packed = pack_context(docs, question)
+            stage.set(chunks=len(packed))
+            return self.prompt.format(context=format_context(packed), question=question)
+
+    def stream(self, query: Dict) -> Iterator[Dict]:
+        """
+        Answer a query, yielding events as soon as they are available
+
+        Yields:
+            {"type": "sources", "source_documents": [...]} once retrieval is done,
+            {"type": "token", "text": str} for every generated chunk, and
+            {"type": "done", "result": str, "source_documents": [...]} last.
+            The final result replaces the streamed text when the answer was
+            too short or generation failed.
+        """
+        question = query.get('query', '').strip()
+        logger.info(f"Streaming query: {question}")
+        with request_trace("qa"):
+            yield from self._stream(question)
+
+    def _stream(self, question: str) -> Iterator[Dict]:
+        docs: List[Document] = []
+        try:
+            with span("cache_lookup"):
+                cached = self.cache.lookup(question)
+            if cached:
+                logger.info("Using cached response")
+                docs = cached.get('source_documents', [])
+                yield {"type": "sources", "source_documents": docs}
+                yield {"type": "token", "text": cached['result']}
+                yield {"type": "done", "result": cached['result'], "source_documents": docs}
+                return
+
+            docs = self.retrieve(question)
+            yield {"type": "sources", "source_documents": docs}
+            if not docs:
+                # Nothing relevant to answer from, skip generation
+                yield {"type": "done", "result": NO_ANSWER_MESSAGE, "source_documents": docs}
+                return
+
+            parts = []
+            with self.use_llm() as llm:
+                for token in traced_tokens(llm.stream(self.build_prompt(question, docs))):
+                    parts.append(token)
+                    yield {"type": "token", "text": token}
+
+            result = "".join(parts)
+            if len(result.strip()) < 10:
+                result = NO_ANSWER_MESSAGE
+            else:
+                self.cache.add(question, {'result': result, 'source_documents': docs})
+            yield {"type": "done", "result": result, "source_documents": docs}
+
+        except Exception as e:
+            logger.error(f"QA stream error: {str(e)}")
+            yield {"type": "done", "result": ERROR_MESSAGE, "source_documents": docs}
+
+def create_qa_chain(vectorstore) -> QAWithFallback:
     """Create an optimized QA chain with caching"""
     try:
         prompt = set_custom_prompt()
-        llm = load_llm()
+        cache = get_response_cache(vectorstore)
         
-        # Configure optimized retriever
-        retriever = vectorstore.as_retriever(
-            search_kwargs={
-                "k": RETRIEVAL_K,
-                "fetch_k": RETRIEVAL_K * 2,
-                "score_threshold": 0.3,
-                "search_type": "mmr",  # Maximum Marginal Relevance
-                "lambda_mult": 0.7  # Diversity factor
-            }
-        )
-
-        # Create optimized chain
-        qa = RetrievalQA.from_chain_type(
-            llm=llm,
-            chain_type="stuff",
-            retriever=retriever,
-            return_source_documents=True,
-            chain_type_kwargs={
-                "prompt": prompt,
-                "verbose": True
-            }
-        )
-
-        def qa_with_fallback(query: Dict) -> Dict:
-            try:
-                question = query.get('query', '').strip()
-                
-                # Check cache first
-                cached = get_cached_response(question)
-                if cached:
-                    logger.info("Using cached response")
-                    return cached
-
-                # First try with normal threshold
-                result = qa(query)
-                docs = result.get('source_documents', [])
-                logger.info(f"Retrieved {len(docs)} documents")
-                
-                # Log source content for debugging
-                for i, doc in enumerate(docs):
-                    logger.debug(f"Document {i+1} content: {doc.page_content[:200]}...")
-                
-                # Check if result is empty or too short
-                if not result.get('result') or len(result['result'].strip()) < 10:
-                    # Try with lower threshold
-                    retriever.search_kwargs["score_threshold"] = 0.1
-                    result = qa(query)
-                    retriever.search_kwargs["score_threshold"] = 0.3  # Reset
-                    
-                    if not result.get('result') or len(result['result'].strip()) < 10:
-                        return {
-                            'result': "I apologize, but I couldn't find enough relevant information to answer your question accurately. Could you please:\n" +
-                                     "1. Rephrase your question\n" +
-                                     "2. Be more specific\n" +
-                                     "3. Or ask about a different medical topic",
-                            'source_documents': result.get('source_documents', [])
-                        }
-                
-                # Cache successful response
-                cache_response(question, result)
-                return result
-                
-            except Exception as e:
-                logger.error(f"QA chain error: {str(e)}")
-                return {
-                    'result': "I encountered an error while processing your question. Please try asking in a different way.",
-                    'source_documents': []
+        # Retrievers return a scored candidate pool; QAWithFallback.retrieve
+        # picks the sources per request
+        candidates = RETRIEVAL_K * _CANDIDATE_FACTOR
+        lexical_index = get_lexical_index() if HYBRID_SEARCH else None
+        if lexical_index is not None:
+            # Dense and BM25 candidates fused by reciprocal rank
+            retriever = HybridRetriever(
+                vectorstore=vectorstore,
+                lexical_index=lexical_index,
+                search_kwargs={
+                    "k": candidates,
+                    "fetch_k": RETRIEVAL_K * 4
                 }
+            )
+        else:
+            retriever = DenseRetriever(
+                vectorstore=vectorstore,
+                search_kwargs={"k": candidates}
+            )
+        
+        if RERANK_MODEL:
+            # Retrieve a wide candidate set and keep the best by cross-encoder
+            retriever.search_kwargs = {
+                **retriever.search_kwargs,
+                "k": RERANK_CANDIDATES,
+                "fetch_k": max(retriever.search_kwargs.get("fetch_k", 0), RERANK_CANDIDATES)
+            }
+            retriever = RerankingRetriever(
+                vectorstore=vectorstore,
+                base_retriever=retriever,
+                reranker=get_reranker(),
+                search_kwargs={"k": candidates}
+            )
 
-        class QAWithFallback:
-            def __init__(self, qa_chain, fallback_fn):
-                self.qa_chain = qa_chain
-                self.fallback_fn = fallback_fn
-                
-            def __call__(self, query):
-                logger.info(f"Processing query: {query.get('query', '')}")
-                return self.fallback_fn(query)
-
-        return QAWithFallback(qa, qa_with_fallback)
+        return QAWithFallback(retriever, prompt, use_llm, cache)
 
     except Exception as e:
         logger.error(f"Failed to create QA chain: {str(e)}")
@@ -1,14 +1,31 @@
-from typing import Dict, List, Optional
+from typing import Callable, ContextManager, Dict, List, Optional, Tuple
 from langchain.prompts import PromptTemplate
 from langchain_community.llms import Ollama
+from .context_packing import pack_texts
 from .exceptions import ModelError
+from .tracing import span
+from ..config import REFLECTION_MODE
 import logging
 
 logger = logging.getLogger(__name__)
 
+REFLECTION_MODES = ("single_pass", "two_pass")
+
+# Header separating the analysis from the rewritten answer in single-pass mode
+IMPROVED_HEADER = "improved response:"
+
 class SelfReflectionChain:
-    def __init__(self, llm: Ollama):
-        self.llm = llm
+    def __init__(self, use_llm: Callable[[], ContextManager[Ollama]], mode: str = REFLECTION_MODE):
+        """
+        Args:
+            use_llm: Returns a context manager holding the LLM for one call,
+                e.g. retrieval_qa.use_llm
+            mode: "single_pass" or "two_pass"
+        """
+        if mode not in REFLECTION_MODES:
+            raise ValueError(f"Unknown reflection mode {mode}, expected one of {REFLECTION_MODES}")
+        self.use_llm = use_llm
+        self.mode = mode
         self.reflection_prompt = PromptTemplate(
             template="""Analyze the following medical response for accuracy and completeness:
 
@@ -31,6 +48,31 @@ Confidence: [0-100]%
             input_variables=["response", "sources"]
         )
         
+        self.single_pass_prompt = PromptTemplate(
+            template="""Analyze the following medical response for accuracy and completeness, then improve it if needed:
+
+Response to analyze: {response}
+Source documents: {sources}
+
+Follow these steps and provide your analysis in the exact format below:
+
+Verified claims:
+- [list verified claims here]
+
+Missing information:
+- [list missing information here]
+
+Suggested improvements:
+- [list suggested improvements here]
+
+Confidence: [0-100]%
+
+Improved response:
+[If confidence is below 80% or information is missing, write an improved response that addresses the missing information, removes unsupported claims, implements the suggested improvements and keeps a professional medical tone. Otherwise write NONE.]
+""",
+            input_variables=["response", "sources"]
+        )
+        
         self.improvement_prompt = PromptTemplate(
             template="""Improve the following medical response based on the analysis:
 
@@ -52,14 +94,23 @@ Improved response:""",
         )
         
     def analyze_response(self, response: str, source_docs: List[str]) -> Dict:
-        """Analyze response quality and trustworthiness"""
+        """
+        Analyze response quality and trustworthiness
+        
+        In single_pass mode the analysis and the improved response come from
+        one LLM call; two_pass mode asks for the improvement separately.
+        """
+        if self.mode == "single_pass":
+            return self._analyze_single_pass(response, source_docs)
         try:
-            reflection = self.llm.invoke(
-                self.reflection_prompt.format(
-                    response=response,
-                    sources="\n".join(source_docs)
-                )
-            )
+            with span("reflection_analyze"):
+                with self.use_llm() as llm:
+                    reflection = llm.invoke(
+                        self.reflection_prompt.format(
+                            response=response,
+                            sources="\n".join(pack_texts(source_docs, response))
+                        )
+                    )
             
             # Parse reflection output
             analysis = self._parse_reflection(reflection)
@@ -81,6 +132,44 @@ Improved response:""",
         except Exception as e:
             raise ModelError(f"Failed to analyze response: {str(e)}") from e
     
+    def _analyze_single_pass(self, response: str, source_docs: List[str]) -> Dict:
+        """Analyze and improve a response with one structured LLM call"""
+        try:
+            with span("reflection_single_pass"):
+                with self.use_llm() as llm:
+                    reflection = llm.invoke(
+                        self.single_pass_prompt.format(
+                            response=response,
+                            sources="\n".join(pack_texts(source_docs, response))
+                        )
+                    )
+            analysis_text, improved_response = self._split_improved_response(reflection)
+            analysis = self._parse_reflection(analysis_text)
+            
+            # Keep the rewrite only when the analysis says it is needed
+            if analysis["confidence_score"] >= 80 and not analysis["missing_information"]:
+                improved_response = None
+                
+            return {
+                "original_response": response,
+                "improved_response": improved_response,
+                "analysis": analysis
+            }
+        except Exception as e:
+            raise ModelError(f"Failed to analyze response: {str(e)}") from e
+    
+    def _split_improved_response(self, reflection: str) -> Tuple[str, Optional[str]]:
+        """Split single-pass output into the analysis and the improved response"""
+        lines = reflection.strip().split("\n")
+        for i, line in enumerate(lines):
+            if line.strip().lower().startswith(IMPROVED_HEADER):
+                rest = [line.strip()[len(IMPROVED_HEADER):]] + lines[i + 1:]
+                improved = "\n".join(rest).strip()
+                if not improved or improved.strip("[]. ").upper() == "NONE":
+                    improved = None
+                return "\n".join(lines[:i]), improved
+        return reflection, None
+    
     def _parse_reflection(self, reflection: str) -> Dict:
         """Parse reflection output into structured format"""
         try:
@@ -143,14 +232,16 @@ Improved response:""",
             if not analysis["missing_information"] and not analysis["suggested_improvements"]:
                 return None
                 
-            improved = self.llm.invoke(
-                self.improvement_prompt.format(
-                    response=original_response,
-                    missing_info="\n".join(analysis["missing_information"]),
-                    unsupported_claims="\n".join(analysis["unsupported_claims"]),
-                    improvements="\n".join(analysis["suggested_improvements"])
-                )
-            )
+            with span("reflection_improve"):
+                with self.use_llm() as llm:
+                    improved = llm.invoke(
+                        self.improvement_prompt.format(
+                            response=original_response,
+                            missing_info="\n".join(analysis["missing_information"]),
+                            unsupported_claims="\n".join(analysis.get("unsupported_claims", [])),
+                            improvements="\n".join(analysis["suggested_improvements"])
+                        )
+                    )
             
             return improved.strip()
             
@@ -0,0 +1,272 @@
+"""Semantic response cache keyed by question embeddings"""
+
+import json
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from pathlib import Path
+from threading import Lock
+from typing import Callable, Dict, FrozenSet, List, Optional, Tuple
+import faiss
+import numpy as np
+from langchain.schema import Document
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+# Persist after this many new entries
+_SAVE_EVERY = 20
+
+# Nearest cached questions checked for a reusable answer
+_NEIGHBOURS = 4
+
+_NUMBER = re.compile(r"\d+(?:[.,]\d+)?")
+_WORD = re.compile(r"[a-zµ]+(?:'[a-z]+)?")
+_NEGATIONS = {"no", "not", "never", "without", "none", "nor", "cannot"}
+# Words that change the answer to a dosing question, with their variants
+_QUALIFIERS = {
+    **dict.fromkeys(("adult", "adults"), "adult"),
+    **dict.fromkeys(("child", "children", "childhood", "pediatric", "paediatric", "kid", "kids"), "child"),
+    **dict.fromkeys(("infant", "infants", "baby", "babies"), "infant"),
+    **dict.fromkeys(("neonate", "neonates", "neonatal", "newborn", "newborns"), "neonate"),
+    **dict.fromkeys(("adolescent", "adolescents", "teen", "teens", "teenager", "teenagers"), "adolescent"),
+    **dict.fromkeys(("elderly", "older", "geriatric"), "elderly"),
+    **dict.fromkeys(("pregnant", "pregnancy"), "pregnancy"),
+    **dict.fromkeys(("breastfeeding", "lactating", "lactation"), "lactation"),
+    **dict.fromkeys(("woman", "women", "female"), "female"),
+    **dict.fromkeys(("man", "men", "male"), "male"),
+    **{unit: unit for unit in ("mg", "g", "kg", "mcg", "µg", "ug", "ml", "l", "iu", "mmol", "units")}
+}
+
+# Numbers and qualifier words of a question
+Signature = Tuple[Tuple[float, ...], FrozenSet[str]]
+
+def normalize_question(question: str) -> str:
+    """Canonical form used for exact-match lookups"""
+    return " ".join(question.lower().split())
+
+def question_signature(question: str) -> Signature:
+    """
+    Numbers, negations, populations and units of a question
+
+    Questions differing only in these ("... for a 10 kg child" and
+    "... for a 20 kg child") embed almost identically but need different
+    answers, so a near match is only reused when its signature is equal.
+    """
+    text = normalize_question(question)
+    numbers = tuple(sorted(float(number.replace(",", ".")) for number in _NUMBER.findall(text)))
+    qualifiers = set()
+    for word in _WORD.findall(text):
+        if word in _NEGATIONS or word.endswith("n't"):
+            qualifiers.add("not")
+        elif word in _QUALIFIERS:
+            qualifiers.add(_QUALIFIERS[word])
+    return numbers, frozenset(qualifiers)
+
+class SemanticCache:
+    """
+    Cache of answered questions, matched by cosine similarity
+
+    Questions are embedded and kept in a small in-memory FAISS inner-product
+    index; a new question reuses the answer and sources of a cached
+    neighbour at least `threshold` similar whose numbers and qualifier
+    words are the same (see question_signature). A threshold of 1 or more
+    reuses exact matches only and skips the embedding. Entries expire
+    after `ttl_seconds` and the least recently used ones are evicted beyond
+    `max_entries`. The whole cache is dropped when `version_fn` reports a
+    different vector store version, e.g. after a rebuild.
+    """
+
+    def __init__(
+        self,
+        embedder: Embeddings,
+        threshold: float,
+        max_entries: int,
+        ttl_seconds: float,
+        path: Optional[Path] = None,
+        version_fn: Optional[Callable[[], str]] = None
+    ):
+        self.embedder = embedder
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.path = Path(path) if path else None
+        self.version_fn = version_fn or (lambda: "")
+        self.version = self.version_fn()
+        self._lock = Lock()
+        self._entries: "OrderedDict[int, Dict]" = OrderedDict()
+        self._exact: Dict[str, int] = {}
+        self._index = None
+        self._next_id = 0
+        self._unsaved = 0
+        if self.path and self.path.exists():
+            self._load()
+
+    def _ensure_index(self, dim: int) -> None:
+        if self._index is None:
+            self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+
+    def _embed(self, question: str) -> np.ndarray:
+        vector = np.array([self.embedder.embed_query(question)], dtype=np.float32)
+        faiss.normalize_L2(vector)
+        return vector
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id)
+        self._exact.pop(entry["key"], None)
+        self._index.remove_ids(np.array([entry_id], dtype=np.int64))
+
+    def _check_version(self) -> None:
+        version = self.version_fn()
+        if version != self.version:
+            logger.info("Vector store changed, clearing semantic cache")
+            self._clear()
+            self.version = version
+
+    def _clear(self) -> None:
+        self._entries.clear()
+        self._exact.clear()
+        if self._index is not None:
+            self._index.reset()
+
+    def _expired(self, entry: Dict) -> bool:
+        return time.time() - entry["created"] > self.ttl_seconds
+
+    def lookup(self, question: str) -> Optional[Dict]:
+        """Return the cached response for the same or a near-duplicate question"""
+        key = normalize_question(question)
+        with self._lock:
+            self._check_version()
+            if not self._entries:
+                return None
+            entry_id = self._exact.get(key)
+        if entry_id is None:
+            if self.threshold >= 1:
+                return None
+            vector = self._embed(question)
+            signature = question_signature(question)
+        with self._lock:
+            if entry_id is None:
+                if self._index is None or self._index.ntotal == 0:
+                    return None
+                scores, ids = self._index.search(vector, min(_NEIGHBOURS, self._index.ntotal))
+                for score, candidate_id in zip(scores[0], ids[0]):
+                    if candidate_id < 0 or score < self.threshold:
+                        break
+                    candidate = self._entries.get(int(candidate_id))
+                    if candidate is not None and candidate["signature"] == signature:
+                        entry_id = int(candidate_id)
+                        logger.info(f"Semantic cache hit (similarity {score:.3f})")
+                        break
+                if entry_id is None:
+                    return None
+            entry = self._entries.get(entry_id)
+            if entry is None:
+                return None
+            if self._expired(entry):
+                self._remove(entry_id)
+                return None
+            self._entries.move_to_end(entry_id)
+            return {'result': entry["result"], 'source_documents': entry["sources"]}
+
+    def add(self, question: str, response: Dict) -> None:
+        """Cache a response, evicting expired and least recently used entries"""
+        key = normalize_question(question)
+        vector = self._embed(question)
+        with self._lock:
+            self._check_version()
+            self._ensure_index(vector.shape[1])
+            if key in self._exact:
+                self._remove(self._exact[key])
+            entry_id = self._next_id
+            self._next_id += 1
+            self._index.add_with_ids(vector, np.array([entry_id], dtype=np.int64))
+            self._entries[entry_id] = {
+                "key": key,
+                "signature": question_signature(key),
+                "result": response.get('result', ''),
+                "sources": list(response.get('source_documents', [])),
+                "created": time.time(),
+                "vector": vector[0]
+            }
+            self._exact[key] = entry_id
+
+            for old_id in [i for i, e in self._entries.items() if self._expired(e)]:
+                self._remove(old_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+            self._unsaved += 1
+            if self.path and self._unsaved >= _SAVE_EVERY:
+                self._save()
+
+    def invalidate(self) -> None:
+        """Drop every cached response"""
+        with self._lock:
+            self._clear()
+            if self.path and self.path.exists():
+                self.path.unlink()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def save(self) -> None:
+        """Write the cache to disk if persistence is enabled"""
+        if self.path:
+            with self._lock:
+                self._save()
+
+    def close(self) -> None:
+        self.save()
+
+    def _save(self) -> None:
+        entries: List[Dict] = [
+            {
+                "key": entry["key"],
+                "result": entry["result"],
+                "sources": [
+                    {"page_content": doc.page_content, "metadata": doc.metadata}
+                    for doc in entry["sources"]
+                ],
+                "created": entry["created"],
+                "vector": entry["vector"].tolist()
+            }
+            for entry in self._entries.values()
+        ]
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": self.version, "entries": entries}, f)
+        os.replace(tmp_path, self.path)
+        self._unsaved = 0
+
+    def _load(self) -> None:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable semantic cache {self.path}: {e}")
+            return
+        if data.get("version") != self.version:
+            logger.info("Persisted semantic cache is for another vector store version, ignoring it")
+            return
+        for item in data.get("entries", []):
+            entry = {
+                "key": item["key"],
+                "signature": question_signature(item["key"]),
+                "result": item["result"],
+                "sources": [Document(**doc) for doc in item["sources"]],
+                "created": item["created"],
+                "vector": np.array(item["vector"], dtype=np.float32)
+            }
+            if self._expired(entry):
+                continue
+            self._ensure_index(len(entry["vector"]))
+            entry_id = self._next_id
+            self._next_id += 1
+            self._index.add_with_ids(entry["vector"][None, :], np.array([entry_id], dtype=np.int64))
+            self._entries[entry_id] = entry
+            self._exact[entry["key"]] = entry_id
+        logger.info(f"Loaded {len(self._entries)} cached responses from {self.path}")
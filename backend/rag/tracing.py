@@ -0,0 +1,200 @@
+"""Lightweight latency tracing of the RAG pipeline stages"""
+
+import logging
+import time
+from collections import deque
+from contextvars import ContextVar
+from threading import Lock
+from typing import AsyncIterator, Deque, Dict, Iterator, List, Optional, Tuple
+from ..config import TRACING_ENABLED, TRACE_WINDOW
+
+logger = logging.getLogger(__name__)
+
+# Percentiles reported per stage
+PERCENTILES = (50, 95, 99)
+
+class StageStats:
+    """Rolling window of one stage's durations, plus totals of its counters"""
+
+    def __init__(self, window: int):
+        self.durations: Deque[float] = deque(maxlen=window)
+        self.count = 0
+        self.counters: Dict[str, float] = {}
+
+    def add(self, seconds: float, counters: Dict[str, float]) -> None:
+        self.durations.append(seconds)
+        self.count += 1
+        for key, value in counters.items():
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def summary(self) -> Dict[str, float]:
+        ordered = sorted(self.durations)
+        summary = {"count": self.count}
+        for p in PERCENTILES:
+            # Nearest-rank percentile of the window, in milliseconds
+            index = min(len(ordered) - 1, max(0, -(-p * len(ordered) // 100) - 1))
+            summary[f"p{p}_ms"] = round(1000 * ordered[index], 2)
+        summary["mean_ms"] = round(1000 * sum(ordered) / len(ordered), 2)
+        for key, total in self.counters.items():
+            summary[f"avg_{key}"] = round(total / self.count, 2)
+        return summary
+
+class LatencyHistogram:
+    """Per-stage rolling latency windows, safe to update from any thread"""
+
+    def __init__(self, window: int = TRACE_WINDOW):
+        self.window = window
+        self._stages: Dict[str, StageStats] = {}
+        self._lock = Lock()
+
+    def record(self, stage: str, seconds: float, counters: Optional[Dict[str, float]] = None) -> None:
+        with self._lock:
+            stats = self._stages.get(stage)
+            if stats is None:
+                stats = self._stages[stage] = StageStats(self.window)
+            stats.add(seconds, counters or {})
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Stage -> count, p50/p95/p99/mean in ms and average counters"""
+        with self._lock:
+            return {stage: stats.summary() for stage, stats in sorted(self._stages.items())}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stages.clear()
+
+histogram = LatencyHistogram()
+
+# Spans of the request being handled in the current thread or task
+_request_spans: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("request_spans", default=None)
+
+class Span:
+    """
+    Timed pipeline stage, used as a context manager
+
+    Counters such as tokens or chunks can be attached with set() while the
+    span is open; they are averaged per stage in the histogram.
+    """
+
+    __slots__ = ("stage", "counters", "started")
+
+    def __init__(self, stage: str, counters: Dict[str, float]):
+        self.stage = stage
+        self.counters = counters
+
+    def set(self, **counters: float) -> None:
+        self.counters.update(counters)
+
+    def __enter__(self) -> "Span":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        record(self.stage, time.perf_counter() - self.started, **self.counters)
+
+class _NoopSpan:
+    """Shared do-nothing span used while tracing is disabled"""
+
+    __slots__ = ()
+
+    def set(self, **counters: float) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+_NOOP_SPAN = _NoopSpan()
+
+def span(stage: str, **counters: float):
+    """Time a block as `stage`; a no-op when tracing is disabled"""
+    if not TRACING_ENABLED:
+        return _NOOP_SPAN
+    return Span(stage, counters)
+
+def record(stage: str, seconds: float, **counters: float) -> None:
+    """Record a duration measured elsewhere"""
+    if not TRACING_ENABLED:
+        return
+    histogram.record(stage, seconds, counters)
+    spans = _request_spans.get()
+    if spans is not None:
+        spans.append((stage, seconds))
+
+class request_trace:
+    """
+    Collect the spans of one request and log them as a single line
+
+    The whole request is recorded as `stage` too. Spans recorded in worker
+    threads started with the request's context (e.g. asyncio.to_thread)
+    are included.
+    """
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self.span = span(stage)
+
+    def __enter__(self):
+        if TRACING_ENABLED:
+            self._token = _request_spans.set([])
+        return self.span.__enter__()
+
+    def __exit__(self, *exc_info) -> None:
+        if not TRACING_ENABLED:
+            return
+        spans = _request_spans.get()
+        try:
+            _request_spans.reset(self._token)
+        except ValueError:
+            # Exited from another context, e.g. a generator closed elsewhere
+            _request_spans.set(None)
+        self.span.__exit__(*exc_info)
+        if spans:
+            stages = " ".join(f"{stage}={1000 * seconds:.1f}ms" for stage, seconds in spans)
+            logger.info(f"{self.stage} {1000 * (time.perf_counter() - self.span.started):.1f}ms: {stages}")
+
+def traced_tokens(tokens: Iterator[str], prefix: str = "llm") -> Iterator[str]:
+    """
+    Pass a token stream through, recording prefill and decode time
+
+    Prefill is the time to the first token (prompt processing); decode is
+    the rest, with the number of streamed chunks as `tokens`.
+    """
+    if not TRACING_ENABLED:
+        yield from tokens
+        return
+    started = time.perf_counter()
+    first = None
+    count = 0
+    try:
+        for token in tokens:
+            if first is None:
+                first = time.perf_counter()
+                record(f"{prefix}_prefill", first - started)
+            count += 1
+            yield token
+    finally:
+        if first is not None:
+            record(f"{prefix}_decode", time.perf_counter() - first, tokens=count)
+
+async def traced_async_tokens(tokens: AsyncIterator[str], prefix: str = "llm") -> AsyncIterator[str]:
+    """Async version of traced_tokens"""
+    if not TRACING_ENABLED:
+        async for token in tokens:
+            yield token
+        return
+    started = time.perf_counter()
+    first = None
+    count = 0
+    try:
+        async for token in tokens:
+            if first is None:
+                first = time.perf_counter()
+                record(f"{prefix}_prefill", first - started)
+            count += 1
+            yield token
+    finally:
+        if first is not None:
+            record(f"{prefix}_decode", time.perf_counter() - first, tokens=count)
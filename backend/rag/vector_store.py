@@ -1,13 +1,44 @@
 # backend/ rag/ vector_store.py
 import os
+import json
+import shutil
 import logging
-from typing import Optional
+import time
+import faiss
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Set, Tuple, Union
 from functools import lru_cache
 from langchain_community.vectorstores import FAISS
 from backend.rag.embeddings import get_embedding_model
-from backend.rag.document_loader import load_documents
+from backend.rag.document_loader import (
+    discover_documents,
+    get_file_hash,
+    iter_documents
+)
+from backend.rag.ingest_pipeline import run_ingest_pipeline
+from backend.rag.chunk_store import SQLiteDocstore, SQLiteIndexMap
+from backend.rag.lexical_index import LEXICAL_INDEX_DIR, LexicalIndex, load_lexical_index
+from backend.rag.ann_index import (
+    apply_search_params,
+    describe_index,
+    measure_recall,
+    store_vectors
+)
+from backend.rag.chunker import CHUNKER_VERSION, StructuredChunker
 from langchain.text_splitter import RecursiveCharacterTextSplitter
-from ..config import CHUNK_SIZE, CHUNK_OVERLAP
+from ..config import (
+    CHUNK_SIZE,
+    CHUNK_OVERLAP,
+    CHUNKER,
+    CHUNK_MAX_TOKENS,
+    CHUNK_TOKENIZER,
+    EMBEDDING_BACKEND,
+    EMBEDDING_MODEL_NAME,
+    EMBEDDING_ONNX_FILE,
+    EMBEDDING_WARMUP,
+    INDEX_TYPE,
+    RETRIEVAL_K
+)
 
 logger = logging.getLogger(__name__)
 
@@ -15,12 +46,232 @@ class VectorStoreError(Exception):
     """Custom exception for vector store operations"""
     pass
 
-# Cache for document chunks to avoid recomputing
-_chunk_cache = {}
+# Manifest of file hash -> chunk ids, stored next to the FAISS index
+MANIFEST_FILE = "manifest.json"
+
+# On-disk layout of a vector store directory
+INDEX_FILE = "index.faiss"
+CHUNK_STORE_FILE = "chunks.sqlite"
+LEGACY_DOCSTORE_FILE = "index.pkl"
+
+def _ingest_settings() -> Dict:
+    """Settings that invalidate every stored vector when they change"""
+    return {
+        "embedding_model": EMBEDDING_MODEL_NAME,
+        # fp32 and int8-quantized vectors must not share an index
+        "embedding_backend": EMBEDDING_BACKEND,
+        "embedding_onnx_file": EMBEDDING_ONNX_FILE if EMBEDDING_BACKEND != "torch" else None,
+        "chunk_size": CHUNK_SIZE,
+        "chunk_overlap": CHUNK_OVERLAP,
+        "chunker": CHUNKER,
+        "chunker_version": CHUNKER_VERSION if CHUNKER == "structured" else None,
+        "chunk_max_tokens": CHUNK_MAX_TOKENS,
+        "chunk_tokenizer": CHUNK_TOKENIZER,
+        "index_type": INDEX_TYPE
+    }
+
+def _get_splitter() -> Union[StructuredChunker, RecursiveCharacterTextSplitter]:
+    """A fresh chunker for one ingest run (the structured one tracks section titles)"""
+    if CHUNKER == "structured":
+        return StructuredChunker()
+    return RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
+        length_function=len,
+        separators=["\n\n", "\n", ".", "!", "?", ",", " ", ""]
+    )
+
+def load_manifest(db_faiss_path: str) -> Optional[Dict]:
+    """Read the ingest manifest, or None if the store has none"""
+    manifest_path = os.path.join(db_faiss_path, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return None
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable manifest {manifest_path}: {e}")
+        return None
+
+def store_version(db_faiss_path: str) -> str:
+    """
+    Cheap fingerprint of a vector store build
+
+    Every save rewrites the index file, so its mtime and size change whenever
+    the store is rebuilt or updated.
+    """
+    try:
+        stat = os.stat(os.path.join(db_faiss_path, INDEX_FILE))
+    except OSError:
+        return ""
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+def manifest_delta(
+    old_files: Dict[str, Dict],
+    current_hashes: Dict[str, str]
+) -> Tuple[List[str], List[str], List[str]]:
+    """
+    Files added, changed and removed since the manifest was written
+
+    A file recorded with an empty hash (see _mark_failed) never matches its
+    current hash, so it counts as changed and is parsed again.
+
+    Args:
+        old_files: The manifest's file path -> entry mapping
+        current_hashes: File path -> content hash of the files on disk
+
+    Returns:
+        Tuple[List[str], List[str], List[str]]: Added, changed and removed paths
+    """
+    added = [p for p in current_hashes if p not in old_files]
+    changed = [
+        p for p, file_hash in current_hashes.items()
+        if p in old_files and old_files[p]["hash"] != file_hash
+    ]
+    removed = [p for p in old_files if p not in current_hashes]
+    return added, changed, removed
+
+def _mark_failed(files: Dict[str, Dict], failed: Set[str]) -> None:
+    """
+    Record files that failed to parse without a hash
+
+    Their chunks (if any pages parsed) stay searchable, but the empty hash
+    never matches, so the next incremental run parses them again.
+    """
+    for file_path in failed:
+        entry = files.setdefault(file_path, {"source": os.path.basename(file_path), "chunk_ids": []})
+        entry["hash"] = ""
+        logger.warning(f"{file_path} failed to parse, it will be retried on the next incremental run")
+
+def save_manifest(
+    db_faiss_path: str,
+    files: Dict[str, Dict],
+    index_info: Optional[Dict] = None
+) -> None:
+    """Atomically write the ingest manifest next to the FAISS index"""
+    manifest_path = os.path.join(db_faiss_path, MANIFEST_FILE)
+    tmp_path = manifest_path + ".tmp"
+    manifest = {"settings": _ingest_settings(), "index": index_info or {}, "files": files}
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+def _open_store(
+    db_faiss_path: str,
+    embedder,
+    chunk_store_file: str = CHUNK_STORE_FILE,
+    read_only: bool = True
+) -> FAISS:
+    """
+    Open a vector store directory
+
+    The chunk store is opened lazily, so only the FAISS index is read into
+    memory. Stores built before the chunk store existed fall back to the
+    pickled docstore.
+    """
+    chunk_path = os.path.join(db_faiss_path, chunk_store_file)
+    if not os.path.exists(chunk_path):
+        logger.warning(
+            f"No {CHUNK_STORE_FILE} in {db_faiss_path}, loading the pickled docstore; "
+            "rebuild the vector store to switch to the chunk store"
+        )
+        return FAISS.load_local(
+            db_faiss_path,
+            embedder,
+            allow_dangerous_deserialization=True,
+            normalize_L2=True  # Match the normalization used at build time
+        )
+    index = faiss.read_index(os.path.join(db_faiss_path, INDEX_FILE))
+    docstore = SQLiteDocstore(chunk_path, read_only=read_only)
+    return FAISS(embedder, index, docstore, docstore.index_map(), normalize_L2=True)
+
+def _save_store(
+    db: FAISS,
+    db_faiss_path: str,
+    lexical: Optional[LexicalIndex] = None
+) -> None:
+    """
+    Write the FAISS index, chunk store and BM25 index of db into db_faiss_path
+
+    The BM25 index is built from the whole chunk store unless an already
+    updated one is passed in as `lexical`.
+
+    Each file is written under a temporary name and moved into place, so
+    no single file is ever half-written. The files are replaced one after
+    another, though, and the caller writes the manifest last: after a
+    crash in between, the manifest may still list chunks that are gone,
+    which the next incremental run tolerates.
+    """
+    os.makedirs(db_faiss_path, exist_ok=True)
+    index_path = os.path.join(db_faiss_path, INDEX_FILE)
+    chunk_path = os.path.join(db_faiss_path, CHUNK_STORE_FILE)
+    faiss.write_index(db.index, index_path + ".tmp")
+
+    if isinstance(db.docstore, SQLiteDocstore):
+        # FAISS.delete replaces the lazy mapping with a compacted dict
+        if not isinstance(db.index_to_docstore_id, SQLiteIndexMap):
+            db.docstore.set_positions(db.index_to_docstore_id)
+        db.docstore.close()
+        chunk_tmp = str(db.docstore.path)
+    else:
+        # Export an in-memory (legacy) docstore
+        chunk_tmp = chunk_path + ".tmp"
+        if os.path.exists(chunk_tmp):
+            os.remove(chunk_tmp)
+        store = SQLiteDocstore(chunk_tmp)
+        mapping = dict(db.index_to_docstore_id.items())
+        store.add({chunk_id: db.docstore.search(chunk_id) for chunk_id in mapping.values()})
+        store.set_positions(mapping)
+        store.close()
+
+    # BM25 index over the same chunks, for hybrid search
+    lexical_path = os.path.join(db_faiss_path, LEXICAL_INDEX_DIR)
+    if lexical is not None:
+        lexical.save(lexical_path)
+    else:
+        chunks = SQLiteDocstore(chunk_tmp, read_only=True)
+        try:
+            LexicalIndex.build(chunks.iter_chunks()).save(lexical_path)
+        finally:
+            chunks.close()
+
+    os.replace(chunk_tmp, chunk_path)
+    os.replace(index_path + ".tmp", index_path)
+    legacy_path = os.path.join(db_faiss_path, LEGACY_DOCSTORE_FILE)
+    if os.path.exists(legacy_path):
+        os.remove(legacy_path)
+
+def _updated_lexical_index(
+    db_faiss_path: str,
+    db: FAISS,
+    removed: Sequence[str],
+    added: Sequence[str]
+) -> Optional[LexicalIndex]:
+    """
+    Apply a chunk delta to the stored BM25 index
+
+    Only the added chunks are read from the chunk store and tokenized.
+
+    Returns:
+        Optional[LexicalIndex]: The updated index, or None if the store has
+            no usable BM25 index and it must be built from scratch
+    """
+    index = load_lexical_index(db_faiss_path)
+    if index is None:
+        return None
+    updated = index.update(
+        removed,
+        ((chunk_id, db.docstore.search(chunk_id).page_content) for chunk_id in added)
+    )
+    if updated.n_docs != db.index.ntotal:
+        logger.warning("BM25 index does not match the chunk store, rebuilding it")
+        return None
+    return updated
 
 def create_vector_store(
     data_path: str,
-    db_faiss_path: str
+    db_faiss_path: str,
+    incremental: bool = False
 ) -> None:
     """
     Create and save FAISS vector store from documents
@@ -28,60 +279,188 @@ def create_vector_store(
     Args:
         data_path (str): Directory with raw documents
         db_faiss_path (str): Path to save FAISS index
+        incremental (bool): Only re-embed files whose content changed since
+            the last build, using the manifest stored next to the index
         
     Raises:
         VectorStoreError: If creation or saving fails
     """
-    try:
-        # Load documents
-        documents = load_documents(data_path)
-        if not documents:
-            raise VectorStoreError("No documents were loaded")
-
-        # Use cached chunks if available
-        cache_key = f"{data_path}_{CHUNK_SIZE}_{CHUNK_OVERLAP}"
-        if cache_key in _chunk_cache:
-            chunks = _chunk_cache[cache_key]
-            logger.info("Using cached document chunks")
+    if incremental:
+        manifest = load_manifest(db_faiss_path)
+        index_file = os.path.join(db_faiss_path, INDEX_FILE)
+        if manifest is None or not os.path.exists(index_file):
+            logger.info("No manifest found, falling back to a full rebuild")
+        elif manifest.get("settings") != _ingest_settings():
+            logger.info("Ingest settings changed, falling back to a full rebuild")
         else:
-            # Chunk documents
-            splitter = RecursiveCharacterTextSplitter(
-                chunk_size=CHUNK_SIZE,
-                chunk_overlap=CHUNK_OVERLAP,
-                length_function=len,
-                separators=["\n\n", "\n", ".", "!", "?", ",", " ", ""]
-            )
-            chunks = splitter.split_documents(documents)
-            _chunk_cache[cache_key] = chunks
-            logger.info(f"Created and cached {len(chunks)} chunks")
-
-        if not chunks:
-            raise VectorStoreError("Document splitting produced no chunks")
+            return _update_vector_store(data_path, db_faiss_path, manifest)
 
-        # Create embeddings with batch processing
-        embedder = get_embedding_model()
-        
-        # Build and save FAISS with optimized parameters
-        logger.info(f"Creating FAISS index with {len(chunks)} chunks")
-        db = FAISS.from_documents(
-            chunks, 
+    try:
+        files_to_process = discover_documents(data_path)
+        if not files_to_process:
+            raise VectorStoreError(f"No supported documents found in {data_path}")
+        logger.info(f"Streaming {len(files_to_process)} documents into a new index")
+
+        # Stream pages -> chunks -> embedding batches -> FAISS, writing
+        # chunk text straight into a fresh chunk store
+        os.makedirs(db_faiss_path, exist_ok=True)
+        chunk_tmp = os.path.join(db_faiss_path, CHUNK_STORE_FILE + ".tmp")
+        if os.path.exists(chunk_tmp):
+            os.remove(chunk_tmp)
+        embedder = get_embedding_model(use_cache=True)
+        failed: Set[str] = set()
+        db, files = run_ingest_pipeline(
+            iter_documents(files_to_process, failed=failed),
+            _get_splitter(),
             embedder,
-            normalize_L2=True  # L2 normalization for better similarity search
+            chunk_store_path=chunk_tmp
         )
+        if db is None:
+            raise VectorStoreError("Document splitting produced no chunks")
+        _mark_failed(files, failed)
         
-        # Save with compression
-        os.makedirs(db_faiss_path, exist_ok=True)
-        db.save_local(
-            db_faiss_path,
-            index_kwargs={"compression_params": {"type": "PCAR", "dim": 64}}  # Compress vectors
-        )
-        logger.info(f"Successfully saved vector store to {db_faiss_path}")
+        # Save index, chunk store and manifest
+        _save_store(db, db_faiss_path)
+        save_manifest(db_faiss_path, files, describe_index(db.index))
+        load_vector_store.cache_clear()
+        logger.info(f"Successfully saved vector store with {db.index.ntotal} chunks to {db_faiss_path}")
         
     except Exception as e:
         error_msg = f"Failed to create vector store: {str(e)}"
         logger.error(error_msg)
         raise VectorStoreError(error_msg) from e
 
+def _update_vector_store(
+    data_path: str,
+    db_faiss_path: str,
+    manifest: Dict
+) -> None:
+    """
+    Apply the delta between data_path and the manifest to an existing store
+
+    New and changed files are embedded and added, vectors of deleted and
+    changed files are removed, everything else is left untouched.
+    """
+    try:
+        old_files: Dict[str, Dict] = manifest.get("files", {})
+        current_files = {
+            file_path: (get_file_hash(file_path), loader_cls)
+            for file_path, loader_cls in discover_documents(data_path)
+        }
+        if not current_files:
+            raise VectorStoreError(f"No supported documents found in {data_path}")
+
+        added, changed, removed = manifest_delta(
+            old_files, {p: file_hash for p, (file_hash, _) in current_files.items()}
+        )
+        logger.info(
+            f"Incremental ingest: {len(added)} new, {len(changed)} changed, "
+            f"{len(removed)} removed, "
+            f"{len(current_files) - len(added) - len(changed)} unchanged"
+        )
+        if not (added or changed or removed):
+            logger.info("Vector store is up to date")
+            return
+
+        # Drop vectors of deleted and changed files
+        stale_ids = [
+            chunk_id
+            for file_path in removed + changed
+            for chunk_id in old_files[file_path]["chunk_ids"]
+        ]
+        if stale_ids and INDEX_TYPE != "flat":
+            # IVF ids are not compacted on removal and HNSW cannot remove at
+            # all, so rebuild; unchanged chunks come from the embedding cache
+            logger.info(f"Removing vectors from a {INDEX_TYPE} index requires a full rebuild")
+            return create_vector_store(data_path, db_faiss_path)
+
+        # Work on a copy of the chunk store so a failed update leaves the
+        # current store intact
+        embedder = get_embedding_model(use_cache=True)
+        chunk_path = os.path.join(db_faiss_path, CHUNK_STORE_FILE)
+        if os.path.exists(chunk_path):
+            shutil.copyfile(chunk_path, chunk_path + ".tmp")
+        db = _open_store(
+            db_faiss_path,
+            embedder,
+            chunk_store_file=CHUNK_STORE_FILE + ".tmp",
+            read_only=False
+        ) if os.path.exists(chunk_path) else _open_store(db_faiss_path, embedder)
+
+        if stale_ids:
+            # An interrupted save can leave the manifest listing chunks the
+            # store no longer has, and FAISS refuses to delete unknown ids
+            indexed = set(db.index_to_docstore_id.values())
+            present = [chunk_id for chunk_id in stale_ids if chunk_id in indexed]
+            if len(present) < len(stale_ids):
+                logger.warning(
+                    f"{len(stale_ids) - len(present)} chunks listed in the manifest "
+                    "are not in the store"
+                )
+            if present:
+                db.delete(present)
+            logger.info(f"Removed {len(present)} stale chunks")
+        files = {
+            p: entry for p, entry in old_files.items()
+            if p not in removed and p not in changed
+        }
+
+        # Embed new and changed files only
+        to_index = [(p, current_files[p][1]) for p in added + changed]
+        failed: Set[str] = set()
+        db, new_files = run_ingest_pipeline(
+            iter_documents(to_index, failed=failed),
+            _get_splitter(),
+            embedder,
+            db=db
+        )
+        # Record files without extractable text too, so they are not
+        # re-parsed on every run; files that failed to parse are retried
+        for file_path, _ in to_index:
+            files[file_path] = new_files.get(file_path, {
+                "hash": current_files[file_path][0],
+                "source": os.path.basename(file_path),
+                "chunk_ids": []
+            })
+        _mark_failed(files, failed)
+
+        if not any(entry["chunk_ids"] for entry in files.values()):
+            raise VectorStoreError("Incremental update left the vector store empty")
+
+        added_ids = [chunk_id for p, _ in to_index for chunk_id in files[p]["chunk_ids"]]
+        lexical = _updated_lexical_index(db_faiss_path, db, stale_ids, added_ids)
+        _save_store(db, db_faiss_path, lexical)
+        save_manifest(db_faiss_path, files, describe_index(db.index))
+        load_vector_store.cache_clear()
+        logger.info(f"Successfully updated vector store at {db_faiss_path}")
+
+    except Exception as e:
+        error_msg = f"Failed to update vector store: {str(e)}"
+        logger.error(error_msg)
+        raise VectorStoreError(error_msg) from e
+
+def warm_up(vectorstore: FAISS) -> None:
+    """
+    Run dummy encodes and a dummy search so the first question is not slow
+
+    Model weights, lazily initialized kernels for a few sequence lengths,
+    the FAISS index pages and the chunk store connection are all touched
+    once. Failures are logged and otherwise ignored.
+    """
+    started = time.perf_counter()
+    try:
+        embedder = vectorstore.embedding_function
+        # Documents rather than queries, so the query cache stays clean
+        vectors = embedder.embed_documents(["warm up " * n for n in (4, 32, 128)])
+        query = np.array(vectors[:1], dtype=np.float32)
+        faiss.normalize_L2(query)
+        _, positions = vectorstore.index.search(query, RETRIEVAL_K)
+        if positions.size and positions[0][0] != -1:
+            vectorstore.docstore.search(vectorstore.index_to_docstore_id[int(positions[0][0])])
+        logger.info(f"Warmed up vector store in {time.perf_counter() - started:.2f}s")
+    except Exception as e:
+        logger.warning(f"Vector store warm-up failed: {str(e)}")
+
 @lru_cache(maxsize=1)
 def load_vector_store(
     db_faiss_path: str
@@ -103,15 +482,12 @@ def load_vector_store(
             raise VectorStoreError(f"Vector store path does not exist: {db_faiss_path}")
             
         embedder = get_embedding_model()
-        vectorstore = FAISS.load_local(
-            db_faiss_path,
-            embedder,
-            allow_dangerous_deserialization=True
-        )
+        vectorstore = _open_store(db_faiss_path, embedder)
         
-        # Optimize index after loading
-        if hasattr(vectorstore, 'index'):
-            vectorstore.index.nprobe = 4  # Number of clusters to search
+        # Apply search-time knobs (nprobe / efSearch) for ANN indexes
+        apply_search_params(vectorstore.index)
+        if EMBEDDING_WARMUP:
+            warm_up(vectorstore)
             
         logger.info(f"Successfully loaded vector store from {db_faiss_path}")
         return vectorstore
@@ -119,4 +495,30 @@ def load_vector_store(
     except Exception as e:
         error_msg = f"Failed to load vector store: {str(e)}"
         logger.error(error_msg)
-        raise VectorStoreError(error_msg) from e
\ No newline at end of file
+        raise VectorStoreError(error_msg) from e
+
+def report_index_recall(
+    db_faiss_path: str,
+    k_values: Sequence[int] = (1, RETRIEVAL_K, 10)
+) -> Dict[int, float]:
+    """
+    Measure recall@k of the stored ANN index against exact flat search
+
+    Args:
+        db_faiss_path (str): Path to FAISS index directory
+        k_values: Cut-offs to report
+
+    Returns:
+        Dict[int, float]: k -> recall
+    """
+    try:
+        db = _open_store(db_faiss_path, get_embedding_model(use_cache=True))
+        apply_search_params(db.index)
+        recall = measure_recall(db.index, store_vectors(db), k_values)
+        for k, value in recall.items():
+            logger.info(f"{describe_index(db.index)['class']} recall@{k}: {value:.3f}")
+        return recall
+    except Exception as e:
+        error_msg = f"Failed to measure index recall: {str(e)}"
+        logger.error(error_msg)
+        raise VectorStoreError(error_msg) from e
@@ -0,0 +1,72 @@
+"""
+Compare two benchmark result files and flag regressions
+
+Every numeric metric present in both files is compared. Throughputs
+(`*_per_sec`, `qps`) should not drop and latencies, durations and memory
+(`*_ms`, `*_seconds`, `*_mb`) should not grow by more than --threshold
+percent.
+
+    python benchmarks/compare.py baseline.json results.json --threshold 10
+"""
+
+import argparse
+import json
+import sys
+from typing import Dict, Iterator, List, Optional, Tuple
+
+_HIGHER_IS_BETTER = ("_per_sec", "qps")
+_LOWER_IS_BETTER = ("_ms", "_seconds", "_mb")
+
+def flatten(node, prefix: str = "") -> Iterator[Tuple[str, float]]:
+    """(dotted path, value) of every numeric leaf"""
+    if isinstance(node, dict):
+        for key, value in node.items():
+            yield from flatten(value, f"{prefix}.{key}" if prefix else key)
+    elif isinstance(node, (int, float)) and not isinstance(node, bool):
+        yield prefix, float(node)
+
+def direction(metric: str) -> Optional[int]:
+    """+1 if higher is better, -1 if lower is better, None if not a performance metric"""
+    name = metric.rsplit(".", 1)[-1]
+    if name.endswith(_HIGHER_IS_BETTER):
+        return 1
+    if name.endswith(_LOWER_IS_BETTER):
+        return -1
+    return None
+
+def compare(baseline: Dict, current: Dict, threshold: float) -> List[Tuple[str, float, float, float, bool]]:
+    """(metric, baseline, current, change %, regressed) for comparable metrics"""
+    base = dict(flatten(baseline.get("scales", {})))
+    rows = []
+    for metric, value in flatten(current.get("scales", {})):
+        sign = direction(metric)
+        if sign is None or metric not in base or base[metric] == 0:
+            continue
+        change = 100 * (value - base[metric]) / base[metric]
+        rows.append((metric, base[metric], value, change, sign * change < -threshold))
+    return rows
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Allowed change in percent")
+    parser.add_argument("--all", action="store_true", help="List unchanged metrics too")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.current, encoding="utf-8") as f:
+        current = json.load(f)
+
+    rows = compare(baseline, current, args.threshold)
+    regressions = [row for row in rows if row[4]]
+    for metric, before, after, change, regressed in rows:
+        if args.all or regressed or abs(change) > args.threshold:
+            flag = "REGRESSION" if regressed else ""
+            print(f"{metric:60s} {before:12.3f} -> {after:12.3f} {change:+7.1f}% {flag}")
+    print(f"{len(rows)} metrics compared, {len(regressions)} regressions above {args.threshold:.0f}%")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
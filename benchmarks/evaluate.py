@@ -0,0 +1,365 @@
+"""
+Retrieval quality evaluation over a sweep of ingest and retrieval settings
+
+Takes a JSONL file of questions with the source file (and optionally the
+page) that answers them:
+
+    {"question": "What is the first-line treatment of ...", "source": "guidelines.pdf", "page": 41}
+    {"question": "...", "source": "handbook.pdf", "pages": [3, 4]}
+
+Pages are numbered from 1, as in a PDF viewer and the chatbot's
+references; a chunk matches every page of its page range, and without a
+page any chunk of the source counts.
+For every combination of embedding model, CHUNKER, CHUNK_SIZE,
+CHUNK_OVERLAP and INDEX_TYPE a store is built in a fresh process, then
+each retriever (dense, hybrid, and dense + MMR re-ranking at each
+lambda_mult) is scored at every RETRIEVAL_K with recall@k, MRR and nDCG@k
+next to its query latency and the index size.
+
+    python benchmarks/evaluate.py golden.jsonl --chunk-size 500 1000 --chunk-overlap 100 200 \\
+        --index-type flat hnsw --k 3 5 --lambda-mult 0.5 0.8 -o evaluation.json
+"""
+
+import argparse
+import itertools
+import json
+import math
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from run import PROJECT_ROOT, _check, _git_commit, _latency_summary, run_isolated
+
+# Chunks fetched per query before MMR re-ranking, as a multiple of k
+_MMR_FETCH_FACTOR = 4
+
+# A relevant target: (source file name, 0-based page or None for any page)
+Target = Tuple[str, Optional[int]]
+
+def read_golden(path: str) -> List[Dict]:
+    """
+    Read evaluation questions and their relevant (source, page) targets
+
+    Raises:
+        ValueError: If a line has no question or no source, or an empty page list
+    """
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if not record.get("question") or not record.get("source"):
+                raise ValueError(f"{path}:{line_number}: 'question' and 'source' are required")
+            source = os.path.basename(record["source"])
+            pages = record.get("pages", [record["page"]] if record.get("page") is not None else [None])
+            if not pages:
+                raise ValueError(f"{path}:{line_number}: 'pages' must not be empty")
+            records.append({
+                "question": record["question"],
+                # Chunk metadata numbers pages from 0
+                "targets": sorted({(source, None if page is None else int(page) - 1) for page in pages}, key=str)
+            })
+    return records
+
+def _matches(metadata: Dict, target: Target) -> bool:
+    source, page = target
+    if os.path.basename(str(metadata.get("source", ""))) != source:
+        return False
+    if page is None:
+        return True
+    start = metadata.get("start_page", metadata.get("page"))
+    return start is not None and start <= page <= metadata.get("end_page", start)
+
+def score_ranking(ranked: Sequence[Dict], targets: Sequence[Target], k: int) -> Dict[str, float]:
+    """
+    Recall@k, reciprocal rank and nDCG@k of one ranked list of chunk metadata
+
+    Each target counts once: further chunks of an already found page add
+    no gain, so a retriever cannot score by returning one page k times.
+    DCG and its ideal both count one gain per target, at the rank of the
+    first chunk covering it, so a chunk spanning several target pages
+    scores like separate chunks of those pages at the same rank. As
+    targets sharing a rank can beat the one-per-rank ideal, nDCG is
+    capped at 1.
+    """
+    found: Set[Target] = set()
+    dcg = 0.0
+    reciprocal_rank = 0.0
+    for rank, metadata in enumerate(ranked[:k], 1):
+        new = [target for target in targets if target not in found and _matches(metadata, target)]
+        if not new:
+            continue
+        found.update(new)
+        dcg += len(new) / math.log2(rank + 1)
+        if not reciprocal_rank:
+            reciprocal_rank = 1 / rank
+    ideal = sum(1 / math.log2(rank + 1) for rank in range(1, min(len(targets), k) + 1))
+    return {
+        "recall": len(found) / len(targets),
+        "mrr": reciprocal_rank,
+        "ndcg": min(1.0, dcg / ideal) if ideal else 0.0
+    }
+
+def _store_size_mb(db_path: str) -> Dict[str, float]:
+    from backend.rag.vector_store import INDEX_FILE
+
+    total = sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(db_path) for name in names
+    )
+    return {
+        "index_size_mb": round(os.path.getsize(os.path.join(db_path, INDEX_FILE)) / 1e6, 3),
+        "store_size_mb": round(total / 1e6, 3)
+    }
+
+# --- Run in a fresh process per configuration ---
+
+def build_store(data_path: str, db_path: str) -> Dict:
+    """Build the store for the settings in the environment"""
+    from backend.rag.vector_store import create_vector_store
+
+    started = time.perf_counter()
+    create_vector_store(data_path, db_path)
+    return {"build_seconds": round(time.perf_counter() - started, 3), **_store_size_mb(db_path)}
+
+class _MMRRanker:
+    """
+    Dense candidates re-ranked by maximal marginal relevance
+
+    Candidate vectors are reconstructed from the index rather than
+    re-embedded, so latency covers what a serving-time MMR stage would do.
+    """
+
+    def __init__(self, vectorstore: Any, k: int, lambda_mult: float):
+        import faiss
+
+        self.vectorstore = vectorstore
+        self.k = k
+        self.lambda_mult = lambda_mult
+        self.positions = {chunk_id: i for i, chunk_id in vectorstore.index_to_docstore_id.items()}
+        try:
+            faiss.extract_index_ivf(vectorstore.index).make_direct_map()
+        except RuntimeError:
+            pass  # Flat and HNSW indexes reconstruct without a direct map
+
+    def retrieve_batch(self, queries: Sequence[str]) -> List[List[Any]]:
+        import numpy as np
+        from langchain_community.vectorstores.utils import maximal_marginal_relevance
+        from backend.rag.adaptive_retrieval import dense_search, scored_documents
+
+        results = []
+        for query, hits in zip(queries, dense_search(self.vectorstore, queries, _MMR_FETCH_FACTOR * self.k)):
+            if not hits:
+                results.append([])
+                continue
+            candidates = np.array(
+                [self.vectorstore.index.reconstruct(self.positions[chunk_id]) for chunk_id, _ in hits],
+                dtype=np.float32
+            )
+            query_vector = np.array(self.vectorstore._embed_query(query), dtype=np.float32)
+            selected = maximal_marginal_relevance(query_vector, candidates, self.lambda_mult, self.k)
+            results.append(scored_documents(self.vectorstore, [hits[i] for i in selected]))
+        return results
+
+def evaluate_store(
+    db_path: str,
+    records: List[Dict],
+    ks: Sequence[int],
+    retrievers: Sequence[str],
+    lambda_mults: Sequence[float]
+) -> Dict:
+    """Quality and latency of every retriever and k on one store"""
+    from backend.rag.adaptive_retrieval import DenseRetriever
+    from backend.rag.hybrid_search import HybridRetriever
+    from backend.rag.lexical_index import load_lexical_index
+    from backend.rag.vector_store import load_vector_store
+
+    vectorstore = load_vector_store(db_path)
+    lexical_index = load_lexical_index(db_path) if "hybrid" in retrievers else None
+    questions = [record["question"] for record in records]
+    results = {}
+    for k in ks:
+        rankers = {}
+        if "dense" in retrievers:
+            rankers["dense"] = DenseRetriever(vectorstore=vectorstore, search_kwargs={"k": k})
+        if lexical_index is not None:
+            rankers["hybrid"] = HybridRetriever(
+                vectorstore=vectorstore,
+                lexical_index=lexical_index,
+                search_kwargs={"k": k, "fetch_k": max(4 * k, 10)}
+            )
+        if "mmr" in retrievers:
+            for lambda_mult in lambda_mults:
+                rankers[f"mmr{lambda_mult:g}"] = _MMRRanker(vectorstore, k, lambda_mult)
+
+        for name, ranker in rankers.items():
+            ranker.retrieve_batch(questions[:2])  # Warm up
+            scores = {"recall": 0.0, "mrr": 0.0, "ndcg": 0.0}
+            latencies = []
+            for record in records:
+                started = time.perf_counter()
+                docs = ranker.retrieve_batch([record["question"]])[0]
+                latencies.append(time.perf_counter() - started)
+                for metric, value in score_ranking([doc.metadata for doc in docs], record["targets"], k).items():
+                    scores[metric] += value
+            results[f"{name}@{k}"] = {
+                f"{metric}@{k}" if metric != "mrr" else "mrr": round(total / len(records), 4)
+                for metric, total in scores.items()
+            }
+            results[f"{name}@{k}"]["latency"] = _latency_summary(latencies)
+    return {"chunks": vectorstore.index.ntotal, "retrievers": results}
+
+# --- Driver ---
+
+def _config_name(settings: Dict[str, Any]) -> str:
+    model = settings["EMBEDDING_MODEL_NAME"].rsplit("/", 1)[-1]
+    chunking = f"{settings['CHUNKER']}-cs{settings['CHUNK_SIZE']}-co{settings['CHUNK_OVERLAP']}"
+    return f"{model}/{chunking}/{settings['INDEX_TYPE']}"
+
+def summarize(configurations: Dict[str, Dict], quality_metric: str, tolerance: float) -> List[Dict]:
+    """
+    One row per configuration and retriever, best quality first
+
+    Rows within `tolerance` of the best quality are marked, and the fastest
+    of them (by p50 latency) is marked as the recommended setting.
+    """
+    rows = []
+    for name, result in configurations.items():
+        for retriever, metrics in result.get("evaluation", {}).get("retrievers", {}).items():
+            k = retriever.rsplit("@", 1)[1]
+            metric = quality_metric if quality_metric == "mrr" else f"{quality_metric}@{k}"
+            rows.append({
+                "configuration": name,
+                "retriever": retriever,
+                "quality": metrics[metric],
+                "recall": metrics[f"recall@{k}"],
+                "mrr": metrics["mrr"],
+                "ndcg": metrics[f"ndcg@{k}"],
+                "p50_ms": metrics["latency"]["p50_ms"],
+                "p95_ms": metrics["latency"]["p95_ms"],
+                "index_size_mb": result["build"]["index_size_mb"]
+            })
+    rows.sort(key=lambda row: (-row["quality"], row["p50_ms"]))
+    if rows:
+        best = rows[0]["quality"]
+        candidates = [row for row in rows if row["quality"] >= best - tolerance]
+        for row in candidates:
+            row["within_tolerance"] = True
+        min(candidates, key=lambda row: row["p50_ms"])["recommended"] = True
+    return rows
+
+def print_table(rows: List[Dict]) -> None:
+    print(
+        f"{'configuration':52s} {'retriever':12s} {'recall':>7s} {'mrr':>7s} {'ndcg':>7s} "
+        f"{'p50 ms':>8s} {'p95 ms':>8s} {'index MB':>9s}"
+    )
+    for row in rows:
+        mark = "*" if row.get("recommended") else "+" if row.get("within_tolerance") else " "
+        print(
+            f"{row['configuration']:52s} {row['retriever']:12s} {row['recall']:7.3f} {row['mrr']:7.3f} "
+            f"{row['ndcg']:7.3f} {row['p50_ms']:8.2f} {row['p95_ms']:8.2f} {row['index_size_mb']:9.2f} {mark}"
+        )
+    print("+ within tolerance of the best quality, * fastest of those")
+
+def main(argv: List[str] = None) -> int:
+    from backend.config import CHUNK_OVERLAP, CHUNK_SIZE, CHUNKER, EMBEDDING_MODEL_NAME, INDEX_TYPE, RETRIEVAL_K
+
+    parser = argparse.ArgumentParser(description="Evaluate retrieval quality over a sweep of settings")
+    parser.add_argument("golden", help="JSONL of questions with their expected source and page")
+    parser.add_argument("--data", help="Documents to ingest (default: DATA_PATH)")
+    parser.add_argument("--embedding-model", nargs="+", default=[EMBEDDING_MODEL_NAME])
+    parser.add_argument("--chunker", nargs="+", default=[CHUNKER], choices=("structured", "recursive"))
+    parser.add_argument("--chunk-size", type=int, nargs="+", default=[CHUNK_SIZE])
+    parser.add_argument("--chunk-overlap", type=int, nargs="+", default=[CHUNK_OVERLAP])
+    parser.add_argument("--index-type", nargs="+", default=[INDEX_TYPE],
+                        choices=("flat", "ivf_flat", "ivf_pq", "hnsw"))
+    parser.add_argument("--k", type=int, nargs="+", default=[RETRIEVAL_K], help="RETRIEVAL_K values")
+    parser.add_argument("--retriever", nargs="+", default=["dense", "hybrid", "mmr"],
+                        choices=("dense", "hybrid", "mmr"))
+    parser.add_argument("--lambda-mult", type=float, nargs="+", default=[0.5], help="MMR lambda_mult values")
+    parser.add_argument("--metric", default="ndcg", choices=("recall", "mrr", "ndcg"),
+                        help="Quality metric used to rank configurations")
+    parser.add_argument("--tolerance", type=float, default=0.01,
+                        help="Quality loss accepted for a faster configuration")
+    parser.add_argument("--workdir", help="Directory for the built stores (default: a temp dir)")
+    parser.add_argument("--keep", action="store_true", help="Keep the work directory")
+    parser.add_argument("--timeout", type=float, help="Seconds a build or evaluation may run before it is killed (default: no limit)")
+    parser.add_argument("-o", "--output", help="JSON results file (default: benchmarks/results/eval-<time>.json)")
+    args = parser.parse_args(argv)
+
+    records = read_golden(args.golden)
+    if not records:
+        parser.error(f"No questions in {args.golden}")
+    workdir = args.workdir or tempfile.mkdtemp(prefix="medagent-eval-")
+    os.makedirs(workdir, exist_ok=True)
+    data_path = args.data or os.environ.get("DATA_PATH") or os.path.join(PROJECT_ROOT, "data/raw")
+    base_env = {
+        # Embeddings are cached per model and chunk text, so configurations
+        # that share chunks (e.g. different index types) embed them once
+        "EMBEDDING_CACHE_PATH": os.path.join(workdir, "embedding_cache.sqlite"),
+        "DATA_PATH": data_path,
+        "EMBEDDING_WARMUP": "true"
+    }
+
+    configurations: Dict[str, Dict] = {}
+    try:
+        for model, chunker, chunk_size, chunk_overlap, index_type in itertools.product(
+            args.embedding_model, args.chunker, args.chunk_size, args.chunk_overlap, args.index_type
+        ):
+            settings = {
+                "EMBEDDING_MODEL_NAME": model,
+                "CHUNK_SIZE": chunk_size,
+                "CHUNKER": chunker,
+                "CHUNK_OVERLAP": chunk_overlap,
+                "INDEX_TYPE": index_type
+            }
+            name = _config_name(settings)
+            if chunk_overlap >= chunk_size:
+                print(f"Skipping {name}: overlap must be smaller than the chunk size")
+                continue
+            print(f"Evaluating {name}")
+            db_path = os.path.join(workdir, name.replace("/", "_"))
+            env = {**base_env, **{key: str(value) for key, value in settings.items()}, "DB_FAISS_PATH": db_path}
+            result = configurations[name] = {"settings": settings}
+            result["build"] = _check(run_isolated(build_store, data_path, db_path, env=env, timeout=args.timeout), "build")
+            if "error" in result["build"]:
+                continue
+            result["evaluation"] = _check(
+                run_isolated(evaluate_store, db_path, records, args.k, args.retriever, args.lambda_mult, env=env, timeout=args.timeout),
+                "evaluation"
+            )
+            if not args.keep:
+                shutil.rmtree(db_path, ignore_errors=True)
+    finally:
+        if not args.keep and not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    rows = summarize(configurations, args.metric, args.tolerance)
+    print_table(rows)
+
+    output = args.output or os.path.join(
+        PROJECT_ROOT, "benchmarks", "results", datetime.now().strftime("eval-%Y%m%d-%H%M%S") + ".json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "commit": _git_commit(),
+            "questions": len(records),
+            "args": vars(args),
+            "configurations": configurations,
+            "ranking": rows
+        }, f, indent=2)
+    print(f"Results written to {output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,176 @@
+"""
+Local stand-in for the Ollama HTTP API with a configurable token rate
+
+Serves /api/generate (streaming and not), /api/chat and /api/tags well
+enough for the langchain and ollama clients. Prompt processing takes
+`prompt tokens / prefill_rate` seconds and each generated token
+`1 / token_rate` seconds, so end-to-end benchmarks measure our pipeline
+against a model of known speed.
+
+    python benchmarks/fake_ollama.py --port 11434 --token-rate 40
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, Optional
+
+_WORDS = (
+    "Based on the provided information the recommended treatment includes "
+    "rest fluids and monitoring of symptoms please consult a healthcare provider"
+).split()
+
+class FakeOllamaServer:
+    """
+    Threaded fake Ollama server, usable as a context manager
+
+    Args:
+        port: Port to listen on; 0 picks a free one (see url)
+        token_rate: Generated tokens per second per request
+        prefill_rate: Prompt tokens processed per second
+        answer_tokens: Tokens per generated answer
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        token_rate: float = 50.0,
+        prefill_rate: float = 2000.0,
+        answer_tokens: int = 64
+    ):
+        self.token_rate = token_rate
+        self.prefill_rate = prefill_rate
+        self.answer_tokens = answer_tokens
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def tokens(self, prompt: str) -> Iterator[str]:
+        """Sleep for the prefill, then yield answer tokens at token_rate"""
+        with self._lock:
+            self.requests += 1
+        time.sleep(len(prompt) / 4 / self.prefill_rate)
+        delay = 1.0 / self.token_rate
+        for i in range(self.answer_tokens):
+            time.sleep(delay)
+            yield _WORDS[i % len(_WORDS)] + " "
+
+    def _final(self, model: str, prompt: str, started: float) -> Dict:
+        return {
+            "model": model,
+            "done": True,
+            "total_duration": int((time.perf_counter() - started) * 1e9),
+            "prompt_eval_count": len(prompt) // 4,
+            "eval_count": self.answer_tokens
+        }
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, body: Dict, status: int = 200) -> None:
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path.startswith("/api/tags"):
+                    self._send_json({"models": [{"name": "fake", "model": "fake"}]})
+                else:
+                    self._send_json({"error": "not found"}, 404)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                if self.path.startswith("/api/generate"):
+                    prompt, key = payload.get("prompt", ""), "response"
+                elif self.path.startswith("/api/chat"):
+                    prompt = " ".join(m.get("content", "") for m in payload.get("messages", []))
+                    key = "message"
+                else:
+                    self._send_json({"error": "not found"}, 404)
+                    return
+                model = payload.get("model", "fake")
+                started = time.perf_counter()
+
+                def part(text: str) -> Dict:
+                    if key == "message":
+                        return {"model": model, "message": {"role": "assistant", "content": text}, "done": False}
+                    return {"model": model, "response": text, "done": False}
+
+                if not payload.get("stream", True):
+                    text = "".join(server.tokens(prompt))
+                    self._send_json({**part(text), **server._final(model, prompt, started)})
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                def write(body: Dict) -> None:
+                    data = json.dumps(body).encode() + b"\n"
+                    self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                    self.wfile.flush()
+
+                try:
+                    for token in server.tokens(prompt):
+                        write(part(token))
+                    write({**part(""), **server._final(model, prompt, started)})
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+        return Handler
+
+    def start(self) -> "FakeOllamaServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeOllamaServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run a fake Ollama server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--token-rate", type=float, default=50.0, help="Generated tokens per second")
+    parser.add_argument("--prefill-rate", type=float, default=2000.0, help="Prompt tokens per second")
+    parser.add_argument("--answer-tokens", type=int, default=64)
+    args = parser.parse_args()
+
+    server = FakeOllamaServer(args.host, args.port, args.token_rate, args.prefill_rate, args.answer_tokens)
+    print(f"Fake Ollama listening on {server.url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
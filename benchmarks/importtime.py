@@ -0,0 +1,108 @@
+"""
+Import-time profile of the app entry points
+
+Runs `python -X importtime` in a fresh interpreter for each target and
+reports the total and the slowest top-level packages. With --max-ms the
+script fails when a target gets slower, so it can guard startup time in CI.
+
+    python benchmarks/importtime.py
+    python benchmarks/importtime.py --target frontend/medibot.py --max-ms 1500
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# Entry points: the Streamlit page must stay light, the others show the
+# cost that is deferred to the background loader
+DEFAULT_TARGETS = ["frontend/medibot.py", "backend.rag.retrieval_qa", "backend.api.server"]
+
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s+)(\S+)")
+
+def _statement(target: str) -> str:
+    if target.endswith(".py"):
+        # Run the script without its __main__ block
+        return f"import runpy; runpy.run_path({target!r}, run_name='importtime')"
+    return f"import {target}"
+
+def profile(target: str) -> Dict:
+    """
+    Import a target in a fresh interpreter with -X importtime
+
+    Returns:
+        Dict: Total milliseconds and cumulative milliseconds per package
+    """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _statement(target)],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+        env={**os.environ, "PYTHONPATH": PROJECT_ROOT}
+    )
+    # -X importtime prints children before their parent; walking the lines
+    # backwards visits parents first, so a stack of indents gives each
+    # import's parent. A package's time is counted where it is first entered
+    # from another package, so nested packages overlap their importers.
+    packages: Dict[str, float] = defaultdict(float)
+    total_us = 0
+    stack = []
+    for line in reversed(process.stderr.splitlines()):
+        match = _LINE.match(line)
+        if not match:
+            continue
+        _, cumulative, indent, name = match.groups()
+        depth, package = len(indent), name.split(".")[0]
+        while stack and stack[-1][0] >= depth:
+            stack.pop()
+        if not stack:
+            total_us += int(cumulative)
+        if not stack or stack[-1][1] != package:
+            packages[package] += int(cumulative) / 1000
+        stack.append((depth, package))
+    return {
+        "target": target,
+        "ok": process.returncode == 0,
+        "error": process.stderr.strip().splitlines()[-1] if process.returncode else None,
+        "total_ms": total_us / 1000,
+        "packages_ms": dict(sorted(packages.items(), key=lambda item: item[1], reverse=True))
+    }
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Profile import time of the app entry points")
+    parser.add_argument("--target", nargs="+", default=DEFAULT_TARGETS,
+                        help="Modules (dotted) or scripts (.py) to import")
+    parser.add_argument("--top", type=int, default=10, help="Packages listed per target")
+    parser.add_argument("--max-ms", type=float, help="Fail if any target takes longer")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args(argv)
+
+    results = [profile(target) for target in args.target]
+    for result in results:
+        status = "" if result["ok"] else f"  (failed: {result['error']})"
+        print(f"{result['target']}: {result['total_ms']:.0f} ms{status}")
+        for name, ms in list(result["packages_ms"].items())[:args.top]:
+            print(f"    {ms:8.1f} ms  {name}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    failed = [r["target"] for r in results if not r["ok"]]
+    if failed:
+        print(f"Import failed: {', '.join(failed)}")
+        return 1
+    if args.max_ms is not None:
+        slow = [r["target"] for r in results if r["total_ms"] > args.max_ms]
+        if slow:
+            print(f"Import time above {args.max_ms:.0f} ms: {', '.join(slow)}")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,403 @@
+"""
+Benchmark suite for ingest, retrieval and end-to-end QA
+
+Each measurement runs in a fresh process, so peak RSS and cold-start
+times are not skewed by earlier stages. Corpora are the documents in
+DATA_PATH and synthetic copies scaled up by --scale; QA runs against a
+local fake Ollama server (see fake_ollama.py). Results are written as JSON
+for comparison with compare.py.
+
+    python benchmarks/run.py --scale 1 10 --k 1 3 10 --output results.json
+    python benchmarks/run.py --suite retrieval qa --token-rate 40
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import random
+import re
+import signal
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, PROJECT_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+SUITES = ("ingest", "retrieval", "qa")
+
+# Chunks embedded for the embedding throughput measurement
+_EMBED_SAMPLE = 2000
+
+# Interval at which a measurement's process is checked for an early exit
+_POLL_SECONDS = 1.0
+
+def _peak_rss_mb() -> float:
+    """Peak resident set size of this process and its finished children"""
+    import resource
+
+    scale = 1024 if sys.platform != "darwin" else 1024 * 1024  # KB on Linux, bytes on macOS
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return round(max(own, children) / scale, 1)
+
+def _latency_summary(seconds: Sequence[float]) -> Dict[str, float]:
+    ordered = sorted(seconds)
+    summary = {}
+    for p in (50, 95, 99):
+        index = min(len(ordered) - 1, max(0, -(-p * len(ordered) // 100) - 1))
+        summary[f"p{p}_ms"] = round(1000 * ordered[index], 3)
+    summary["mean_ms"] = round(1000 * sum(ordered) / len(ordered), 3)
+    return summary
+
+def _child(result_queue, env: Dict[str, str], target: Callable, args: tuple) -> None:
+    os.environ.update(env)
+    try:
+        result = target(*args)
+        result["peak_rss_mb"] = _peak_rss_mb()
+        result_queue.put(result)
+    except Exception as e:
+        result_queue.put({"error": f"{type(e).__name__}: {e}"})
+
+def _exit_reason(exitcode: int) -> str:
+    if exitcode < 0:
+        try:
+            return f"killed by {signal.Signals(-exitcode).name}"
+        except ValueError:
+            return f"killed by signal {-exitcode}"
+    return f"exited with code {exitcode}"
+
+def run_isolated(
+    target: Callable,
+    *args,
+    env: Dict[str, str],
+    timeout: Optional[float] = None
+) -> Dict:
+    """
+    Run target(*args) in a fresh interpreter with the given environment
+
+    A child that dies without a result (e.g. killed by the OOM killer or
+    a segfault) or runs past `timeout` seconds yields an error record
+    instead of hanging the benchmark.
+    """
+    context = multiprocessing.get_context("spawn")
+    result_queue = context.Queue()
+    process = context.Process(target=_child, args=(result_queue, env, target, args))
+    process.start()
+    deadline = None if timeout is None else time.monotonic() + timeout
+    result = None
+    while result is None:
+        try:
+            result = result_queue.get(timeout=_POLL_SECONDS)
+        except queue.Empty:
+            if not process.is_alive():
+                try:
+                    # The result may have arrived just before the exit
+                    result = result_queue.get(timeout=_POLL_SECONDS)
+                except queue.Empty:
+                    result = {"error": f"Child process {_exit_reason(process.exitcode)} without a result"}
+            elif deadline is not None and time.monotonic() > deadline:
+                process.kill()
+                result = {"error": f"Child process timed out after {timeout:g}s"}
+    process.join()
+    return result
+
+def make_corpus(data_path: str, scale: int, workdir: str) -> str:
+    """Directory with `scale` copies of every document in data_path"""
+    if scale == 1:
+        return data_path
+    corpus = os.path.join(workdir, f"corpus_x{scale}")
+    os.makedirs(corpus, exist_ok=True)
+    for name in sorted(os.listdir(data_path)):
+        source = os.path.join(data_path, name)
+        if not os.path.isfile(source):
+            continue
+        for copy in range(scale):
+            target = os.path.join(corpus, f"copy{copy:03d}_{name}")
+            if not os.path.exists(target):
+                try:
+                    os.link(source, target)
+                except OSError:
+                    shutil.copyfile(source, target)
+    return corpus
+
+# --- Measurements, each run in its own process ---
+
+def measure_ingest_stages(corpus: str) -> Dict:
+    """load_documents pages/sec, chunking and embedding throughput"""
+    from backend.rag.document_loader import load_documents
+    from backend.rag.embeddings import create_embedder
+    from backend.rag.vector_store import _get_splitter
+
+    started = time.perf_counter()
+    pages = load_documents(corpus)
+    load_seconds = time.perf_counter() - started
+    characters = sum(len(page.page_content) for page in pages)
+
+    started = time.perf_counter()
+    chunks = _get_splitter().split_documents(pages)
+    split_seconds = time.perf_counter() - started
+
+    sample = [chunk.page_content for chunk in chunks[:_EMBED_SAMPLE]]
+    embedder = create_embedder()
+    embedder.embed_documents(sample[:16])  # Model load and warm-up
+    started = time.perf_counter()
+    embedder.embed_documents(sample)
+    embed_seconds = time.perf_counter() - started
+
+    return {
+        "pages": len(pages),
+        "chunks": len(chunks),
+        "load_documents_seconds": round(load_seconds, 3),
+        "load_documents_pages_per_sec": round(len(pages) / load_seconds, 1),
+        "chunking_chunks_per_sec": round(len(chunks) / split_seconds, 1),
+        "chunking_mb_per_sec": round(characters / 1e6 / split_seconds, 2),
+        "embedding_chunks_per_sec": round(len(sample) / embed_seconds, 1)
+    }
+
+def measure_create_vector_store(corpus: str, db_path: str, use_embedding_cache: bool) -> Dict:
+    """Wall time of a full create_vector_store build"""
+    from backend.rag import vector_store
+    from backend.rag.embeddings import get_embedding_model
+
+    if not use_embedding_cache:
+        # Copies of a document share chunk text; re-embed them like new text
+        vector_store.get_embedding_model = lambda use_cache=False, **kwargs: get_embedding_model(**kwargs)
+
+    started = time.perf_counter()
+    vector_store.create_vector_store(corpus, db_path)
+    seconds = time.perf_counter() - started
+    index_bytes = sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(db_path) for name in names
+    )
+    return {
+        "create_vector_store_seconds": round(seconds, 3),
+        "store_size_mb": round(index_bytes / 1e6, 2)
+    }
+
+def measure_cold_start(db_path: str) -> Dict:
+    """Import time and load_vector_store time in a fresh process, then the first query"""
+    started = time.perf_counter()
+    from backend.rag.vector_store import load_vector_store
+    import_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    vectorstore = load_vector_store(db_path)
+    load_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    vectorstore.similarity_search("first question after start", k=3)
+    first_query_seconds = time.perf_counter() - started
+    return {
+        "import_seconds": round(import_seconds, 3),
+        "load_vector_store_seconds": round(load_seconds, 3),
+        "first_query_ms": round(1000 * first_query_seconds, 2),
+        "chunks": vectorstore.index.ntotal
+    }
+
+def sample_queries(db_path: str, count: int, seed: int = 0) -> List[str]:
+    """Known-item queries: word windows taken from random chunks of the store"""
+    from backend.rag.chunk_store import SQLiteDocstore
+    from backend.rag.vector_store import CHUNK_STORE_FILE
+
+    texts = [text for _, text in SQLiteDocstore(os.path.join(db_path, CHUNK_STORE_FILE), read_only=True).iter_chunks()]
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(20 * count if texts else 0):
+        if len(queries) == count:
+            break
+        words = re.findall(r"\w+", rng.choice(texts))
+        if len(words) >= 12:
+            start = rng.randrange(len(words) - 11)
+            queries.append(" ".join(words[start:start + 12]))
+    return queries
+
+def measure_retrieval(db_path: str, ks: Sequence[int], query_count: int) -> Dict:
+    """Retrieval QPS and latency per retriever and k, one query at a time and batched"""
+    from backend.rag.adaptive_retrieval import DenseRetriever
+    from backend.rag.hybrid_search import HybridRetriever
+    from backend.rag.lexical_index import load_lexical_index
+    from backend.rag.vector_store import load_vector_store
+
+    vectorstore = load_vector_store(db_path)
+    lexical_index = load_lexical_index(db_path)
+    queries = sample_queries(db_path, query_count)
+    results = {}
+    for k in ks:
+        retrievers = {"dense": DenseRetriever(vectorstore=vectorstore, search_kwargs={"k": k})}
+        if lexical_index is not None:
+            retrievers["hybrid"] = HybridRetriever(
+                vectorstore=vectorstore,
+                lexical_index=lexical_index,
+                search_kwargs={"k": k, "fetch_k": max(4 * k, 10)}
+            )
+        for name, retriever in retrievers.items():
+            retriever.retrieve_batch(queries[:4])  # Warm up
+            latencies = []
+            started = time.perf_counter()
+            for query in queries:
+                query_started = time.perf_counter()
+                retriever.retrieve_batch([query])
+                latencies.append(time.perf_counter() - query_started)
+            total = time.perf_counter() - started
+
+            started = time.perf_counter()
+            retriever.retrieve_batch(queries)
+            batch_total = time.perf_counter() - started
+            results[f"{name}@{k}"] = {
+                "qps": round(len(queries) / total, 1),
+                "batched_qps": round(len(queries) / batch_total, 1),
+                **_latency_summary(latencies)
+            }
+    return {"queries": len(queries), "retrievers": results}
+
+def measure_qa(db_path: str, query_count: int, concurrency: int) -> Dict:
+    """End-to-end QA latency, one question at a time, and batch QA throughput"""
+    from backend.rag.batch_qa import BatchQA
+    from backend.rag.retrieval_qa import get_qa_chain
+    from backend.rag.tracing import histogram
+    from backend.rag.vector_store import load_vector_store
+
+    qa = get_qa_chain(load_vector_store(db_path))
+    queries = sample_queries(db_path, query_count, seed=1)
+
+    latencies, first_token = [], []
+    for query in queries:
+        started = time.perf_counter()
+        first = None
+        for event in qa.stream({"query": query}):
+            if event["type"] == "token" and first is None:
+                first = time.perf_counter() - started
+        latencies.append(time.perf_counter() - started)
+        first_token.append(first if first is not None else latencies[-1])
+
+    stages = histogram.snapshot()
+    started = time.perf_counter()
+    answered = sum(1 for _ in BatchQA(qa, concurrency=concurrency).run(
+        {"id": i, "question": q} for i, q in enumerate(queries)
+    ))
+    batch_seconds = time.perf_counter() - started
+    return {
+        "questions": len(queries),
+        "latency": _latency_summary(latencies),
+        "time_to_first_token": _latency_summary(first_token),
+        "batch_questions_per_sec": round(answered / batch_seconds, 2),
+        "batch_concurrency": concurrency,
+        "stages": stages
+    }
+
+# --- Driver ---
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=PROJECT_ROOT, capture_output=True, text=True
+        ).stdout.strip()
+    except OSError:
+        return ""
+
+def _check(result: Dict, name: str) -> Dict:
+    if "error" in result:
+        print(f"  {name} failed: {result['error']}")
+    return result
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark ingest, retrieval and end-to-end QA")
+    parser.add_argument("--suite", nargs="+", default=list(SUITES), choices=SUITES)
+    parser.add_argument("--data", help="Documents to ingest (default: DATA_PATH)")
+    parser.add_argument("--scale", type=int, nargs="+", default=[1], help="Corpus scale factors, e.g. 1 10 100")
+    parser.add_argument("--k", type=int, nargs="+", default=[1, 3, 10], help="Retrieval depths")
+    parser.add_argument("--queries", type=int, default=200, help="Queries per retrieval run")
+    parser.add_argument("--qa-questions", type=int, default=20, help="Questions per QA run")
+    parser.add_argument("--concurrency", type=int, default=4, help="Batch QA concurrency")
+    parser.add_argument("--token-rate", type=float, default=50.0, help="Fake LLM tokens per second")
+    parser.add_argument("--prefill-rate", type=float, default=2000.0, help="Fake LLM prompt tokens per second")
+    parser.add_argument("--answer-tokens", type=int, default=64, help="Fake LLM tokens per answer")
+    parser.add_argument("--embedding-cache", action="store_true",
+                        help="Use the embedding cache when building stores (copies then cost nothing)")
+    parser.add_argument("--workdir", help="Directory for scaled corpora and stores (default: a temp dir)")
+    parser.add_argument("--keep", action="store_true", help="Keep the work directory")
+    parser.add_argument("--timeout", type=float, help="Seconds a measurement may run before it is killed (default: no limit)")
+    parser.add_argument("-o", "--output", help="JSON results file (default: benchmarks/results/<time>.json)")
+    args = parser.parse_args(argv)
+
+    from fake_ollama import FakeOllamaServer
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix="medagent-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    data_path = args.data or os.environ.get("DATA_PATH") or os.path.join(PROJECT_ROOT, "data/raw")
+    base_env = {
+        "EMBEDDING_CACHE_PATH": os.path.join(workdir, "embedding_cache.sqlite"),
+        # Fresh answer cache, so no question is answered from an earlier run
+        "SEMANTIC_CACHE_PATH": os.path.join(workdir, "response_cache.json"),
+        "EMBEDDING_WARMUP": os.environ.get("EMBEDDING_WARMUP", "true")
+    }
+
+    results: Dict[str, Any] = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "args": vars(args),
+        "scales": {}
+    }
+    try:
+        for scale in args.scale:
+            print(f"Scale x{scale}")
+            corpus = make_corpus(data_path, scale, workdir)
+            db_path = os.path.join(workdir, f"store_x{scale}")
+            env = {**base_env, "DATA_PATH": corpus, "DB_FAISS_PATH": db_path}
+            scale_results = results["scales"][f"x{scale}"] = {}
+
+            if "ingest" in args.suite or not os.path.exists(db_path):
+                scale_results["ingest"] = _check(run_isolated(measure_ingest_stages, corpus, env=env, timeout=args.timeout), "ingest stages")
+                scale_results["create_vector_store"] = _check(
+                    run_isolated(measure_create_vector_store, corpus, db_path, args.embedding_cache, env=env, timeout=args.timeout),
+                    "create_vector_store"
+                )
+            scale_results["cold_start"] = _check(run_isolated(measure_cold_start, db_path, env=env, timeout=args.timeout), "cold start")
+
+            if "retrieval" in args.suite:
+                scale_results["retrieval"] = _check(
+                    run_isolated(measure_retrieval, db_path, args.k, args.queries, env=env, timeout=args.timeout), "retrieval"
+                )
+            if "qa" in args.suite:
+                with FakeOllamaServer(
+                    token_rate=args.token_rate,
+                    prefill_rate=args.prefill_rate,
+                    answer_tokens=args.answer_tokens
+                ) as server:
+                    scale_results["qa"] = _check(
+                        run_isolated(
+                            measure_qa, db_path, args.qa_questions, args.concurrency,
+                            env={**env, "OLLAMA_BASE_URL": server.url},
+                            timeout=args.timeout
+                        ),
+                        "qa"
+                    )
+    finally:
+        if not args.keep and not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    output = args.output or os.path.join(
+        PROJECT_ROOT, "benchmarks", "results", datetime.now().strftime("%Y%m%d-%H%M%S") + ".json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,10 @@
 import os
 import sys
+import json
 import time
+import threading
 from datetime import datetime
+from concurrent.futures import Future, ThreadPoolExecutor
 import requests
 import logging
 from pathlib import Path
@@ -10,18 +13,29 @@ from pathlib import Path
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.insert(0, project_root)
 
+# Only light modules are imported here so the page renders at once;
+# langchain, FAISS and the embedding model are loaded by load_backend
 import streamlit as st
-from backend.config import DB_FAISS_PATH
-from backend.rag.vector_store import load_vector_store
-from backend.rag.retrieval_qa import create_qa_chain, load_llm
+from backend.config import (
+    API_REQUEST_TIMEOUT,
+    API_URL,
+    DB_FAISS_PATH,
+    OLLAMA_BASE_URL,
+    REFLECTION_BACKGROUND,
+    TRACING_ENABLED
+)
+from backend.rag.http_session import get_http_session
 from backend.rag.logging_config import setup_logging
 from backend.rag.exceptions import MedAgentError, ConnectionError
 from backend.rag.resource_manager import resource_manager
-from backend.rag.self_reflection import SelfReflectionChain
+from backend.rag.tracing import histogram
 
 # Setup logging
 logger = setup_logging(Path("medagent.log"))
 
+# Shared resources live for the whole process, not a single script run;
+# resource_manager closes them at process exit
+
 # Page configuration
 st.set_page_config(
     page_title="MedAgent Chatbot",
@@ -273,18 +287,52 @@ def apply_custom_css():
     </style>
     """, unsafe_allow_html=True)
 
+def load_backend():
+    """Import the RAG stack and load the vector store, QA chain and reflection chain"""
+    started = time.perf_counter()
+    from backend.rag.vector_store import load_vector_store
+    from backend.rag.retrieval_qa import get_qa_chain, use_llm
+    from backend.rag.self_reflection import SelfReflectionChain
+    
+    vectorstore = resource_manager.get_or_create(
+        "vectorstore",
+        lambda: load_vector_store(DB_FAISS_PATH)
+    )
+    qa_chain = get_qa_chain(vectorstore)
+    reflection_chain = resource_manager.get_or_create(
+        "reflection_chain",
+        lambda: SelfReflectionChain(use_llm)
+    )
+    logger.info(f"Backend loaded in {time.perf_counter() - started:.1f}s")
+    return qa_chain, reflection_chain
+
 @st.cache_resource
-def get_vectorstore():
+def get_backend():
+    """Future of load_backend, started once per process in a background thread"""
+    future = Future()
+    
+    def run():
+        try:
+            future.set_result(load_backend())
+        except Exception as e:
+            logger.error(f"Failed to load backend: {e}")
+            future.set_exception(e)
+            
+    threading.Thread(target=run, name="backend-loader", daemon=True).start()
+    return future
+
+def wait_for_backend():
+    """(qa_chain, reflection_chain), waiting for the background load if still running"""
+    future = get_backend()
+    if not future.done():
+        with st.spinner("Loading the knowledge base..."):
+            future.exception()
     try:
-        # Get from resource manager or create new
-        vectorstore = resource_manager.get("vectorstore")
-        if not vectorstore:
-            vectorstore = load_vector_store(DB_FAISS_PATH)
-            resource_manager.register("vectorstore", vectorstore)
-        return vectorstore
+        return future.result()
     except Exception as e:
-        logger.error(f"Failed to load vector store: {e}")
-        return None
+        # Start over on the next question
+        get_backend.clear()
+        raise MedAgentError("Failed to access knowledge base") from e
 
 def handle_input():
     user_question = st.session_state.user_input
@@ -297,43 +345,250 @@ def handle_input():
         # Don't clear the input field here - we'll do it in the next rerun
         st.session_state.process_input = True  # Flag to process input in next rerun
 
+def render_message_body(message):
+    st.markdown(message["content"])
+    
+    # Display reflection analysis if available
+    if message["role"] == "assistant" and "reflection" in message:
+        reflection = message["reflection"]
+        if reflection:
+            with st.expander("Analysis", label_visibility="visible"):
+                # Display confidence score with progress bar
+                confidence = reflection.get("confidence_score", 0)
+                st.progress(confidence/100, text=f"Confidence: {confidence}%")
+                
+                # Display verified claims
+                if reflection.get("verified_claims"):
+                    st.markdown("**✓ Verified claims:**")
+                    for claim in reflection["verified_claims"]:
+                        st.markdown(f"- {claim}")
+                        
+                # Display missing information
+                if reflection.get("missing_information"):
+                    st.markdown("**ℹ️ Missing information:**")
+                    for info in reflection["missing_information"]:
+                        st.markdown(f"- {info}")
+                        
+                # Display suggested improvements
+                if reflection.get("suggested_improvements"):
+                    st.markdown("**↗️ Suggested improvements:**")
+                    for improvement in reflection["suggested_improvements"]:
+                        st.markdown(f"- {improvement}")
+    
+    if message.get("pending_reflection"):
+        st.caption("🔎 Checking the answer against the sources...")
+    
+    # Display timestamp with proper label
+    st.markdown(
+        f"<div class='timestamp' aria-label='Message timestamp'>{message['timestamp']}</div>",
+        unsafe_allow_html=True
+    )
+
 def display_chat_history():
     for message in st.session_state.messages:
         with st.chat_message(message["role"], avatar="👤" if message["role"] == "user" else "🏥"):
-            st.markdown(message["content"])
-            
-            # Display reflection analysis if available
-            if message["role"] == "assistant" and "reflection" in message:
-                reflection = message["reflection"]
-                if reflection:
-                    with st.expander("Analysis", label_visibility="visible"):
-                        # Display confidence score with progress bar
-                        confidence = reflection.get("confidence_score", 0)
-                        st.progress(confidence/100, text=f"Confidence: {confidence}%")
-                        
-                        # Display verified claims
-                        if reflection.get("verified_claims"):
-                            st.markdown("**✓ Verified claims:**")
-                            for claim in reflection["verified_claims"]:
-                                st.markdown(f"- {claim}")
-                                
-                        # Display missing information
-                        if reflection.get("missing_information"):
-                            st.markdown("**ℹ️ Missing information:**")
-                            for info in reflection["missing_information"]:
-                                st.markdown(f"- {info}")
-                                
-                        # Display suggested improvements
-                        if reflection.get("suggested_improvements"):
-                            st.markdown("**↗️ Suggested improvements:**")
-                            for improvement in reflection["suggested_improvements"]:
-                                st.markdown(f"- {improvement}")
+            render_message_body(message)
+
+def format_references(sources):
+    """Build the References lines for the source documents of an answer"""
+    valid_sources = []
+    for doc in sources:
+        if hasattr(doc, 'metadata'):
+            source = doc.metadata.get('source', '')
+            page = doc.metadata.get('page', '')
+            section = doc.metadata.get('section', '')
             
-            # Display timestamp with proper label
-            st.markdown(
-                f"<div class='timestamp' aria-label='Message timestamp'>{message['timestamp']}</div>",
-                unsafe_allow_html=True
-            )
+            reference = f"- {source}"
+            # Page metadata is 0-based; cite pages as numbered in a PDF viewer.
+            # Chunks running over a page break cite their page range
+            start_page = doc.metadata.get('start_page', page)
+            end_page = doc.metadata.get('end_page', start_page)
+            if start_page != '' and end_page != start_page:
+                reference += f" (Pages {start_page + 1}–{end_page + 1})"
+            elif page != '':
+                reference += f" (Page {page + 1})"
+            elif section:
+                reference += f" (Section {section})"
+            section_title = doc.metadata.get('section_title')
+            if section_title:
+                reference += f" – {section_title}"
+                
+            # Add score if available for relevance indication
+            score = doc.metadata.get('score', '')
+            if score:
+                reference += f" [Relevance: {score:.2f}]"
+                
+            valid_sources.append(reference)
+    return valid_sources
+
+def iter_api_events(user_question):
+    """Answer events streamed from the query service"""
+    from langchain_core.documents import Document
+    
+    with get_http_session().post(
+        f"{API_URL}/query/stream",
+        json={'question': user_question, 'reflect': True},
+        stream=True,
+        timeout=API_REQUEST_TIMEOUT
+    ) as response:
+        response.raise_for_status()
+        for line in response.iter_lines(decode_unicode=True):
+            if not line:
+                continue
+            event = json.loads(line)
+            if "source_documents" in event:
+                event["source_documents"] = [Document(**doc) for doc in event["source_documents"]]
+            yield event
+
+def iter_answer_events(user_question, qa_chain):
+    """Answer events from the query service in thin-client mode, else from the local chain"""
+    if API_URL:
+        yield from iter_api_events(user_question)
+        return
+        
+    # Reuse the process-wide QA chain
+    yield from qa_chain.stream({'query': user_question})
+
+def compose_content(answer, reflection, valid_sources):
+    """Message text: the improved answer if reflection produced one, plus references"""
+    content = (reflection or {}).get('improved_response') or answer
+    if valid_sources:
+        source_text = '\n'.join(valid_sources)
+        content = f"{content}\n\n**References:**\n{source_text}"
+    return content
+
+def get_reflection_executor():
+    """Process-wide thread pool running reflections in the background"""
+    return resource_manager.get_or_create(
+        "reflection_executor",
+        lambda: ThreadPoolExecutor(max_workers=2, thread_name_prefix="reflection")
+    )
+
+def apply_reflection(message):
+    """Replace a draft answer with the result of its background reflection"""
+    future = message.pop('pending_reflection')
+    try:
+        reflection = future.result()
+    except Exception as e:
+        logger.error(f"Reflection failed: {e}")
+        return
+    if reflection:
+        message['reflection'] = reflection.get('analysis', {})
+        message['content'] = compose_content(message['answer'], reflection, message['sources'])
+
+def finish_pending_reflections():
+    """Wait for background reflections and redraw the chat as each one finishes"""
+    pending = [m for m in st.session_state.messages if m.get('pending_reflection')]
+    if not pending:
+        return
+    
+    # Touch a placeholder while waiting so Streamlit can still interrupt
+    # this run when the user sends another question
+    heartbeat = st.empty()
+    while not any(m['pending_reflection'].done() for m in pending):
+        heartbeat.empty()
+        time.sleep(0.25)
+        
+    for message in pending:
+        if message['pending_reflection'].done():
+            apply_reflection(message)
+    st.rerun()
+
+def stream_assistant_reply(user_question):
+    """Stream the answer into a chat message, then attach reflection and sources"""
+    with st.chat_message("assistant", avatar="🏥"):
+        # In thin-client mode the query service owns the chains
+        qa_chain, reflection_chain = (None, None) if API_URL else wait_for_backend()
+        slot = st.empty()
+        answer = ""
+        sources = []
+        events = iter_answer_events(user_question, qa_chain)
+        
+        # Render tokens as they arrive
+        for event in events:
+            if event["type"] == "sources":
+                sources = event["source_documents"]
+            elif event["type"] == "token":
+                answer += event["text"]
+                slot.markdown(answer + "▌")
+            elif event["type"] == "done":
+                answer = event["result"] or "I couldn't generate an answer."
+                sources = event["source_documents"]
+                break
+            elif event["type"] == "error":
+                raise MedAgentError(event["detail"])
+        slot.markdown(answer)
+        
+        # Process response and reflection
+        source_texts = [
+            doc.page_content 
+            for doc in sources 
+            if hasattr(doc, 'page_content') and doc.page_content
+        ]
+        
+        def run_reflection():
+            if API_URL:
+                # The service sends the reflection after the answer
+                try:
+                    return next((e for e in events if e["type"] == "reflection"), None)
+                finally:
+                    events.close()
+            return reflection_chain.analyze_response(answer, source_texts)
+        
+        reflection = None
+        pending = None
+        if not source_texts:
+            events.close()
+        elif REFLECTION_BACKGROUND:
+            # Show the draft now; finish_pending_reflections updates it later
+            pending = get_reflection_executor().submit(run_reflection)
+        else:
+            with st.spinner("Checking the answer against the sources..."):
+                reflection = run_reflection()
+        
+        valid_sources = []
+        if st.session_state.include_sources and sources:
+            valid_sources = format_references(sources)
+        
+        assistant_msg = {
+            'role': 'assistant',
+            'answer': answer,
+            'content': compose_content(answer, reflection, valid_sources),
+            'timestamp': datetime.now().strftime("%H:%M"),
+            'reflection': reflection.get('analysis', {}) if reflection else {},
+            'sources': valid_sources,
+            'pending_reflection': pending
+        }
+        
+        # Replace the streamed draft with the final message
+        with slot.container():
+            render_message_body(assistant_msg)
+    return assistant_msg
+
+def get_latency_stats():
+    """Per-stage latency percentiles from the query service, or from this process"""
+    if API_URL:
+        response = get_http_session().get(f"{API_URL}/metrics", timeout=5)
+        response.raise_for_status()
+        return response.json()["stages"]
+    return histogram.snapshot()
+
+def render_latency_stats():
+    """Sidebar table of p50/p95/p99 per pipeline stage"""
+    with st.expander("Performance"):
+        try:
+            stats = get_latency_stats()
+        except Exception as e:
+            logger.error(f"Failed to fetch latency stats: {e}")
+            st.caption("Latency statistics are unavailable.")
+            return
+        if not stats:
+            st.caption("No questions answered yet." if TRACING_ENABLED or API_URL else "Tracing is disabled.")
+            return
+        st.table([
+            {"stage": stage, **{key: values[key] for key in ("count", "p50_ms", "p95_ms", "p99_ms")}}
+            for stage, values in stats.items()
+        ])
 
 def clear_conversation():
     st.session_state.messages = []
@@ -348,14 +603,23 @@ def clear_conversation():
 def check_ollama_server():
     """Check if Ollama server is running and accessible"""
     try:
-        response = requests.get("http://localhost:11434/api/tags")
+        response = get_http_session().get(f"{OLLAMA_BASE_URL}/api/tags", timeout=5)
         return response.status_code == 200
     except requests.exceptions.ConnectionError as e:
         logger.error(f"Failed to connect to Ollama server: {e}")
         raise ConnectionError("Cannot connect to Ollama server") from e
 
-def initialize_llm():
-    """Initialize LLM with connection check"""
+def check_query_service():
+    """Check if the query service is running and accessible"""
+    try:
+        response = get_http_session().get(f"{API_URL}/health", timeout=5)
+        return response.status_code == 200
+    except requests.exceptions.ConnectionError as e:
+        logger.error(f"Failed to connect to query service: {e}")
+        raise ConnectionError("Cannot connect to the query service") from e
+
+def initialize_backend():
+    """Check the Ollama server and start loading the backend in the background"""
     try:
         if not check_ollama_server():
             raise ConnectionError(
@@ -364,25 +628,23 @@ def initialize_llm():
                 "2. Server is running (run 'ollama serve')\n"
                 "3. Model is downloaded (run 'ollama pull medllama2')"
             )
-        llm = load_llm()
-        resource_manager.register("llm", llm)
-        return llm
+        return get_backend()
     except Exception as e:
-        logger.error(f"Failed to initialize LLM: {e}")
+        logger.error(f"Failed to initialize backend: {e}")
         raise
 
 def main():
     try:
         apply_custom_css()
         
-        # Initialize components
-        llm = initialize_llm()
-        if not llm:
-            st.error("Failed to initialize AI model. Please check the logs.")
-            return
-            
-        reflection_chain = SelfReflectionChain(llm)
-        resource_manager.register("reflection_chain", reflection_chain)
+        # Initialize components; in thin-client mode the query service owns them
+        backend = None
+        if API_URL:
+            if not check_query_service():
+                st.error(f"The query service at {API_URL} is not healthy. Please check the logs.")
+                return
+        else:
+            backend = initialize_backend()
         
         # Sidebar
         with st.sidebar:
@@ -409,8 +671,17 @@ def main():
                                          value=st.session_state.include_sources,
                                          key="include_sources_checkbox")
             
+            if backend is not None:
+                if not backend.done():
+                    st.caption("⏳ Loading knowledge base...")
+                elif backend.exception() is None:
+                    st.caption("✅ Knowledge base ready")
+                else:
+                    st.caption("❌ Knowledge base failed to load, it will be retried on the next question")
+            
             st.markdown("---")
             st.button("Clear Conversation", on_click=clear_conversation)
+            render_latency_stats()
             
             st.markdown("---")
             st.markdown("© 2025 MedAgent AI")
@@ -439,6 +710,9 @@ def main():
             if 'process_input' not in st.session_state:
                 st.session_state.process_input = False
             
+            # Display chat messages
+            display_chat_history()
+            
             # Handle input processing
             if st.session_state.process_input:
                 st.session_state.process_input = False
@@ -452,84 +726,19 @@ def main():
                 if last_user_msg:
                     user_question = last_user_msg['content']
                     
-                    with st.spinner("Thinking..."):
-                        try:
-                            # Get vector store
-                            vectorstore = get_vectorstore()
-                            if not vectorstore:
-                                raise MedAgentError("Failed to access knowledge base")
-                                
-                            # Create and use QA chain
-                            qa_chain = create_qa_chain(vectorstore)
-                            response = qa_chain({'query': user_question})
-                            
-                            # Get answer and sources
-                            answer = response.get('result', '') or "I couldn't generate an answer."
-                            sources = response.get('source_documents', [])
-                            
-                            # Process response and reflection
-                            if sources:
-                                source_texts = [
-                                    doc.page_content 
-                                    for doc in sources 
-                                    if hasattr(doc, 'page_content') and doc.page_content
-                                ]
-                                
-                                if source_texts:
-                                    reflection = reflection_chain.analyze_response(answer, source_texts)
-                                else:
-                                    reflection = {'analysis': {}, 'improved_response': None}
-                            else:
-                                reflection = {'analysis': {}, 'improved_response': None}
-                            
-                            # Format response
-                            content = reflection.get('improved_response') or answer
-                            
-                            if st.session_state.include_sources and sources:
-                                valid_sources = []
-                                for doc in sources:
-                                    if hasattr(doc, 'metadata'):
-                                        source = doc.metadata.get('source', '')
-                                        page = doc.metadata.get('page', '')
-                                        section = doc.metadata.get('section', '')
-                                        
-                                        reference = f"- {source}"
-                                        if page:
-                                            reference += f" (Page {page})"
-                                        elif section:
-                                            reference += f" (Section {section})"
-                                            
-                                        # Add score if available for relevance indication
-                                        score = doc.metadata.get('score', '')
-                                        if score:
-                                            reference += f" [Relevance: {score:.2f}]"
-                                            
-                                        valid_sources.append(reference)
-                                
-                                if valid_sources:
-                                    source_text = '\n'.join(valid_sources)
-                                    content = f"{content}\n\n**References:**\n{source_text}"
-                            
-                            # Add to chat history
-                            assistant_msg = {
-                                'role': 'assistant',
-                                'content': content,
-                                'timestamp': datetime.now().strftime("%H:%M"),
-                                'reflection': reflection.get('analysis', {}) if reflection else {},
-                                'sources': valid_sources if st.session_state.include_sources else []
-                            }
-                            st.session_state.messages.append(assistant_msg)
-                            st.session_state.user_input = ""
-                            
-                        except ConnectionError as e:
-                            st.error("Cannot connect to the AI model. Please ensure Ollama server is running.")
-                            logger.error(f"Connection error: {e}")
-                        except Exception as e:
-                            st.error("An error occurred while processing your question. Please try again.")
-                            logger.error(f"Error in processing: {e}")
-            
-            # Display chat messages
-            display_chat_history()
+                    try:
+                        assistant_msg = stream_assistant_reply(user_question)
+                        
+                        # Add to chat history
+                        st.session_state.messages.append(assistant_msg)
+                        st.session_state.user_input = ""
+                        
+                    except ConnectionError as e:
+                        st.error("Cannot connect to the AI model. Please ensure Ollama server is running.")
+                        logger.error(f"Connection error: {e}")
+                    except Exception as e:
+                        st.error("An error occurred while processing your question. Please try again.")
+                        logger.error(f"Error in processing: {e}")
             
             # Custom input area
             st.markdown('<div class="input-container">', unsafe_allow_html=True)
@@ -549,13 +758,13 @@ def main():
             
             # Footer
             st.markdown('<div class="footer">This AI assistant provides information for educational purposes only. Always consult with healthcare professionals for medical advice 🪄.</div>', unsafe_allow_html=True)
+            
+            # Update drafts whose reflection is still running
+            finish_pending_reflections()
 
     except Exception as e:
         logger.error(f"Application error: {e}")
         st.error("An unexpected error occurred. Please check the logs.")
-    finally:
-        # Cleanup resources on exit
-        resource_manager.cleanup()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,138 @@
+"""Tests for the structure-aware chunker"""
+
+import pytest
+from langchain.schema import Document
+from backend.rag.chunker import (
+    HEADING,
+    LIST,
+    PARAGRAPH,
+    TABLE,
+    StructuredChunker,
+    classify_line,
+    parse_blocks
+)
+
+def count_tokens(text: str) -> int:
+    return len(text.split())
+
+def make_chunker(chunk_size: int = 1000, chunk_overlap: int = 200, max_tokens: int = 256) -> StructuredChunker:
+    return StructuredChunker(chunk_size, chunk_overlap, max_tokens, count_tokens)
+
+def page(text: str, number: int = 0, source: str = "guide.pdf") -> Document:
+    return Document(page_content=text, metadata={"source": source, "page": number})
+
+def sentences(prefix: str, count: int) -> str:
+    return " ".join(f"{prefix} sentence {i} gives the patient one more instruction." for i in range(count))
+
+@pytest.mark.parametrize("line, kind", [
+    ("2 TREATMENT", HEADING),
+    ("2.1 Adults", HEADING),
+    ("Annex 2 Drug tables", HEADING),
+    ("SEVERE MALARIA", HEADING),
+    ("1. Give ORS after each loose stool", LIST),
+    ("b) 500 mg twice daily", LIST),
+    ("• Monitor glucose", LIST),
+    ("Drug    Dose    Duration", TABLE),
+    ("Weight | Dose", TABLE),
+    ("Give oral rehydration salts.", PARAGRAPH),
+    ("2 tablets are given at night.", PARAGRAPH)
+])
+def test_classify_line(line, kind):
+    assert classify_line(line) == kind
+
+def test_parse_blocks_groups_lines():
+    text = (
+        "3 Treatment\n"
+        "Give oral rehydration salts to every\n"
+        "child with diarrhoea.\n"
+        "\n"
+        "1. Zinc for 10 days\n"
+        "2. ORS after each stool, continuing\n"
+        "until diarrhoea stops\n"
+        "\n"
+        "Weight    Dose    Days\n"
+        "5-10 kg    10 mg    5\n"
+    )
+    assert parse_blocks(text) == [
+        (HEADING, ["3 Treatment"]),
+        (PARAGRAPH, ["Give oral rehydration salts to every", "child with diarrhoea."]),
+        (LIST, ["1. Zinc for 10 days", "2. ORS after each stool, continuing until diarrhoea stops"]),
+        (TABLE, ["Weight    Dose    Days", "5-10 kg    10 mg    5"])
+    ]
+
+def test_parse_blocks_splits_consecutive_headings():
+    assert parse_blocks("2 TREATMENT\n2.1 Adults") == [(HEADING, ["2 TREATMENT"]), (HEADING, ["2.1 Adults"])]
+
+def test_overlap_must_be_smaller_than_chunk_size():
+    with pytest.raises(ValueError):
+        StructuredChunker(100, 100, 0, count_tokens)
+
+def test_chunks_respect_size_and_token_limits():
+    chunker = make_chunker(chunk_size=300, chunk_overlap=60, max_tokens=40)
+    chunks = chunker.split_documents([page(sentences("Dosing", 30))])
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert len(chunk.page_content) <= 300
+        assert count_tokens(chunk.page_content) <= 40
+
+def test_no_text_is_lost():
+    text = "1 DIAGNOSIS\n\n" + sentences("Diagnosis", 12) + "\n\n2 TREATMENT\n\n" + sentences("Treatment", 12)
+    chunks = make_chunker(chunk_size=300, chunk_overlap=0).split_documents([page(text)])
+    assert set(" ".join(chunk.page_content for chunk in chunks).split()) == set(text.split())
+
+def test_heading_starts_new_chunk_with_section_title():
+    text = "1 DIAGNOSIS\n\n" + sentences("Diagnosis", 5) + "\n\n2 TREATMENT\n\n" + sentences("Treatment", 4)
+    chunks = make_chunker().split_documents([page(text)])
+    assert [chunk.metadata["section_title"] for chunk in chunks] == ["1 DIAGNOSIS", "2 TREATMENT"]
+    assert chunks[1].page_content.startswith("2 TREATMENT\nTreatment sentence 0")
+
+def test_short_section_tail_takes_next_section_title():
+    text = "1 DIAGNOSIS\n\nShort.\n\n2 TREATMENT\n\n" + sentences("Treatment", 4)
+    chunks = make_chunker().split_documents([page(text)])
+    assert len(chunks) == 1
+    assert chunks[0].metadata["section_title"] == "2 TREATMENT"
+
+def test_section_title_carries_over_to_following_chunks():
+    text = "2 TREATMENT\n\n" + sentences("Treatment", 30)
+    chunks = make_chunker(chunk_size=300, chunk_overlap=60).split_documents([page(text)])
+    assert len(chunks) > 1
+    assert {chunk.metadata["section_title"] for chunk in chunks} == {"2 TREATMENT"}
+
+def test_list_is_moved_whole_to_next_chunk():
+    items = "\n".join(f"{i}. Give drug number {i} daily." for i in range(1, 5))
+    text = sentences("Intro", 6) + "\n\n" + items
+    chunks = make_chunker(chunk_size=400, chunk_overlap=50).split_documents([page(text)])
+    assert chunks[-1].page_content == items
+
+def test_split_table_repeats_header_row():
+    rows = ["Weight    Dose    Frequency"] + [f"{w} kg    {w * 10} mg    twice daily" for w in range(5, 40)]
+    chunks = make_chunker(chunk_size=300, chunk_overlap=50).split_documents([page("\n".join(rows))])
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert chunk.page_content.startswith("Weight    Dose    Frequency\n")
+
+def test_sentence_split_by_page_break_is_joined():
+    chunks = make_chunker().split_documents([
+        page("3 Treatment\n\nGive amoxicillin 50 mg/kg\nper day", 4),
+        page("in two doses for five days. Review after two days.", 5)
+    ])
+    assert len(chunks) == 1
+    assert "Give amoxicillin 50 mg/kg per day in two doses for five days." in chunks[0].page_content
+    assert (chunks[0].metadata["start_page"], chunks[0].metadata["end_page"]) == (4, 5)
+
+def test_running_headers_and_footers_are_dropped():
+    pages = [
+        page(f"WHO Pocket Book\n\n{sentences(f'Page{i}', 2)}\n\nPage {i + 1} of 3", i)
+        for i in range(3)
+    ]
+    text = " ".join(chunk.page_content for chunk in make_chunker().split_documents(pages))
+    assert text.count("WHO Pocket Book") == 1
+    assert "Page 2 of 3" not in text and "Page 3 of 3" not in text
+
+def test_files_are_chunked_separately():
+    chunks = make_chunker().split_documents([
+        page("1 DOSING\n\n" + sentences("First", 2), 0, "a.pdf"),
+        page(sentences("Second", 2), 0, "b.pdf")
+    ])
+    assert [chunk.metadata["source"] for chunk in chunks] == ["a.pdf", "b.pdf"]
+    assert "section_title" not in chunks[1].metadata
@@ -0,0 +1,67 @@
+"""Tests for the retrieval metrics of the evaluation harness"""
+
+import json
+import math
+import pytest
+from benchmarks.evaluate import read_golden, score_ranking
+
+def chunk(source: str, page: int, end_page: int = None) -> dict:
+    metadata = {"source": f"data/raw/{source}", "page": page}
+    if end_page is not None:
+        metadata.update(start_page=page, end_page=end_page)
+    return metadata
+
+def test_perfect_ranking():
+    targets = [("a.pdf", 1), ("a.pdf", 2)]
+    scores = score_ranking([chunk("a.pdf", 1), chunk("a.pdf", 2)], targets, k=5)
+    assert scores == {"recall": 1.0, "mrr": 1.0, "ndcg": 1.0}
+
+def test_late_and_missing_targets():
+    targets = [("a.pdf", 1), ("b.pdf", 4)]
+    ranked = [chunk("a.pdf", 0), chunk("a.pdf", 1), chunk("c.pdf", 4)]
+    scores = score_ranking(ranked, targets, k=3)
+    assert scores["recall"] == 0.5
+    assert scores["mrr"] == 0.5
+    assert scores["ndcg"] == pytest.approx((1 / math.log2(3)) / (1 + 1 / math.log2(3)))
+
+def test_only_top_k_count():
+    scores = score_ranking([chunk("a.pdf", 0), chunk("a.pdf", 1)], [("a.pdf", 1)], k=1)
+    assert scores == {"recall": 0.0, "mrr": 0.0, "ndcg": 0.0}
+
+def test_repeated_page_scores_once():
+    targets = [("a.pdf", 1), ("a.pdf", 2)]
+    scores = score_ranking([chunk("a.pdf", 1)] * 3, targets, k=3)
+    assert scores["recall"] == 0.5
+    assert scores["ndcg"] == pytest.approx(1 / (1 + 1 / math.log2(3)))
+
+def test_chunk_spanning_pages_covers_every_target_and_caps_ndcg():
+    targets = [("a.pdf", 3), ("a.pdf", 4)]
+    scores = score_ranking([chunk("a.pdf", 3, end_page=4)], targets, k=5)
+    assert scores == {"recall": 1.0, "mrr": 1.0, "ndcg": 1.0}
+
+def test_any_page_target():
+    scores = score_ranking([chunk("b.pdf", 0), chunk("a.pdf", 9)], [("a.pdf", None)], k=5)
+    assert scores["recall"] == 1.0 and scores["mrr"] == 0.5
+
+def test_read_golden_converts_pages_to_zero_based(tmp_path):
+    path = tmp_path / "golden.jsonl"
+    path.write_text("\n".join([
+        json.dumps({"question": "Zinc dose?", "source": "data/raw/a.pdf", "pages": [3, 1]}),
+        "",
+        json.dumps({"question": "Any page?", "source": "b.pdf"})
+    ]))
+    assert read_golden(str(path)) == [
+        {"question": "Zinc dose?", "targets": [("a.pdf", 0), ("a.pdf", 2)]},
+        {"question": "Any page?", "targets": [("b.pdf", None)]}
+    ]
+
+@pytest.mark.parametrize("record", [
+    {"question": "Zinc dose?"},
+    {"source": "a.pdf"},
+    {"question": "Zinc dose?", "source": "a.pdf", "pages": []}
+])
+def test_read_golden_rejects_incomplete_records(tmp_path, record):
+    path = tmp_path / "golden.jsonl"
+    path.write_text(json.dumps(record))
+    with pytest.raises(ValueError):
+        read_golden(str(path))
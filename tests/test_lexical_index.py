@@ -0,0 +1,50 @@
+"""Tests for the BM25 index"""
+
+import pytest
+from backend.rag.lexical_index import LexicalIndex, tokenize
+
+CHUNKS = [
+    ("a", "Give amoxicillin 50 mg/kg for pneumonia."),
+    ("b", "Oral rehydration salts and zinc for diarrhoea."),
+    ("c", "Artesunate for severe malaria in children."),
+    ("d", "Amoxicillin dispersible tablets for children with pneumonia and fast breathing.")
+]
+
+def scores(index: LexicalIndex, query: str):
+    return dict(index.search(query, 10))
+
+def test_tokenize_keeps_codes_and_doses():
+    assert tokenize("Give 5mg/kg of co-amoxiclav for E11.9") == ["give", "5mg/kg", "co-amoxiclav", "e11.9"]
+
+def test_search_ranks_by_bm25():
+    index = LexicalIndex.build(CHUNKS)
+    results = index.search("amoxicillin pneumonia", 10)
+    assert [chunk_id for chunk_id, _ in results] == ["a", "d"]
+    assert results[0][1] > results[1][1] > 0
+
+def test_rare_term_outweighs_common_one():
+    index = LexicalIndex.build(CHUNKS)
+    # "children" is in 2 of 4 chunks, "artesunate" in 1 only
+    assert index.search("artesunate children", 1)[0][0] == "c"
+
+def test_terms_in_most_chunks_are_skipped():
+    index = LexicalIndex.build(CHUNKS + [("e", "Children need care."), ("f", "Children sleep.")])
+    assert index.search("children", 10) == []
+
+def test_unknown_terms_and_empty_index():
+    assert LexicalIndex.build(CHUNKS).search("tuberculosis", 10) == []
+    assert LexicalIndex.build([]).search("amoxicillin", 10) == []
+
+def test_save_and_load_round_trip(tmp_path):
+    index = LexicalIndex.build(CHUNKS)
+    index.save(str(tmp_path / "bm25"))
+    loaded = LexicalIndex.load(str(tmp_path / "bm25"))
+    assert loaded.search("zinc diarrhoea", 10) == index.search("zinc diarrhoea", 10)
+
+@pytest.mark.parametrize("query", ["amoxicillin pneumonia", "zinc", "malaria children", "tablets"])
+def test_update_matches_full_build(query):
+    added = [("e", "Zinc tablets for ten days."), ("f", "Severe malaria needs artesunate.")]
+    updated = LexicalIndex.build(CHUNKS).update(["b", "x"], added)
+    rebuilt = LexicalIndex.build([chunk for chunk in CHUNKS if chunk[0] != "b"] + added)
+    assert updated.chunk_ids == rebuilt.chunk_ids
+    assert scores(updated, query) == pytest.approx(scores(rebuilt, query))
@@ -0,0 +1,111 @@
+"""Tests for reference counting and retirement of shared resources"""
+
+import threading
+import time
+import pytest
+from backend.rag.exceptions import ResourceError
+from backend.rag.resource_manager import ResourceManager
+
+class Resource:
+    def __init__(self, name: str = "r"):
+        self.name = name
+        self.closed = 0
+
+    def close(self):
+        self.closed += 1
+
+def test_get_or_create_builds_once():
+    manager = ResourceManager()
+    calls = []
+
+    def factory():
+        calls.append(1)
+        time.sleep(0.05)
+        return Resource()
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(manager.get_or_create("llm", factory)))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+
+def test_failed_factory_registers_nothing():
+    manager = ResourceManager()
+
+    def factory():
+        raise RuntimeError("model not found")
+
+    with pytest.raises(RuntimeError):
+        manager.get_or_create("llm", factory)
+    assert manager.get("llm") is None
+
+def test_unregister_closes_unused_resource():
+    manager = ResourceManager()
+    resource = manager.register("llm", Resource())
+    manager.unregister("llm")
+    assert resource.closed == 1
+    with pytest.raises(ResourceError):
+        manager.unregister("llm")
+
+def test_resource_in_use_is_closed_by_last_user():
+    manager = ResourceManager()
+    resource = manager.register("llm", Resource())
+    with manager.use("llm"):
+        with manager.use("llm"):
+            manager.unregister("llm")
+        assert resource.closed == 0
+    assert resource.closed == 1
+
+def test_replace_retires_old_resource():
+    manager = ResourceManager()
+    old = manager.register("llm", Resource("old"))
+    with manager.use("llm") as in_use:
+        new = manager.register("llm", Resource("new"), replace=True)
+        assert in_use is old and old.closed == 0
+    assert old.closed == 1 and new.closed == 0
+    assert manager.get("llm") is new
+
+def test_register_without_replace_keeps_existing():
+    manager = ResourceManager()
+    first = manager.register("llm", Resource("first"))
+    assert manager.register("llm", Resource("second")) is first
+
+def test_use_with_factory_recreates_unhealthy_resource():
+    manager = ResourceManager()
+    healthy = {"ok": True}
+    with manager.use("llm", Resource, lambda _: healthy["ok"]) as first:
+        pass
+    healthy["ok"] = False
+    assert manager.check_health() == {"llm": False}
+    assert first.closed == 1
+    healthy["ok"] = True
+    with manager.use("llm", Resource, lambda _: healthy["ok"]) as second:
+        assert second is not first
+
+def test_failing_health_check_counts_as_unhealthy():
+    manager = ResourceManager()
+
+    def check(_):
+        raise ConnectionError("server down")
+
+    manager.register("llm", Resource(), check)
+    assert manager.check_health() == {"llm": False}
+    assert manager.get("llm") is None
+
+def test_use_of_missing_resource_without_factory():
+    with pytest.raises(ResourceError):
+        with ResourceManager().use("llm"):
+            pass
+
+def test_cleanup_closes_everything():
+    manager = ResourceManager()
+    resources = [manager.register(name, Resource(name)) for name in ("store", "llm")]
+    manager.cleanup()
+    assert [resource.closed for resource in resources] == [1, 1]
+    assert manager.get("store") is None
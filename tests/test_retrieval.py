@@ -0,0 +1,105 @@
+"""Tests for hybrid retrieval and adaptive source selection"""
+
+import faiss
+import numpy as np
+import pytest
+from langchain.schema import Document
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import Embeddings
+from backend.rag.adaptive_retrieval import DenseRetriever, select_documents
+from backend.rag.hybrid_search import HybridRetriever, reciprocal_rank_fusion
+from backend.rag.lexical_index import LexicalIndex
+
+# Chunk id -> (text, vector); the query "artesunate dosing" embeds like chunk a
+CHUNKS = {
+    "a": ("Dosing of antimalarials by body weight.", [1.0, 0.0, 0.0]),
+    "b": ("Dosing tables for children.", [0.8, 0.6, 0.0]),
+    "c": ("Dosing of oral rehydration salts.", [0.0, 1.0, 0.0]),
+    "d": ("Give artesunate for severe malaria.", [0.0, 0.0, 1.0])
+}
+QUERY = "artesunate dosing"
+
+class TableEmbeddings(Embeddings):
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        if text == QUERY:
+            return CHUNKS["a"][1]
+        return next(vector for chunk_text, vector in CHUNKS.values() if chunk_text == text)
+
+def make_store() -> FAISS:
+    index = faiss.IndexFlatL2(3)
+    index.add(np.array([vector for _, vector in CHUNKS.values()], dtype=np.float32))
+    docstore = InMemoryDocstore({
+        chunk_id: Document(page_content=text, metadata={"source": "guide.pdf"})
+        for chunk_id, (text, _) in CHUNKS.items()
+    })
+    return FAISS(TableEmbeddings(), index, docstore, dict(enumerate(CHUNKS)), normalize_L2=True)
+
+def doc(name: str, score: float, similarity: float = None) -> Document:
+    metadata = {"name": name, "score": score}
+    if similarity is not None:
+        metadata["similarity"] = similarity
+    return Document(page_content=name, metadata=metadata)
+
+def names(docs):
+    return [d.metadata["name"] for d in docs]
+
+def test_rrf_sums_reciprocal_ranks():
+    fused = dict(reciprocal_rank_fusion([["a", "b", "c"], ["c", "a"]], k=10))
+    assert fused["a"] == pytest.approx(1 / 11 + 1 / 12)
+    assert fused["c"] == pytest.approx(1 / 13 + 1 / 11)
+    assert fused["b"] == pytest.approx(1 / 12)
+
+def test_rrf_ranks_items_found_by_both_first():
+    fused = reciprocal_rank_fusion([["a", "b"], ["b", "c"]], k=60)
+    assert [item for item, _ in fused] == ["b", "a", "c"]
+
+def test_dense_retriever_scores_cosine_similarity():
+    docs = DenseRetriever(vectorstore=make_store(), search_kwargs={"k": 2}).invoke(QUERY)
+    assert [d.page_content for d in docs] == [CHUNKS["a"][0], CHUNKS["b"][0]]
+    assert [d.metadata["score"] for d in docs] == pytest.approx([1.0, 0.8])
+    assert [d.metadata["similarity"] for d in docs] == pytest.approx([1.0, 0.8])
+
+def test_hybrid_retriever_adds_keyword_match():
+    retriever = HybridRetriever(
+        vectorstore=make_store(),
+        lexical_index=LexicalIndex.build((chunk_id, text) for chunk_id, (text, _) in CHUNKS.items()),
+        search_kwargs={"k": 2, "fetch_k": 2},
+        rrf_k=60
+    )
+    docs = retriever.invoke(QUERY)
+    # "dosing" is in most chunks, so BM25 ranks on "artesunate" alone and
+    # its only hit beats the second dense hit
+    assert [d.page_content for d in docs] == [CHUNKS["a"][0], CHUNKS["d"][0]]
+    assert docs[0].metadata["score"] == pytest.approx(0.5)
+    # Found by BM25 only, so it gets the lowest dense similarity fetched
+    assert docs[1].metadata["similarity"] == pytest.approx(0.8)
+
+def test_select_keeps_close_candidates():
+    docs = [doc("a", 0.9), doc("b", 0.85), doc("c", 0.5)]
+    assert names(select_documents(docs, k=3, min_score=0.6, fallback_score=0.3, relative_score=0.8)) == ["a", "b"]
+
+def test_select_sends_clear_winner_alone():
+    docs = [doc("a", 0.95), doc("b", 0.7)]
+    assert names(select_documents(docs, k=3, min_score=0.6, fallback_score=0.3, relative_score=0.8)) == ["a"]
+
+def test_select_respects_k():
+    docs = [doc(name, 0.9) for name in "abcd"]
+    assert len(select_documents(docs, k=2, min_score=0.5, fallback_score=0.3, relative_score=0.5)) == 2
+
+def test_select_falls_back_to_lower_threshold():
+    docs = [doc("a", 0.5), doc("b", 0.45), doc("c", 0.2)]
+    assert names(select_documents(docs, k=3, min_score=0.6, fallback_score=0.4, relative_score=0.5)) == ["a", "b"]
+
+def test_select_returns_nothing_below_fallback():
+    docs = [doc("a", 0.3)]
+    assert select_documents(docs, k=3, min_score=0.6, fallback_score=0.4, relative_score=0.5) == []
+    assert select_documents([], k=3) == []
+
+def test_select_ranks_by_score_but_thresholds_similarity():
+    # A reranker's order is kept, but its scores are not compared to cosine thresholds
+    docs = [doc("a", 0.1, similarity=0.7), doc("b", 5.0, similarity=0.75), doc("c", 3.0, similarity=0.2)]
+    assert names(select_documents(docs, k=3, min_score=0.6, fallback_score=0.3, relative_score=0.8)) == ["b", "a"]
@@ -0,0 +1,107 @@
+"""Tests for the semantic response cache"""
+
+import re
+import pytest
+from langchain.schema import Document
+from backend.rag import semantic_cache
+from backend.rag.semantic_cache import SemanticCache, question_signature
+
+class WordEmbeddings:
+    """Bag of letter-only words, so questions differing in numbers embed identically"""
+
+    dim = 64
+
+    def __init__(self):
+        self.calls = 0
+
+    def embed_query(self, text: str):
+        self.calls += 1
+        vector = [0.0] * self.dim
+        for word in re.findall(r"[a-z]+", text.lower()):
+            vector[sum(map(ord, word)) % self.dim] += 1.0
+        return vector
+
+def make_cache(threshold: float = 0.9, max_entries: int = 10, ttl_seconds: float = 60.0, **kwargs) -> SemanticCache:
+    return SemanticCache(WordEmbeddings(), threshold, max_entries, ttl_seconds, **kwargs)
+
+def answer(text: str) -> dict:
+    return {"result": text, "source_documents": [Document(page_content=text, metadata={"source": "guide.pdf"})]}
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(semantic_cache.time, "time", lambda: now[0])
+    return now
+
+def test_signature_extracts_numbers_and_qualifiers():
+    numbers, qualifiers = question_signature("Dose of amoxicillin for a 10 kg child, not 2,5 mg?")
+    assert numbers == (2.5, 10.0)
+    assert qualifiers == {"kg", "child", "not", "mg"}
+
+@pytest.mark.parametrize("first, second", [
+    ("Paracetamol dose for children?", "Paracetamol dose for paediatric patients?"),
+    ("Can I give ibuprofen?", "Can I not give ibuprofen?"),
+    ("Can I give ibuprofen?", "Can't I give ibuprofen?")
+])
+def test_signature_of_variants(first, second):
+    same = first.startswith("Paracetamol")
+    assert (question_signature(first) == question_signature(second)) is same
+
+def test_exact_and_near_match_hit():
+    cache = make_cache()
+    cache.add("What is the dose of zinc for diarrhoea?", answer("20 mg"))
+    assert cache.lookup("what is the  dose of zinc for diarrhoea?")["result"] == "20 mg"
+    assert cache.lookup("What is the dose of zinc for diarrhoea")["result"] == "20 mg"
+    assert cache.lookup("How is malaria treated?") is None
+
+def test_near_match_with_other_numbers_misses():
+    cache = make_cache()
+    cache.add("Amoxicillin dose for a 10 kg child?", answer("250 mg"))
+    # Same words, so the same embedding, but a different weight
+    assert cache.lookup("Amoxicillin dose for a 20 kg child?") is None
+    assert cache.lookup("Amoxicillin dose for a 10 kg infant?") is None
+    assert cache.lookup("amoxicillin dose for a 10 kg child")["result"] == "250 mg"
+
+def test_threshold_of_one_is_exact_match_only():
+    cache = make_cache(threshold=1.0)
+    cache.add("Zinc dose?", answer("20 mg"))
+    calls = cache.embedder.calls
+    assert cache.lookup("zinc dose?")["result"] == "20 mg"
+    assert cache.lookup("Zinc dose") is None
+    assert cache.embedder.calls == calls
+
+def test_entries_expire(clock):
+    cache = make_cache(ttl_seconds=60)
+    cache.add("Zinc dose?", answer("20 mg"))
+    clock[0] += 59
+    assert cache.lookup("Zinc dose?") is not None
+    clock[0] += 2
+    assert cache.lookup("Zinc dose?") is None
+    assert len(cache) == 0
+
+def test_least_recently_used_entry_is_evicted():
+    cache = make_cache(max_entries=2)
+    cache.add("Zinc dose?", answer("zinc"))
+    cache.add("Malaria treatment?", answer("malaria"))
+    assert cache.lookup("Zinc dose?") is not None
+    cache.add("Fever management?", answer("fever"))
+    assert len(cache) == 2
+    assert cache.lookup("Malaria treatment?") is None
+    assert cache.lookup("Zinc dose?")["result"] == "zinc"
+
+def test_store_version_change_clears_cache():
+    version = ["v1"]
+    cache = make_cache(version_fn=lambda: version[0])
+    cache.add("Zinc dose?", answer("20 mg"))
+    version[0] = "v2"
+    assert cache.lookup("Zinc dose?") is None
+    assert len(cache) == 0
+
+def test_persisted_cache_round_trip(tmp_path):
+    path = tmp_path / "cache.json"
+    cache = make_cache(path=path)
+    cache.add("Amoxicillin dose for a 10 kg child?", answer("250 mg"))
+    cache.save()
+    loaded = make_cache(path=path)
+    assert loaded.lookup("Amoxicillin dose for a 10 kg child")["source_documents"][0].page_content == "250 mg"
+    assert loaded.lookup("Amoxicillin dose for a 20 kg child?") is None
@@ -0,0 +1,44 @@
+"""Tests for request admission in the async query service"""
+
+import asyncio
+import pytest
+from fastapi import HTTPException
+from backend.api.server import RAGService
+
+def make_service(max_concurrency: int, queue_timeout: float) -> RAGService:
+    return RAGService(None, None, None, max_concurrency, queue_timeout, request_timeout=1.0)
+
+def test_zero_queue_timeout_takes_free_slots():
+    async def run():
+        service = make_service(2, 0.0)
+        await service.acquire()
+        await service.acquire()
+        assert service.in_flight == 2
+        with pytest.raises(HTTPException) as error:
+            await service.acquire()
+        assert error.value.status_code == 503
+        service.release()
+        await service.acquire()
+        assert service.in_flight == 2
+    asyncio.run(run())
+
+def test_waiting_request_gets_released_slot():
+    async def run():
+        service = make_service(1, 1.0)
+        await service.acquire()
+        waiter = asyncio.create_task(service.acquire())
+        await asyncio.sleep(0.01)
+        service.release()
+        await waiter
+        assert service.in_flight == 1
+    asyncio.run(run())
+
+def test_queue_timeout_rejects_with_503():
+    async def run():
+        service = make_service(1, 0.01)
+        await service.acquire()
+        with pytest.raises(HTTPException) as error:
+            await service.acquire()
+        assert error.value.status_code == 503
+        assert service.in_flight == 1
+    asyncio.run(run())
@@ -0,0 +1,33 @@
+"""Tests for the incremental ingest manifest"""
+
+from backend.rag.vector_store import _mark_failed, manifest_delta
+
+def entry(file_hash: str, *chunk_ids: str) -> dict:
+    return {"hash": file_hash, "source": "guide.pdf", "chunk_ids": list(chunk_ids)}
+
+def test_manifest_delta():
+    old_files = {
+        "data/same.pdf": entry("h1", "a"),
+        "data/edited.pdf": entry("h2", "b"),
+        "data/deleted.pdf": entry("h3", "c")
+    }
+    current = {"data/same.pdf": "h1", "data/edited.pdf": "h2-new", "data/new.pdf": "h4"}
+    assert manifest_delta(old_files, current) == (["data/new.pdf"], ["data/edited.pdf"], ["data/deleted.pdf"])
+
+def test_up_to_date_store_has_no_delta():
+    old_files = {"data/same.pdf": entry("h1", "a")}
+    assert manifest_delta(old_files, {"data/same.pdf": "h1"}) == ([], [], [])
+
+def test_failed_file_is_retried_on_next_run():
+    files = {"data/partial.pdf": entry("h1", "a", "b")}
+    _mark_failed(files, {"data/partial.pdf", "data/broken.pdf"})
+    # Chunks of pages that parsed stay, so the retry removes them first
+    assert files["data/partial.pdf"] == entry("", "a", "b")
+    assert files["data/broken.pdf"] == {"hash": "", "source": "broken.pdf", "chunk_ids": []}
+    current = {"data/partial.pdf": "h1", "data/broken.pdf": "h2"}
+    assert manifest_delta(files, current) == ([], ["data/partial.pdf", "data/broken.pdf"], [])
+
+def test_mark_failed_without_failures_changes_nothing():
+    files = {"data/same.pdf": entry("h1", "a")}
+    _mark_failed(files, set())
+    assert files == {"data/same.pdf": entry("h1", "a")}